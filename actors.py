@@ -1,7 +1,6 @@
 import sys
 import utils
 import treasures
-import itertools
 
 class Actor:
     # base class for Enemy and Hero
@@ -15,7 +14,12 @@ class Actor:
     # - weapon
     # - spell
     # - fist_damage
-    
+    __slots__ = ('health', 'max_health', 'mana', 'max_mana', 'map', 'pos',
+                 'weapon', 'spell', 'fist_damage')
+
+    # the attributes which change during a game; they are saved by Game.snapshot
+    STATE = ('health', 'mana', 'pos', 'weapon', 'spell')
+
     @property
     def is_alive(self):
         return self.health != 0
@@ -83,13 +87,11 @@ class Actor:
 
             self.take_mana(spell.mana_cost)
             
-            for pos in itertools.islice(self.map.positions(self.pos, direction), spell.cast_range):
-                entity = self.map[pos]
-                if isinstance(entity, Actor):
-                    entity.damage(spell.damage)
-                    break
-                elif entity != self.map.WALKABLE:
-                    break
+            pos = self.map.first_blocker(self.pos, direction, spell.cast_range)
+            if self.map.profiler is not None and pos is not None:
+                self.map.profiler.count('isinstance_dispatches')
+            if pos is not None and isinstance(self.map[pos], Actor):
+                self.map[pos].damage(spell.damage)
         else:
             # by is in {'weapon', 'fist'}
             nemesis_pos = next(self.map.positions(self.pos, direction), None)
@@ -98,7 +100,9 @@ class Actor:
                 return
             
             nemesis = self.map[nemesis_pos]
-            
+
+            if self.map.profiler is not None:
+                self.map.profiler.count('isinstance_dispatches')
             if not isinstance(nemesis, Actor):
                 return
 
@@ -109,6 +113,10 @@ class Hero(Actor):
     # a Hero has the following additional attributes:
     # - name
     # - title
+    __slots__ = ('name', 'title', 'mana_regeneration_rate')
+
+    # the character displayed for a hero on the map
+    TILE = 'H'
 
     @staticmethod
     def from_dict(dct):
@@ -124,21 +132,32 @@ class Hero(Actor):
         result.fist_damage = dct['fist_damage']
         result.pos = dct['pos']
         result.map = dct['map']
-        result.weapon = treasures.Weapon()
-        result.spell = treasures.Spell()
+        result.weapon = treasures.DEFAULT_WEAPON
+        result.spell = treasures.DEFAULT_SPELL
         return result
     
     @property
     def known_as(self):
         return f"{self.name} the {self.title}"
 
+    @property
+    def status_lines(self):
+        # returns the lines printed by self.display()
+        return [f'health: {self.health}',
+                f'mana: {self.mana}',
+                f'weapon: {self.weapon.name}',
+                f'spell: {self.spell.name}',
+                '']
+
     def display(self):
-        print(f'health: {self.health}')
-        print(f'mana: {self.mana}')
-        print(f'weapon: {self.weapon.name}')
-        print(f'spell: {self.spell.name}')
-        print()
+        print('\n'.join(self.status_lines))
     
+    # the keys read by read_command
+    DIRECTION_KEYS = {'8': 'up', '2': 'down', '4': 'left', '6': 'right'}
+    ATTACK_KEYS = {'w': 'weapon', 's': 'spell', 'f': 'fist'}
+    # the command of a hero who does nothing during his turn
+    WAIT = 'wait'
+
     def read_command(self):
         # returns one of:
         # {'up', 'down', 'left', 'right',
@@ -150,19 +169,25 @@ class Hero(Actor):
 
         while True:
             first_char = utils.get_char()
-            if first_char in '2468':
-                return {'2': 'down', '4': 'left', '6': 'right', '8': 'up'}[first_char]
-            elif first_char in 'wsf':
-                by = {'w': 'weapon', 's': 'spell', 'f': 'fist'}[first_char]
+            if first_char in self.DIRECTION_KEYS:
+                return self.DIRECTION_KEYS[first_char]
+            elif first_char in self.ATTACK_KEYS:
+                by = self.ATTACK_KEYS[first_char]
                 second_char = utils.get_char()
-                if second_char not in '2468':
+                if second_char not in self.DIRECTION_KEYS:
                     continue
-                direction = {'2': 'down', '4': 'left', '6': 'right', '8': 'up'}[second_char]
+                direction = self.DIRECTION_KEYS[second_char]
                 return by, direction
                 
-    def do_turn(self):
-        command = self.read_command()
-        if type(command) is str:
+    def do_turn(self, command=None):
+        # @command must be one of the values returned by read_command, or WAIT.
+        # if it is None, the command is read from the terminal.
+        if command is None:
+            command = self.read_command()
+        if command == self.WAIT:
+            # the hero does nothing, e.g. when no key was pressed in real time
+            pass
+        elif type(command) is str:
             # command is one of {'up', 'down', 'left', 'right'}
             self.move(command)
         else:
@@ -177,44 +202,51 @@ class Enemy(Actor):
     #                    it is included only for convenience.
     #  if the enemy does not know where the hero is, self.last_seen and
     #  self.hero_direction will both be None.
+    #  - behavior: the "behavior" of the enemy's dict, or None. see is_hunting
+    __slots__ = ('last_seen', 'hero_direction', 'behavior')
+
+    STATE = Actor.STATE + ('last_seen', 'hero_direction')
+
+    # the character displayed for an enemy on the map
+    TILE = 'E'
 
     @staticmethod
     def from_dict(dct):
         # @dct must have the keys
         # {'health', 'mana', 'fist_damage', 'pos', 'map'}
+        # and may have the key 'behavior'
         result = object.__new__(Enemy)
         result.health = result.max_health = dct['health']
         result.mana = result.max_mana = dct['mana']
         result.fist_damage = dct['fist_damage']
         result.pos = dct['pos']
         result.map = dct['map']
-        result.weapon = treasures.Weapon()
-        result.spell = treasures.Spell()
+        result.weapon = treasures.DEFAULT_WEAPON
+        result.spell = treasures.DEFAULT_SPELL
         result.last_seen = result.hero_direction = None
+        result.behavior = dct.get('behavior')
         return result
-        
+
+    @property
+    def is_hunting(self):
+        # returns True if @self chases the hero along the shortest path instead of
+        # walking straight to where it last saw him:
+        #  - a "rabid" enemy always knows where the hero is
+        #  - an "aggresive" enemy never loses track of the hero once it has seen him
+        # enemies with any other behavior are not hunting.
+        return (self.behavior == 'rabid'
+                or (self.behavior == 'aggresive' and self.last_seen is not None))
+
     def search_for_hero(self):
         # returns the position of the hero, or None if he can't be seen
         # @self will only look up, down, left and right
 
-        def try_direction(direction):
-            # looks for the hero in the direction @direction
-            # returns None if @self can't see him in that direction
-            
-            for pos in self.map.positions(self.pos, direction):
-                entity = self.map[pos]
-                if type(entity) is Hero:
-                    return pos
-                elif entity != self.map.WALKABLE:
-                    # something blocks @self's view
-                    return None
-            return None
-
         for direction in ('up', 'down', 'left', 'right'):
-            pos = try_direction(direction)
-            if pos is not None:
+            # the first thing @self sees in @direction blocks its view
+            pos = self.map.first_blocker(self.pos, direction)
+            if pos is not None and type(self.map[pos]) is Hero:
                 return pos, direction
-            
+
         return None, None
         
     def move_to_last_seen(self):
@@ -227,7 +259,13 @@ class Enemy(Actor):
             return
 
         self.move(self.hero_direction)
-    
+
+    def hunt(self):
+        # moves @self one step closer to the hero along the map's distance field
+        direction = self.map.distance_field.direction_from(self.pos)
+        if direction is not None:
+            self.move(direction)
+
     def do_turn(self):
         def hero_is_in_vicinity():
             # Returns True if hero is directly above, below, to the right
@@ -243,13 +281,14 @@ class Enemy(Actor):
             self.attack('fist', self.hero_direction)
         
         hero_pos, hero_direction = self.search_for_hero()
-        if hero_pos is None:
-            # the enemy cannot see the hero
-            self.move_to_last_seen()
-        else:
+        if hero_pos is not None:
             self.last_seen = hero_pos
             self.hero_direction = hero_direction
             if hero_is_in_vicinity():
                 attack_hero()
-            else:
-                self.move_to_last_seen()
+                return
+
+        if self.is_hunting:
+            self.hunt()
+        else:
+            self.move_to_last_seen()
@@ -0,0 +1,226 @@
+# this module measures the performance of the game: the time taken by loading
+# dungeons, creating games, playing turns (also through env.VectorEnv) and
+# drawing maps on generated maps of increasing size and enemy density, and
+# the memory used by the objects of a game.
+# the results can be written as JSON to compare them across commits.
+#
+# usage: python benchmarks.py [options]
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import timeit
+import argparse
+import platform
+import tempfile
+import contextlib
+import tracemalloc
+import env
+import actors
+import dungeon
+import treasures
+import generator
+import simulation
+
+ENEMY_DICT = {'health': 40, 'mana': 100, 'fist_damage': 20, 'behavior': 'rabid', 'map': None}
+HERO_DICT = {'name': 'Bron', 'title': 'Dragon Slayer', 'health': 100, 'mana': 100,
+             'mana_regeneration_rate': 2, 'fist_damage': 20, 'map': None}
+TREASURES = [treasures.Weapon('The Axe of Destiny', 20), treasures.HealthPotion(50)]
+
+def make_enemy(i):
+    return actors.Enemy.from_dict({**ENEMY_DICT, 'pos': (i, 0)})
+
+def make_hero(i):
+    return actors.Hero.from_dict({**HERO_DICT, 'pos': (i, 0)})
+
+def make_chest(i):
+    return treasures.TreasureChest((i, 0), None, TREASURES)
+
+# the objects whose memory is measured, by name
+MEMORY_BENCHMARKS = {'enemy': make_enemy, 'hero': make_hero, 'chest': make_chest}
+
+# maps each class to a class without __slots__ used by without_slots
+_unslotted_classes = {}
+
+def without_slots(obj):
+    # returns an object with a __dict__ holding the attributes of @obj, laid out
+    # like the objects of the game were before their classes had __slots__.
+    # each actor then had its own weapon and spell instead of the shared defaults.
+    cls = type(obj)
+    if cls not in _unslotted_classes:
+        _unslotted_classes[cls] = type(cls.__name__, (), {})
+    result = _unslotted_classes[cls]()
+    for attr in (attr for base in reversed(cls.__mro__) for attr in getattr(base, '__slots__', ())):
+        value = getattr(obj, attr)
+        if attr in ('weapon', 'spell'):
+            value = without_slots(value)
+        setattr(result, attr, value)
+    return result
+
+# the objects of MEMORY_BENCHMARKS as they were before they had __slots__,
+# to which the current ones are compared
+UNSLOTTED_MEMORY_BENCHMARKS = {name: lambda i, create=create: without_slots(create(i))
+                               for name, create in MEMORY_BENCHMARKS.items()}
+
+def bytes_per_object(create, count):
+    # returns the mean number of bytes allocated by @create for each of
+    # @count objects which are all kept alive, including their positions
+    tracemalloc.start()
+    try:
+        objects = [None] * count
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(count):
+            objects[i] = create(i)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return (after - before) / count
+
+def run_memory_benchmarks(count, benchmarks=MEMORY_BENCHMARKS):
+    # returns a dict mapping the name of each of the memory @benchmarks to its bytes per object
+    return {name: bytes_per_object(create, count) for name, create in benchmarks.items()}
+
+def generate_dungeon_dict(size, enemy_density, seed=0):
+    # returns the dict of a JSON dungeon whose map has @size rows and columns.
+    # a fraction @enemy_density of the cells hold enemies, a tenth of the other
+    # cells are obstacles and a hundredth of all cells hold chests.
+    ncells = size * size
+    return generator.generate_dict(size, size, seed=seed, obstacle_density=0.1,
+                                   enemies=int(ncells * enemy_density), chests=ncells // 100,
+                                   enemy={key: value for key, value in ENEMY_DICT.items()
+                                          if key != 'map'})
+
+def spawn_pos(the_dungeon):
+    return next(iter(the_dungeon.spawn_posns))
+
+def time_per_call(function, number, repeat=3):
+    # returns the best time, in seconds, taken by one call of @function
+    # over @repeat runs of @number calls
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+def bench_from_file(the_dungeon, dct, number):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'dungeon')
+        with open(path, 'w') as f:
+            json.dump(dct, f)
+        return time_per_call(lambda: dungeon.Dungeon.from_file(path), number)
+
+def bench_create_game(the_dungeon, dct, number):
+    return time_per_call(lambda: the_dungeon.create_game(spawn_pos(the_dungeon), 0), number)
+
+def bench_game_construction(the_dungeon, dct, number):
+    # a game is only complete once its initial state is saved, which
+    # happens on its first turn
+    def construct():
+        the_dungeon.create_game(spawn_pos(the_dungeon), 0).save(dungeon.Game.INITIAL)
+    return time_per_call(construct, number)
+
+def bench_enemy_turn(the_dungeon, dct, number):
+    # the time of one Enemy.do_turn, averaged over all the enemies of a round
+    game = the_dungeon.create_game(spawn_pos(the_dungeon), 0)
+    if not game.enemies:
+        return None
+    game.map.distance_field.retarget(game.hero.pos)
+    def enemies_turn():
+        for enemy in game.enemies:
+            enemy.do_turn()
+    return time_per_call(enemies_turn, number) / len(game.enemies)
+
+def bench_spell_attack(the_dungeon, dct, number):
+    game = the_dungeon.create_game(spawn_pos(the_dungeon), 0)
+    hero = game.hero
+    hero.learn(treasures.Spell('Fireball', 0, 0, the_dungeon.ncols))
+    return time_per_call(lambda: hero.attack('spell', 'right'), number)
+
+def bench_display(the_dungeon, dct, number):
+    game = the_dungeon.create_game(spawn_pos(the_dungeon), 0)
+    def display():
+        with contextlib.redirect_stdout(io.StringIO()):
+            game.map.display()
+    return time_per_call(display, number)
+
+def bench_scripted_game(the_dungeon, dct, number, max_turns=200):
+    # the time of one round of a game played by a random policy
+    game = the_dungeon.create_game(spawn_pos(the_dungeon), 0)
+    def play():
+        game.reset_state()
+        play.turns = simulation.run(game, simulation.random_policy(0), max_turns).turns
+    return time_per_call(play, number) / max(1, play.turns)
+
+def bench_env_step(the_dungeon, dct, number, count=16):
+    # the time of one round of one of the @count games of an env.VectorEnv
+    # played with random actions, including the observation of the game
+    if env.numpy is None:
+        return None
+    vector_env = env.VectorEnv(the_dungeon, count, spawn_pos(the_dungeon), 200, seed=0, copy=False)
+    vector_env.reset()
+    rng = random.Random(0)
+    def step():
+        vector_env.step([rng.randrange(len(env.ACTIONS)) for game in range(count)])
+    return time_per_call(step, number) / count
+
+# the timing benchmarks, by name. each one is called with a Dungeon, its dict
+# and the number of times to repeat the measured operation, and returns the
+# seconds taken by that operation, or None if it can't be measured.
+TIMING_BENCHMARKS = {'from_file': bench_from_file,
+                     'create_game': bench_create_game,
+                     'game_construction': bench_game_construction,
+                     'enemy_turn': bench_enemy_turn,
+                     'spell_attack': bench_spell_attack,
+                     'display': bench_display,
+                     'scripted_game_round': bench_scripted_game,
+                     'env_step': bench_env_step}
+
+def run_timing_benchmarks(sizes, enemy_densities, names=None, seed=0):
+    # returns a list of dicts describing the time taken by the benchmarks
+    # @names (all by default) on generated maps of each of @sizes and @enemy_densities
+    results = []
+    for size in sizes:
+        # fewer repetitions on larger maps keep every benchmark short
+        number = max(1, 10000 // (size * size))
+        for enemy_density in enemy_densities:
+            dct = generate_dungeon_dict(size, enemy_density, seed)
+            the_dungeon = dungeon.Dungeon.from_dict(dct)
+            enemies = sum(row.count('E') for row in dct['map_template'])
+            for name, benchmark in TIMING_BENCHMARKS.items():
+                if names is not None and name not in names:
+                    continue
+                results.append({'benchmark': name, 'size': size,
+                                'enemy_density': enemy_density, 'enemies': enemies,
+                                'seconds': benchmark(the_dungeon, dct, number)})
+    return results
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='measure the performance of the game')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[16, 64, 256],
+                        help='the numbers of rows and columns of the generated maps')
+    parser.add_argument('--enemy-densities', type=float, nargs='+', default=[0.01, 0.05])
+    parser.add_argument('--benchmarks', nargs='+', choices=sorted(TIMING_BENCHMARKS),
+                        help='the timing benchmarks to run (all by default)')
+    parser.add_argument('--count', type=int, default=100000,
+                        help='objects created per memory benchmark')
+    parser.add_argument('--json', metavar='FILE', help='write the results as JSON to FILE')
+    args = parser.parse_args(argv)
+
+    timings = run_timing_benchmarks(args.sizes, args.enemy_densities, args.benchmarks)
+    memory = run_memory_benchmarks(args.count)
+    memory_without_slots = run_memory_benchmarks(args.count, UNSLOTTED_MEMORY_BENCHMARKS)
+
+    for result in timings:
+        seconds = 'n/a' if result['seconds'] is None else f"{result['seconds'] * 1e6:.1f}us"
+        print(f"{result['benchmark']:20} size {result['size']:5} "
+              f"enemies {result['enemies']:7}: {seconds}")
+    for name, size in memory.items():
+        print(f'{name}: {size:.1f} bytes ({memory_without_slots[name]:.1f} without slots)')
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump({'python': platform.python_version(), 'time': time.time(),
+                       'timings': timings, 'memory': memory,
+                       'memory_without_slots': memory_without_slots}, f, indent=1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,385 @@
+# this module holds a map for huge dungeons which are mostly walkable. the
+# tiles are split into square chunks, and only the chunks holding something
+# else than walkables are kept: all the others are a single shared chunk of
+# walkables. the lines of sight are found with sorted lists of the cells
+# which are not walkable in each row and column instead of arrays covering
+# every cell, so the memory used grows with the number of cells which are
+# not walkable rather than with the size of the map. the chunks far from the
+# hero may also be written to files and read again when they are needed.
+#
+# games are played on a ChunkedMap like on a dungeon.Map, except that:
+#  - the hunting enemies only find the hero within max_distance steps, see
+#    SparseDistanceField
+#  - the map has no tiles bytearray, so it can't be used with a
+#    swarm.SwarmEngine, an env.Env or a solver.Solver
+#
+# usage: game = chunked.create_game(the_dungeon, spawn_pos)
+
+import os
+import re
+import random
+import bisect
+import shutil
+import weakref
+import tempfile
+import pathfinding
+from dungeon import Map
+
+# the number of rows and columns of the chunks by default
+CHUNK_SIZE = 64
+
+# matches the characters of a map template which are not walkables
+NOT_WALKABLE_RE = re.compile(rb'[^.]')
+
+class Chunk:
+    # the tiles of a chunk which may be shared by a map and its snapshots.
+    # they are never modified: a map modifies its own copy instead.
+    # attributes:
+    #  - key: (<row>, <column>) of the chunk among the chunks
+    #  - tiles: bytes holding the tiles of the chunk, row after row, or None
+    #           while the chunk is only in its file
+    #  - path: the file holding the tiles, or None if they were never written
+    __slots__ = ('key', 'tiles', 'path', '__weakref__')
+
+    def __init__(self, key, tiles):
+        self.key = key
+        self.tiles = tiles
+        self.path = None
+
+class SparseDistanceField:
+    # does the same as pathfinding.DistanceField on a ChunkedMap, keeping the
+    # distances in a dict. the search stops @max_distance steps away from the
+    # target, so that its cost doesn't grow with the size of the map: the
+    # cells further away are unreachable.
+    # attributes:
+    #  - map, target, max_distance, reached, frontier, terrain_version:
+    #    as in pathfinding.DistanceField, where the cells are positions
+    #  - distances: maps the positions reached by the search to their
+    #               distance, or None if the search has to be restarted
+
+    def __init__(self, map, max_distance):
+        self.map = map
+        self.target = None
+        self.max_distance = max_distance
+        self.distances = None
+        self.reached = 0
+        self.frontier = None
+        self.terrain_version = None
+
+    def retarget(self, target):
+        if target != self.target:
+            self.target = target
+            self.distances = None
+
+    def update(self):
+        if self.distances is not None and self.terrain_version == self.map.terrain_version:
+            return
+        self.terrain_version = self.map.terrain_version
+        self.distances = {self.target: 0}
+        self.reached = 0
+        self.frontier = [self.target]
+
+    def expand(self):
+        distances, the_map = self.distances, self.map
+        distance = self.reached = self.reached + 1
+        next_frontier = []
+        for row, col in self.frontier:
+            for direction, drow, dcol in pathfinding.STEPS:
+                neighbour = (row + drow, col + dcol)
+                if (neighbour not in distances and the_map.pos_is_valid(neighbour)
+                    and the_map.PASSABLE[the_map.tile(neighbour)]):
+                    distances[neighbour] = distance
+                    next_frontier.append(neighbour)
+        self.frontier = next_frontier
+
+    def distance(self, pos):
+        self.update()
+        while pos not in self.distances and self.frontier and self.reached != self.max_distance:
+            self.expand()
+        return self.distances.get(pos, pathfinding.UNREACHABLE)
+
+    def direction_from(self, pos):
+        if self.target is None:
+            return None
+        best_direction = None
+        best_distance = self.distance(pos)
+        if best_distance == pathfinding.UNREACHABLE:
+            return None
+        for direction, drow, dcol in pathfinding.STEPS:
+            neighbour = (pos[0] + drow, pos[1] + dcol)
+            if not self.map.can_move_to(neighbour):
+                continue
+            distance = self.distances.get(neighbour, pathfinding.UNREACHABLE)
+            if distance != pathfinding.UNREACHABLE and distance < best_distance:
+                best_direction, best_distance = direction, distance
+        return best_direction
+
+class ChunkedMap(Map):
+    HERO_TILE = ord(Map.HERO)
+
+    # attributes (besides those of Map which don't refer to tiles):
+    #  - chunk_size: the number of rows and columns of each chunk
+    #  - chunks: maps the key (<row>, <column>) of each chunk holding a cell
+    #            which is not walkable to its tiles: a bytearray if @self
+    #            modified them since its last snapshot, a Chunk otherwise.
+    #            the other chunks are all the bytes self.empty.
+    #  - counts: maps the key of each chunk of chunks to the number of its
+    #            cells which are not walkable
+    #  - row_blocked: maps the index of each row holding cells which are not
+    #                 walkable to the sorted list of their column indexes
+    #  - col_blocked: maps the index of each column holding cells which are
+    #                 not walkable to the sorted list of their row indexes
+    #  - eviction_radius: when the hero moves to another chunk, the chunks
+    #                     more than that many chunks away from his, in either
+    #                     direction, are written to files; None if they never are
+    #  - directory: the parent directory of the files of the chunks, or None
+    #               for the default temporary directory
+    #  - files: the directory holding the files of the chunks, or None until
+    #           the first one is written. it is removed by close, or when
+    #           @self is garbage collected.
+    #  - written: the number of files written in files
+    #  - resident: the Chunks of @self and its snapshots whose tiles are in memory
+    #  - hero_chunk: the key of the chunk the hero was last seen in
+
+    def __init__(self, nrows, ncols, chunk_size=CHUNK_SIZE, eviction_radius=None,
+                 directory=None, max_distance=None):
+        # creates a map of walkables. the hunting enemies find the hero within
+        # @max_distance steps, by default four times the chunk size.
+        self.nrows = nrows
+        self.ncols = ncols
+        self.chunk_size = chunk_size
+        self.empty = bytes([self.WALKABLE_TILE]) * (chunk_size * chunk_size)
+        self.chunks = {}
+        self.counts = {}
+        self.row_blocked = {}
+        self.col_blocked = {}
+        self.entities = {}
+        self.entities_shared = False
+        self.gateway_pos = None
+        self.removals = 0
+        self.terrain_version = 0
+        self.distance_field = SparseDistanceField(self, max_distance or 4 * chunk_size)
+        self.profiler = None
+        self.rng = random
+        self.zobrist = None
+        self.tiles_hash = 0
+        self.eviction_radius = eviction_radius
+        self.directory = directory
+        self.files = None
+        self.written = 0
+        self.resident = weakref.WeakSet()
+        self.hero_chunk = None
+
+    @staticmethod
+    def from_rows(rows, **options):
+        # @rows must be a list of strings of equal length. @options are passed to ChunkedMap.
+        result = ChunkedMap(len(rows), len(rows[0]), **options)
+        for row, line in enumerate(rows):
+            for match in NOT_WALKABLE_RE.finditer(line.encode('latin-1')):
+                result.set_tile((row, match.start()), match.group()[0])
+        return result
+
+    @staticmethod
+    def from_dungeon(the_dungeon, **options):
+        # returns the map of the template of the dungeon.Dungeon @the_dungeon,
+        # with walkables at the spawn positions. @options are passed to ChunkedMap.
+        # the template is read one row at a time, so it is never copied whole.
+        result = ChunkedMap(the_dungeon.nrows, the_dungeon.ncols, **options)
+        tiles, ncols = the_dungeon.tiles, the_dungeon.ncols
+        spawn_tile = ord('S')
+        for row in range(the_dungeon.nrows):
+            start = the_dungeon.tiles_start + row * ncols
+            for match in NOT_WALKABLE_RE.finditer(tiles, start, start + ncols):
+                if tiles[match.start()] != spawn_tile:
+                    result.set_tile((row, match.start() - start), tiles[match.start()])
+        return result
+
+    def locate(self, pos):
+        # returns (<key of the chunk of @pos>, <index of @pos within the chunk>)
+        size = self.chunk_size
+        chunk_row, row = divmod(pos[0], size)
+        chunk_col, col = divmod(pos[1], size)
+        return (chunk_row, chunk_col), row * size + col
+
+    def chunk_tiles(self, key):
+        # returns the tiles of the chunk @key, reading them from its file if needed
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            return self.empty
+        if type(chunk) is bytearray:
+            return chunk
+        if chunk.tiles is None:
+            with open(chunk.path, 'rb') as f:
+                chunk.tiles = f.read()
+            self.resident.add(chunk)
+        return chunk.tiles
+
+    def tile(self, pos):
+        key, index = self.locate(pos)
+        return self.chunk_tiles(key)[index]
+
+    def set_tile(self, pos, tile):
+        # makes @tile the tile of the cell at @pos and returns its former tile
+        key, index = self.locate(pos)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            if tile == self.WALKABLE_TILE:
+                return tile
+            chunk = self.chunks[key] = bytearray(self.empty)
+            self.counts[key] = 0
+        elif type(chunk) is not bytearray:
+            chunk = self.chunks[key] = bytearray(self.chunk_tiles(key))
+        old_tile = chunk[index]
+        chunk[index] = tile
+        if (old_tile == self.WALKABLE_TILE) == (tile == self.WALKABLE_TILE):
+            return old_tile
+
+        row, col = pos
+        cols = self.row_blocked.setdefault(row, [])
+        rows = self.col_blocked.setdefault(col, [])
+        if old_tile == self.WALKABLE_TILE:
+            bisect.insort(cols, col)
+            bisect.insort(rows, row)
+            self.counts[key] += 1
+        else:
+            del cols[bisect.bisect_left(cols, col)]
+            del rows[bisect.bisect_left(rows, row)]
+            if not cols:
+                del self.row_blocked[row]
+            if not rows:
+                del self.col_blocked[col]
+            self.counts[key] -= 1
+            if self.counts[key] == 0:
+                # the chunk is empty again
+                del self.chunks[key], self.counts[key]
+        return old_tile
+
+    def __getitem__(self, pos):
+        return self.entities.get(pos[0] * self.ncols + pos[1]) or chr(self.tile(pos))
+
+    def __setitem__(self, pos, value):
+        index = pos[0] * self.ncols + pos[1]
+        if self.entities_shared:
+            self.entities = dict(self.entities)
+            self.entities_shared = False
+        if type(value) is str:
+            tile = ord(value)
+            self.entities.pop(index, None)
+        else:
+            tile = ord(value.TILE)
+            self.entities[index] = value
+        old_tile = self.set_tile(pos, tile)
+        if self.PASSABLE[old_tile] != self.PASSABLE[tile]:
+            self.terrain_version += 1
+        if tile == self.HERO_TILE:
+            self.follow(pos)
+
+    def first_blocker(self, pos, direction, limit=None):
+        if self.profiler is not None:
+            self.profiler.count('sight_lines')
+        row, col = pos
+        if direction == 'left' or direction == 'right':
+            line, coord = self.row_blocked.get(row, ()), col
+        else:
+            line, coord = self.col_blocked.get(col, ()), row
+        if direction == 'right' or direction == 'down':
+            i = bisect.bisect_right(line, coord)
+            if i == len(line):
+                return None
+            steps = line[i] - coord
+        else:
+            i = bisect.bisect_left(line, coord) - 1
+            if i < 0:
+                return None
+            steps = coord - line[i]
+        if limit is not None and steps > limit:
+            return None
+        drow, dcol = self.STEPS[direction]
+        return (row + drow * steps, col + dcol * steps)
+
+    def contains_treasure_at(self, pos):
+        return (self.tile(pos) == self.TREASURE_CHEST_TILE
+                and pos[0] * self.ncols + pos[1] in self.entities)
+
+    def can_move_to(self, pos):
+        if not self.pos_is_valid(pos):
+            return False
+        tile = self.tile(pos)
+        return (tile == self.WALKABLE_TILE
+                or tile == self.GATEWAY_TILE
+                or (tile == self.TREASURE_CHEST_TILE and pos[0] * self.ncols + pos[1] in self.entities))
+
+    def row_tiles(self, row, left, width):
+        size = self.chunk_size
+        parts = []
+        col, end = left, left + width
+        while col < end:
+            key, index = self.locate((row, col))
+            count = min(end - col, size - col % size)
+            parts.append(self.chunk_tiles(key)[index:index + count])
+            col += count
+        return b''.join(parts)
+
+    def share(self):
+        # makes all the chunks of @self Chunks, which snapshots may share
+        for key, chunk in self.chunks.items():
+            if type(chunk) is bytearray:
+                chunk = self.chunks[key] = Chunk(key, bytes(chunk))
+                self.resident.add(chunk)
+
+    def snapshot(self):
+        self.share()
+        self.entities_shared = True
+        return (dict(self.chunks), dict(self.counts), self.entities,
+                {row: list(cols) for row, cols in self.row_blocked.items()},
+                {col: list(rows) for col, rows in self.col_blocked.items()})
+
+    def restore(self, contents):
+        chunks, counts, self.entities, row_blocked, col_blocked = contents
+        self.chunks, self.counts = dict(chunks), dict(counts)
+        self.row_blocked = {row: list(cols) for row, cols in row_blocked.items()}
+        self.col_blocked = {col: list(rows) for col, rows in col_blocked.items()}
+        self.entities_shared = True
+        self.terrain_version += 1
+
+    def follow(self, pos):
+        # called when the hero moves to @pos
+        key = self.locate(pos)[0]
+        if key != self.hero_chunk:
+            self.hero_chunk = key
+            if self.eviction_radius is not None:
+                self.evict(key, self.eviction_radius)
+
+    def evict(self, center, radius):
+        # writes to files the tiles of the chunks of @self and its snapshots
+        # which are more than @radius chunks away from the chunk @center,
+        # and drops them from memory
+        def is_far(key):
+            return max(abs(key[0] - center[0]), abs(key[1] - center[1])) > radius
+        if any(is_far(key) for key in self.chunks):
+            self.share()
+        for chunk in list(self.resident):
+            if not is_far(chunk.key):
+                continue
+            if chunk.path is None:
+                if self.files is None:
+                    self.files = tempfile.mkdtemp(prefix='chunks-', dir=self.directory)
+                    self.remove_files = weakref.finalize(self, shutil.rmtree, self.files, True)
+                chunk.path = os.path.join(self.files, f'{self.written}.chunk')
+                self.written += 1
+                with open(chunk.path, 'wb') as f:
+                    f.write(chunk.tiles)
+            chunk.tiles = None
+            self.resident.discard(chunk)
+
+    def close(self):
+        # removes the files of the chunks. @self and its snapshots must not
+        # be used afterwards if any chunk was written.
+        if self.files is not None:
+            self.remove_files()
+
+def create_game(the_dungeon, spawn_pos, seed=None, **options):
+    # returns the game of the dungeon.Dungeon @the_dungeon with the hero at
+    # @spawn_pos, played on a ChunkedMap. @options are passed to ChunkedMap.
+    # unlike the_dungeon.create_game, nothing as large as the map is allocated.
+    return the_dungeon.populate(ChunkedMap.from_dungeon(the_dungeon, **options), spawn_pos, seed)
@@ -0,0 +1,189 @@
+# this module estimates how hard dungeons are: for each spawn position, it
+# plays games with a randomized policy (each game with its own seed, so the
+# chests give different treasures) and reports the probability of winning
+# with a confidence interval. the games are played in batches over a pool
+# of processes, and no more batches are played for a spawn position once
+# its interval is narrow enough.
+#
+# usage: python difficulty.py [options] <dungeon file or directory>...
+
+import os
+import sys
+import json
+import math
+import argparse
+import statistics
+import collections
+import concurrent.futures
+import simulation
+import evaluate
+import dungeon_cache
+
+def wilson_interval(wins, games, confidence):
+    # returns the (<low>, <high>) Wilson score interval of the probability of
+    # winning, with the given @confidence, after @wins wins in @games games
+    if games == 0:
+        return 0.0, 1.0
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    rate = wins / games
+    denominator = 1 + z * z / games
+    center = (rate + z * z / (2 * games)) / denominator
+    margin = z * math.sqrt(rate * (1 - rate) / games + z * z / (4 * games * games)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+def play_batch(job):
+    # plays the games described by @job, which has the form
+    # (<path>, <spawn_pos>, <policy name>, <first seed>, <games>, <max_turns>).
+    # the games are played with evaluate.play_game and the seeds following
+    # <first seed>, like evaluate.play_job.
+    # returns (<path>, <spawn_pos>, <dict mapping each status name to its count>,
+    #          <turns of all the games>)
+    path, spawn_pos, policy, first_seed, games, max_turns = job
+    the_dungeon = evaluate.load_dungeon(path)
+    counts = dict.fromkeys(simulation.STATUS_NAMES.values(), 0)
+    turns = 0
+    for seed in range(first_seed, first_seed + games):
+        result = evaluate.play_game(the_dungeon, spawn_pos, policy, seed, max_turns)
+        counts[result.name] += 1
+        turns += result.turns
+    return path, spawn_pos, counts, turns
+
+class Estimate:
+    # the estimated difficulty of a spawn position of a dungeon
+    # attributes:
+    #  - path, spawn_pos
+    #  - counts: maps each status name to the number of games which ended with it
+    #  - turns: the total number of turns of the games
+    #  - confidence: the confidence of the intervals
+    #  - converged: True if the interval became narrow enough before the
+    #               maximum number of games was played
+
+    def __init__(self, path, spawn_pos, confidence):
+        self.path = path
+        self.spawn_pos = spawn_pos
+        self.counts = dict.fromkeys(simulation.STATUS_NAMES.values(), 0)
+        self.turns = 0
+        self.confidence = confidence
+        self.converged = False
+
+    def add(self, counts, turns):
+        for name, count in counts.items():
+            self.counts[name] += count
+        self.turns += turns
+
+    @property
+    def games(self):
+        return sum(self.counts.values())
+
+    @property
+    def win_rate(self):
+        return self.counts['won'] / self.games if self.games else 0.0
+
+    @property
+    def interval(self):
+        return wilson_interval(self.counts['won'], self.games, self.confidence)
+
+    @property
+    def margin(self):
+        # half the width of self.interval
+        low, high = self.interval
+        return (high - low) / 2
+
+    def as_dict(self):
+        low, high = self.interval
+        return {'dungeon': self.path, 'spawn': list(self.spawn_pos), 'games': self.games,
+                **self.counts, 'win_rate': self.win_rate, 'low': low, 'high': high,
+                'confidence': self.confidence, 'converged': self.converged,
+                'mean_turns': self.turns / self.games if self.games else 0.0}
+
+def estimate(paths, policy='random', confidence=0.95, margin=0.02, min_games=100,
+             max_games=10000, batch_size=25, max_turns=500, workers=None):
+    # estimates the probability of winning from every spawn position of every
+    # dungeon in @paths and returns the list of their Estimates.
+    # games are played in batches of @batch_size until the @confidence interval
+    # of an estimate is at most @margin away from its center, once at least
+    # @min_games games were played, or until @max_games games were played.
+    # the result only depends on the arguments: the batches of an estimate are
+    # counted in order, and those played after it converged are dropped.
+    if workers is None:
+        workers = os.cpu_count() or 1
+    estimates = [Estimate(path, spawn_pos, confidence)
+                 for path in paths for spawn_pos in evaluate.load_dungeon(path).spawn_posns]
+    # the batches which are being played for each estimate, in order
+    pending = {estimate: collections.deque() for estimate in estimates}
+    # the number of games of each estimate which are played or being played
+    scheduled = dict.fromkeys(estimates, 0)
+    # the estimates which may need more games
+    active = list(estimates)
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        def schedule():
+            # submits batches, taking turns between the active estimates, so that
+            # every worker has a batch to play and another one waiting
+            in_flight = sum(map(len, pending.values()))
+            submitted = True
+            while submitted and in_flight < 2 * workers:
+                submitted = False
+                for estimate in active:
+                    if in_flight < 2 * workers and scheduled[estimate] < max_games:
+                        games = min(batch_size, max_games - scheduled[estimate])
+                        job = (estimate.path, estimate.spawn_pos, policy, scheduled[estimate],
+                               games, max_turns)
+                        pending[estimate].append(executor.submit(play_batch, job))
+                        scheduled[estimate] += games
+                        in_flight += 1
+                        submitted = True
+
+        schedule()
+        while active:
+            concurrent.futures.wait([future for batches in pending.values() for future in batches],
+                                    return_when=concurrent.futures.FIRST_COMPLETED)
+            for estimate in list(active):
+                batches = pending[estimate]
+                while batches and batches[0].done():
+                    path, spawn_pos, counts, turns = batches.popleft().result()
+                    estimate.add(counts, turns)
+                    if estimate.games >= min_games and estimate.margin <= margin:
+                        estimate.converged = True
+                        break
+                if estimate.converged or estimate.games >= max_games:
+                    for future in batches:
+                        future.cancel()
+                    batches.clear()
+                    active.remove(estimate)
+            schedule()
+    return estimates
+
+def print_report(estimates, file=sys.stdout):
+    for estimate in estimates:
+        low, high = estimate.interval
+        note = '' if estimate.converged else ' (not converged)'
+        print(f'{estimate.path} spawn {estimate.spawn_pos}: win rate {estimate.win_rate:.3f} '
+              f'[{low:.3f}, {high:.3f}] after {estimate.games} games{note}', file=file)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='estimate the difficulty of dungeons')
+    parser.add_argument('paths', nargs='+', help='dungeon files or directories')
+    parser.add_argument('--policy', default='random', choices=sorted(simulation.POLICIES))
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--margin', type=float, default=0.02,
+                        help='stop once the confidence interval is at most this far '
+                             'from its center')
+    parser.add_argument('--min-games', type=int, default=100)
+    parser.add_argument('--max-games', type=int, default=10000, help='per spawn position')
+    parser.add_argument('--batch-size', type=int, default=25)
+    parser.add_argument('--max-turns', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--json', metavar='FILE', help='write the estimates as JSON to FILE')
+    args = parser.parse_args(argv)
+
+    estimates = estimate(dungeon_cache.dungeon_paths(args.paths), args.policy, args.confidence,
+                         args.margin, args.min_games, args.max_games, args.batch_size,
+                         args.max_turns, args.workers)
+    print_report(estimates)
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump([estimate.as_dict() for estimate in estimates], f, indent=1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
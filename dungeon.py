@@ -1,10 +1,18 @@
+import os
+import re
 import json
-import copy
+import mmap
+import random
+import array
+import bisect
 import treasures
 import actors
-import os
 import itertools
 import utils
+import pathfinding
+
+# the one-character string for each tile code
+CHARS = tuple(chr(code) for code in range(256))
 
 class Map:
     WALKABLE = '.'
@@ -17,69 +25,320 @@ class Map:
     SOUTH_BORDER = '#'
     WEST_BORDER = '#'
     EAST_BORDER = '#'
-    
+    # drawn instead of a border where only a part of the map is shown
+    VIEW_EDGE = ':'
+
+    # the tile of a cell is the code of the character displayed for it
+    WALKABLE_TILE = ord(WALKABLE)
+    GATEWAY_TILE = ord(GATEWAY)
+    TREASURE_CHEST_TILE = ord(TREASURE_CHEST)
+
+    # PASSABLE[tile] is 1 iff walkers can pass through cells with that tile,
+    # possibly after the thing occupying them has moved
+    PASSABLE = bytes(map((WALKABLE + GATEWAY + TREASURE_CHEST + HERO + ENEMY).__contains__, CHARS))
+
+    # attributes:
+    #  - nrows, ncols
+    #  - tiles: a bytearray holding the tile of each cell, row after row
+    #  - entities: a dict mapping the indexes of the cells containing an object
+    #              (an Actor or a TreasureChest) to that object.
+    #              the tile of such a cell is the object's TILE.
+    #  - gateway_pos
+    #  - row_blockers: row_blockers[i] is the sorted list of the column indexes of
+    #                  the cells in the i-th row which hold a hero, an enemy or a chest
+    #  - col_blockers: col_blockers[j] is the sorted list of the row indexes of
+    #                  the cells in the j-th column which hold a hero, an enemy or a chest
+    #    both are None until they are needed for the first time.
+    #  - static_sight: a dict mapping each direction to an array('i') holding, for
+    #                  each cell (indexed like tiles), the number of steps from it to
+    #                  the nearest static blocker in that direction, or to the
+    #                  outside of the map if there is no such blocker. the static
+    #                  blockers are the cells which are neither walkable nor hold
+    #                  a hero, an enemy or a chest; they don't change during a game.
+    #                  None until it is needed for the first time. the arrays are
+    #                  never modified, so they may be shared between maps.
+    #  - removals: the number of times cleanup_at was called
+    #  - terrain_version: incremented whenever a cell becomes or stops being passable
+    #  - distance_field: the pathfinding.DistanceField towards the hero
+    #  - zobrist: the solver.ZobristKeys which tiles_hash is computed with, or None
+    #  - tiles_hash: the Zobrist hash of tiles while zobrist is not None; it is
+    #                updated with each change of a cell
+
+    # matches the tiles of the cells which block the view and may change during a game
+    DYNAMIC_BLOCKER_RE = re.compile(rb'[HET]')
+    # matches the tiles of the static blockers
+    STATIC_BLOCKER_RE = re.compile(rb'[^.HET]')
+    # IS_DYNAMIC_BLOCKER[tile] and IS_STATIC_BLOCKER[tile] are 1 iff the tile is matched
+    # by DYNAMIC_BLOCKER_RE and by STATIC_BLOCKER_RE respectively
+    IS_DYNAMIC_BLOCKER = bytes(map((HERO + ENEMY + TREASURE_CHEST).__contains__, CHARS))
+    IS_STATIC_BLOCKER = bytes(1 - is_other for is_other in
+                              map((WALKABLE + HERO + ENEMY + TREASURE_CHEST).__contains__, CHARS))
+
+    # the change of (<row>, <column>) caused by a step in each direction
+    STEPS = {'up': (-1, 0), 'down': (1, 0), 'left': (0, -1), 'right': (0, 1)}
+
     def __init__(self, matrix):
-        self.matrix = matrix
-                
-    @property
-    def nrows(self):
-        return len(self.matrix)
+        # @matrix must be a list of rows of equal length. each cell must be
+        # either a one-character string or an object with a TILE attribute.
+        self.init(len(matrix), len(matrix[0]), bytearray(len(matrix) * len(matrix[0])))
+        for pos in self.posns_lrtb:
+            self[pos] = matrix[pos[0]][pos[1]]
 
-    @property
-    def ncols(self):
-        return len(self.matrix[0])
+    @staticmethod
+    def from_rows(rows):
+        # @rows must be a list of strings of equal length
+        return Map.from_tiles(len(rows), len(rows[0]), bytearray(''.join(rows), 'latin-1'))
+
+    @staticmethod
+    def from_tiles(nrows, ncols, tiles):
+        # @tiles must be a bytearray of the @nrows * @ncols tiles, row after row.
+        # it is used as it is, without being copied.
+        result = Map.__new__(Map)
+        result.init(nrows, ncols, tiles)
+        return result
+
+    def init(self, nrows, ncols, tiles):
+        self.nrows = nrows
+        self.ncols = ncols
+        self.tiles = tiles
+        self.entities = {}
+        self.entities_shared = False
+        self.gateway_pos = None
+        self.row_blockers = self.col_blockers = None
+        self.static_sight = None
+        self.removals = 0
+        self.terrain_version = 0
+        self.distance_field = pathfinding.DistanceField(self)
+        self.zobrist = None
+        self.tiles_hash = 0
+        # the profiling.Profiler of the game played on the map, or None
+        self.profiler = None
+        # the random number generator used by the chests; games replace it with their own
+        self.rng = random
+
+    def build_blockers(self):
+        # computes self.row_blockers and self.col_blockers from self.tiles
+        ncols = self.ncols
+        self.row_blockers = [[match.start() - start
+                              for match in self.DYNAMIC_BLOCKER_RE.finditer(self.tiles, start, start + ncols)]
+                             for start in range(0, len(self.tiles), ncols)]
+        self.col_blockers = [[] for col in range(ncols)]
+        for row, cols in enumerate(self.row_blockers):
+            for col in cols:
+                self.col_blockers[col].append(row)
+
+    def build_static_sight(self):
+        # computes self.static_sight from self.tiles.
+        # the arrays are filled one run of cells between two static blockers at a time.
+        nrows, ncols = self.nrows, self.ncols
+        ramp = array.array('i', range(max(nrows, ncols) + 2))
+        sight = {direction: array.array('i', bytes(4 * len(self.tiles))) for direction in self.STEPS}
+
+        def fill(forward, backward, blockers, length, first, stride):
+            # fills the arrays @forward and @backward for the line of @length cells whose
+            # first cell has index @first and whose consecutive cells are @stride apart.
+            # @blockers must be the sorted positions within the line of its static blockers.
+            # each cell gets the distance to the blocker before it in @backward and
+            # to the blocker after it in @forward, where the cells at -1 and @length
+            # count as blockers.
+            def cells(low, size):
+                # returns the slice of the @size cells of the line starting at @low
+                start = first + low * stride
+                return slice(start, start + (size - 1) * stride + 1, stride)
+
+            previous = -1
+            for blocker in blockers + [length]:
+                size = min(blocker, length - 1) - previous
+                if size > 0:
+                    backward[cells(previous + 1, size)] = ramp[1:size + 1]
+                previous = blocker
+            following = length
+            for blocker in reversed([-1] + blockers):
+                size = following - max(blocker, 0)
+                if size > 0:
+                    forward[cells(max(blocker, 0), size)] = ramp[size:0:-1]
+                following = blocker
+
+        col_statics = [[] for col in range(ncols)]
+        for row in range(nrows):
+            start = row * ncols
+            cols = [match.start() - start
+                    for match in self.STATIC_BLOCKER_RE.finditer(self.tiles, start, start + ncols)]
+            fill(sight['right'], sight['left'], cols, ncols, start, 1)
+            for col in cols:
+                col_statics[col].append(row)
+        for col, rows in enumerate(col_statics):
+            fill(sight['down'], sight['up'], rows, nrows, col, ncols)
+        self.static_sight = sight
+
+    def first_blocker(self, pos, direction, limit=None):
+        # returns the position of the first cell which is not walkable when
+        # going from @pos (excluding it) in @direction, or None if there is no
+        # such cell within @self or within @limit steps of @pos.
+        if self.row_blockers is None:
+            self.build_blockers()
+        if self.static_sight is None:
+            self.build_static_sight()
+        if self.profiler is not None:
+            self.profiler.count('sight_lines')
+        row, col = pos
+        steps = self.static_sight[direction][row * self.ncols + col]
+
+        # a dynamic blocker may be closer
+        horizontal = direction == 'left' or direction == 'right'
+        line, coord = (self.row_blockers[row], col) if horizontal else (self.col_blockers[col], row)
+        if direction == 'right' or direction == 'down':
+            i = bisect.bisect_right(line, coord)
+            if i < len(line):
+                steps = min(steps, line[i] - coord)
+        else:
+            i = bisect.bisect_left(line, coord) - 1
+            if i >= 0:
+                steps = min(steps, coord - line[i])
+
+        if limit is not None and steps > limit:
+            return None
+        drow, dcol = self.STEPS[direction]
+        pos = (row + drow * steps, col + dcol * steps)
+        return pos if self.pos_is_valid(pos) else None
 
     def cleanup_at(self, pos):
+        self.removals += 1
         self[pos] = self.WALKABLE
-        
+
     def contains_treasure_at(self, pos):
         # returns True iff self[pos] is a treasure
-        return isinstance(self[pos], treasures.TreasureChest)
+        index = pos[0] * self.ncols + pos[1]
+        return self.tiles[index] == self.TREASURE_CHEST_TILE and index in self.entities
 
     def pos_is_valid(self, pos):
         row, col = pos
         return row >= 0 and row < self.nrows and col >= 0 and col < self.ncols
-        
+
     def can_move_to(self, pos):
         # returns True if pos is within @self and if there is nothing
         # at that position that prevents you from moving there.
-        return (self.pos_is_valid(pos)
-                and (isinstance(self[pos], treasures.TreasureChest)
-                     or self[pos] is self.WALKABLE
-                     or self[pos] is self.GATEWAY))
+        if not self.pos_is_valid(pos):
+            return False
+        index = pos[0] * self.ncols + pos[1]
+        tile = self.tiles[index]
+        return (tile == self.WALKABLE_TILE
+                or tile == self.GATEWAY_TILE
+                or (tile == self.TREASURE_CHEST_TILE and index in self.entities))
 
-    def display(self):
-        print(' ' + self.NORTH_BORDER * self.ncols)
+    def row_tiles(self, row, left, width):
+        # returns the tiles of the @width cells of the @row-th row starting at
+        # the column index @left, as a bytes-like object
+        start = row * self.ncols + left
+        return self.tiles[start:start + width]
+
+    @property
+    def rows(self):
+        # returns an iterator of the rows of @self as they are displayed
         for row in range(self.nrows):
-            lst = [self.WEST_BORDER]
-            for col in range(self.ncols):
-                if isinstance(self[row,col], treasures.TreasureChest):
-                    lst.append(self.TREASURE_CHEST)
-                elif isinstance(self[row,col], actors.Hero):
-                    lst.append(self.HERO)
-                elif isinstance(self[row,col], actors.Enemy):
-                    lst.append(self.ENEMY)
-                else:
-                    lst.append(self[row,col])
-            lst.append(self.EAST_BORDER)
-            print(''.join(lst))
-        print(' ' + self.SOUTH_BORDER * self.ncols)
-        print()
+            yield self.row_tiles(row, 0, self.ncols).decode('latin-1')
+
+    @property
+    def lines(self):
+        # returns the lines printed by self.display(), including the borders
+        return self.window_lines(0, 0, self.nrows, self.ncols)
+
+    def window_lines(self, top, left, height, width):
+        # returns the lines showing the cells of @self whose row index is in
+        # [@top, @top + @height) and whose column index is in [@left, @left + @width).
+        # the borders on the sides where @self goes on are drawn with VIEW_EDGE.
+        # the window must lie within @self.
+        north = self.NORTH_BORDER if top == 0 else self.VIEW_EDGE
+        south = self.SOUTH_BORDER if top + height == self.nrows else self.VIEW_EDGE
+        west = self.WEST_BORDER if left == 0 else self.VIEW_EDGE
+        east = self.EAST_BORDER if left + width == self.ncols else self.VIEW_EDGE
+
+        return [' ' + north * width,
+                *(west + self.row_tiles(row, left, width).decode('latin-1') + east
+                  for row in range(top, top + height)),
+                ' ' + south * width,
+                '']
+
+    def view_lines(self, center, height, width):
+        # returns the lines showing at most @height x @width cells of @self,
+        # with @center as close to the middle as possible
+        height, width = min(height, self.nrows), min(width, self.ncols)
+        top = min(max(0, center[0] - height // 2), self.nrows - height)
+        left = min(max(0, center[1] - width // 2), self.ncols - width)
+        return self.window_lines(top, left, height, width)
+
+    def display(self):
+        print('\n'.join(self.lines))
 
     def __getitem__(self, pos):
         # pos must be a pair (<row-index>, <column-index>)
-        row, col = pos
-        return self.matrix[row][col]
+        index = pos[0] * self.ncols + pos[1]
+        return self.entities.get(index) or CHARS[self.tiles[index]]
 
     def __setitem__(self, pos, value):
         # pos must be a pair (<row-index>, <column-index>)
-        row, col = pos
-        self.matrix[row][col] = value
-    
+        index = pos[0] * self.ncols + pos[1]
+        if self.entities_shared:
+            self.entities = dict(self.entities)
+            self.entities_shared = False
+        old_tile = self.tiles[index]
+        if type(value) is str:
+            self.tiles[index] = tile = ord(value)
+            self.entities.pop(index, None)
+        else:
+            self.tiles[index] = tile = ord(value.TILE)
+            self.entities[index] = value
+
+        if self.PASSABLE[old_tile] != self.PASSABLE[tile]:
+            self.terrain_version += 1
+
+        if self.zobrist is not None:
+            self.tiles_hash ^= self.zobrist.key(index, old_tile) ^ self.zobrist.key(index, tile)
+
+        if (self.row_blockers is not None
+            and self.IS_DYNAMIC_BLOCKER[old_tile] != self.IS_DYNAMIC_BLOCKER[tile]):
+            row, col = pos
+            cols, rows = self.row_blockers[row], self.col_blockers[col]
+            if self.IS_DYNAMIC_BLOCKER[old_tile]:
+                del cols[bisect.bisect_left(cols, col)]
+                del rows[bisect.bisect_left(rows, row)]
+            else:
+                bisect.insort(cols, col)
+                bisect.insort(rows, row)
+
+        if self.IS_STATIC_BLOCKER[old_tile] or self.IS_STATIC_BLOCKER[tile]:
+            if old_tile != tile:
+                # the arrays may be shared, so they are recomputed instead of updated
+                self.static_sight = None
+
+    def snapshot(self):
+        # returns the current contents of @self, to be passed to restore.
+        # the entities are not copied; instead, they are shared with @self
+        # until @self modifies them.
+        self.entities_shared = True
+        return bytes(self.tiles), self.entities, self.static_sight, self.tiles_hash
+
+    def restore(self, contents):
+        # @contents must have been returned by self.snapshot()
+        tiles, self.entities, self.static_sight, self.tiles_hash = contents
+        self.tiles[:] = tiles
+        self.entities_shared = True
+        self.row_blockers = self.col_blockers = None
+        self.terrain_version += 1
+
+    def use_zobrist(self, zobrist):
+        # from now on, keeps self.tiles_hash equal to the hash of self.tiles
+        # with the solver.ZobristKeys @zobrist, or stops hashing if @zobrist is None
+        self.zobrist = zobrist
+        self.tiles_hash = 0 if zobrist is None else zobrist.hash(self.tiles)
+
     def positions(self, pos, direction):
+        profiler = self.profiler
         while True:
             pos = utils.move_pos(pos, direction)
             if self.pos_is_valid(pos):
+                if profiler is not None:
+                    profiler.count('tiles_scanned')
                 yield pos
             else:
                 break
@@ -91,156 +350,458 @@ class Map:
         for rowi in range(self.nrows):
             for coli in range(self.ncols):
                 yield (rowi, coli)
-    
+
     def neighbours(self, pos):
         # returns an iterator of the positions around @pos,
         # starting from the top left and going clockwise.
-        
+
         def fits(pos):
             return 0 <= pos[0] < self.nrows and 0 <= pos[1] < self.ncols
-        
+
         r, c = pos
         candidates = ((r-1, c-1), (r-1, c), (r-1, c+1),
                       (r, c-1), (r, c+1),
                       (r+1, c-1), (r+1, c), (r+1, c+1))
-        
+
         return filter(fits, candidates)
 
+class Snapshot:
+    # the state of a Game at some point in time. attributes:
+    #  - stats: the values of actor.STATE for each actor of the game, one after the other
+    #  - enemies: the enemies tracked by the game
+    #  - contents: the contents of the game's map, as returned by Map.snapshot
+    #  - rng_state: the state of the game's random number generator
+
+    def __init__(self, stats, enemies, contents, rng_state):
+        self.stats = stats
+        self.enemies = enemies
+        self.contents = contents
+        self.rng_state = rng_state
+
 class Game:
     WON = object()
     KILLED = object()
     QUIT = object()
-    
-    def __init__(self, hero, enemies, map):
+
+    # the commands which restart and quit the game, besides the hero's commands
+    RESTART_COMMAND = 'restart'
+    QUIT_COMMAND = 'quit'
+
+    # the name of the checkpoint holding the state before the first round
+    INITIAL = 'initial'
+
+    def __init__(self, hero, enemies, map, seed=None):
         # @hero should be a Hero instance whose map is @map
         # @enemies should be a list of Enemy instances and each enemy's map should be @map
         # @map should be a Map instance
-        
+        # @seed is the seed of the game's random number generator; a random one
+        # is picked if it is None. the same seed and commands give the same game.
+
         self.hero = hero
         self.enemies = enemies
         self.map = map
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.seed = seed
+        self.rng = map.rng = random.Random(seed)
+
+        # the hero and all of the enemies; set by the first snapshot
+        self.actors = None
+        # maps the names of the saved checkpoints to Snapshots
+        self.checkpoints = {}
+        # the value of self.map.removals when self.enemies was last updated
+        self.removals_seen = None
+        # (<height>, <width>) of the part of the map around the hero which is
+        # shown by self.frame, or None if the whole map is shown
+        self.viewport = None
+        # plays the enemies' turns instead of Enemy.do_turn if it is not None,
+        # e.g. a swarm.SwarmEngine
+        self.enemy_engine = None
+        # records the commands played by self.command if it is not None,
+        # e.g. a replay.Replay
+        self.replay = None
+
+    def snapshot(self):
+        # returns a Snapshot of the current state of @self
+        if self.actors is None:
+            self.actors = [self.hero, *self.enemies]
+        stats = tuple(getattr(actor, attr) for actor in self.actors for attr in actor.STATE)
+        return Snapshot(stats, tuple(self.enemies), self.map.snapshot(), self.rng.getstate())
+
+    def restore(self, snapshot):
+        # brings @self to the state in which @snapshot was taken.
+        # @snapshot must have been returned by self.snapshot()
+        stats = iter(snapshot.stats)
+        for actor in self.actors:
+            for attr in actor.STATE:
+                setattr(actor, attr, next(stats))
+        self.enemies = list(snapshot.enemies)
+        # the snapshot may hold enemies which died in the round it was taken in
+        self.removals_seen = None
+        self.map.restore(snapshot.contents)
+        self.rng.setstate(snapshot.rng_state)
+        if self.enemy_engine is not None:
+            self.enemy_engine.reload()
 
-        # needed for restarting the game
-        self.initial_state = copy.deepcopy(self.__dict__)
+    def save(self, name):
+        # saves the current state as the checkpoint @name
+        self.checkpoints[name] = self.snapshot()
+
+    def rewind(self, name):
+        # brings @self to the state saved as the checkpoint @name
+        self.restore(self.checkpoints[name])
 
     def reset_state(self):
-        cpy = copy.deepcopy(self.initial_state)
-        self.__dict__.update(cpy)
-        
-    def play(self):
-        def display():
-            os.system('clear')
-            self.hero.display()
-            self.map.display()
-        
-        while True:
-            display()
-            
-            try:
-                self.hero.do_turn()
-            except KeyboardInterrupt:
-                command = input('>>> ')
-                if command == 'q':
-                    return self.QUIT
-                elif command == 'r':
-                    self.reset_state()
-                    continue
-                else:
-                    # unknown command
-                    continue
-
-            display()
-                
-            if self.hero.pos == self.map.gateway_pos:
-                return self.WON
-            
-            # after the hero's turn, some enemies may be dead, so stop tracking them
-            self.enemies = [enemy for enemy in self.enemies if enemy.is_alive]
-            
+        # restarts the game
+        if self.INITIAL in self.checkpoints:
+            self.rewind(self.INITIAL)
+
+    @property
+    def profiler(self):
+        # the profiling.Profiler which measures @self, or None.
+        # it is stored in the map so that the actors and the chests can reach it.
+        return self.map.profiler
+
+    @profiler.setter
+    def profiler(self, profiler):
+        self.map.profiler = profiler
+
+    def timed(self, phase, function, *args):
+        # returns @function(*@args), timing it as @phase if @self has a profiler
+        profiler = self.map.profiler
+        if profiler is None:
+            return function(*args)
+        start = profiler.clock()
+        try:
+            return function(*args)
+        finally:
+            profiler.add_time(phase, profiler.clock() - start)
+
+    def hero_turn(self, command=None):
+        # plays the hero's part of a round. @command is passed to Hero.do_turn.
+        # returns self.WON if the hero reached the gateway, None otherwise.
+        if self.INITIAL not in self.checkpoints:
+            # the state is saved only now so that creating a game is cheap
+            self.save(self.INITIAL)
+        self.timed('hero_action', self.hero.do_turn, command)
+        if self.hero.pos == self.map.gateway_pos:
+            return self.WON
+        return None
+
+    def enemies_turn(self):
+        # plays the enemies' part of a round.
+        # returns self.KILLED if the hero died, None otherwise.
+
+        # after the hero's turn, some enemies may be dead, so stop tracking them.
+        # an enemy can only die through Map.cleanup_at
+        if self.map.removals != self.removals_seen:
+            self.removals_seen = self.map.removals
+            self.enemies = self.timed('enemy_filtering', self.living_enemies)
+
+        self.map.distance_field.retarget(self.hero.pos)
+        profiler = self.map.profiler
+        if self.enemy_engine is not None:
+            self.timed('enemy_engine', self.enemy_engine.play_turn)
+        elif profiler is None:
             for enemy in self.enemies:
                 enemy.do_turn()
-                
-            # after the enemies' turn, the hero may have died
-            if not self.hero.is_alive:
-                return self.KILLED
+        else:
+            for enemy in self.enemies:
+                start = profiler.clock()
+                enemy.do_turn()
+                profiler.add_time('enemy_turn', profiler.clock() - start)
+
+        # after the enemies' turn, the hero may have died
+        if not self.hero.is_alive:
+            return self.KILLED
+        return None
+
+    def living_enemies(self):
+        return [enemy for enemy in self.enemies if enemy.is_alive]
+
+    def step(self, command):
+        # plays a whole round in which the hero executes @command.
+        # returns self.WON or self.KILLED if the game ended, None otherwise.
+        return self.hero_turn(command) or self.enemies_turn()
+
+    def command(self, command, renderer=None):
+        # executes a command entered by the player and records it in self.replay.
+        # @command is RESTART_COMMAND, QUIT_COMMAND, or a command of the hero,
+        # which is played as a round. @renderer, if it is given, draws @self
+        # between the hero's turn and the enemies' turn.
+        # returns the status of the game if it ended, None otherwise.
+        if self.replay is not None:
+            self.replay.record(command)
+        if command == self.QUIT_COMMAND:
+            return self.QUIT
+        elif command == self.RESTART_COMMAND:
+            self.reset_state()
+            return None
+        status = self.hero_turn(command)
+        if renderer is not None:
+            self.timed('render', renderer.draw, self.frame)
+        return status or self.enemies_turn()
+
+    @property
+    def frame(self):
+        # returns the lines which show the current state of @self
+        if self.viewport is None:
+            return self.hero.status_lines + self.map.lines
+        return self.hero.status_lines + self.map.view_lines(self.hero.pos, *self.viewport)
+
+    def fit_viewport(self, columns, lines):
+        # sets self.viewport so that the frame fits in a terminal of the given size.
+        # the whole map is shown if it fits.
+        # the status lines, the map borders and the line left for the cursor take space too
+        height = lines - len(self.hero.status_lines) - 3
+        width = columns - 2
+        if self.map.nrows <= height and self.map.ncols <= width:
+            self.viewport = None
+        else:
+            self.viewport = (max(1, height), max(1, width))
+
+    def play(self, renderer=None, keyboard=None, tick=None):
+        # plays @self on the terminal until it ends and returns its status.
+        # @renderer is the render.Renderer which draws @self; by default, one
+        # drawing on the standard output is used. @keyboard is the entered
+        # terminal.Keyboard the keys are read from; by default, one reading
+        # the standard input is entered for the game. see terminal.play for @tick.
+        # interrupting the game, e.g. with ctrl-c, quits it.
+        import asyncio
+        import terminal
+        try:
+            if keyboard is not None:
+                return asyncio.run(terminal.play(self, keyboard, renderer, tick))
+            with terminal.Keyboard() as keyboard:
+                return asyncio.run(terminal.play(self, keyboard, renderer, tick))
+        except KeyboardInterrupt:
+            return self.QUIT
 
 class Dungeon:
     # attributes:
     #  - hero_partial_dict
     #  - enemies_data: used to create the enemy_partial_dicts iterator
-    #  - map_template
-    #  - treasures
-    
+    #  - nrows, ncols
+    #  - tiles: a bytes-like object (e.g. bytes, bytearray or mmap) containing
+    #           the characters of the map template, row after row, starting
+    #           at the index tiles_start
+    #  - tiles_start
+    #  - treasure_data: the list of dicts from which treasures are parsed
+    #  - treasures: the treasures.TreasureTable shared by the chests of all the games
+    #  - cell_index: None, or the dict returned by index_cells
+    #  - base_tiles, base_blockers, base_sight: None, or the values computed by prepare
+
+    # the first line of a dungeon file in the compact format. it is followed by
+    # a line holding the JSON of the dungeon without "map_template", but with
+    # "nrows" and "ncols", and then by the characters of the map template,
+    # row after row, without separators.
+    COMPACT_MAGIC = b'DUNGEON/1\n'
+
+    # the characters of a map template which stand for something else than
+    # a walkable or an obstacle
+    SPECIAL_CHARS = 'STEG'
+    # matches the characters of a map template which are not walkables or obstacles
+    SPECIAL_RE = re.compile(rb'[^.#]')
+
     @staticmethod
     def from_file(path):
-        with open(path) as f:
-            text = f.read()
-        return Dungeon.from_dict(json.loads(text))
-    
+        # @path may be either a JSON file or a file in the compact format
+        with open(path, 'rb') as f:
+            if f.read(len(Dungeon.COMPACT_MAGIC)) == Dungeon.COMPACT_MAGIC:
+                return Dungeon.from_compact_file(path)
+            f.seek(0)
+            return Dungeon.from_dict(json.load(f))
+
     @staticmethod
     def from_dict(dct):
         result = Dungeon.__new__(Dungeon)
         result.hero_partial_dict = dct['hero']
         result.enemy_data = dct['enemies']
-        result.map_template = dct['map_template']
-        result.treasures = [treasures.parse_dict(tdict) for tdict in dct['treasures']]
+        result.treasure_data = dct['treasures']
+        result.treasures = treasures.TreasureTable.from_dicts(dct['treasures'])
+
+        rows = dct['map_template']
+        result.nrows, result.ncols = len(rows), len(rows[0])
+        result.tiles = bytearray(result.nrows * result.ncols)
+        result.tiles_start = 0
+        result.cell_index = None
+        result.base_tiles = result.base_blockers = result.base_sight = None
+        for rowi, row in enumerate(rows):
+            if len(row) != result.ncols:
+                raise ValueError(f'row {rowi} of the map template has the wrong length')
+            start = rowi * result.ncols
+            result.tiles[start:start + result.ncols] = row.encode('latin-1')
+        return result
+
+    @staticmethod
+    def from_compact_file(path):
+        with open(path, 'rb') as f:
+            if f.readline() != Dungeon.COMPACT_MAGIC:
+                raise ValueError(f'{path} is not in the compact dungeon format')
+            header = json.loads(f.readline())
+            tiles, tiles_start = read_rest(f)
+
+        if len(tiles) - tiles_start != header['nrows'] * header['ncols']:
+            raise ValueError(f'{path} does not contain {header["nrows"]}x{header["ncols"]} tiles')
+        return Dungeon.from_header(header, tiles, tiles_start)
+
+    @staticmethod
+    def from_header(header, tiles, tiles_start):
+        # @header must be a dict like the header of a compact file.
+        # @tiles and @tiles_start become the attributes of the result.
+        result = Dungeon.__new__(Dungeon)
+        result.hero_partial_dict = header['hero']
+        result.enemy_data = header['enemies']
+        result.treasure_data = header['treasures']
+        result.treasures = treasures.TreasureTable.from_dicts(header['treasures'])
+        result.nrows, result.ncols = header['nrows'], header['ncols']
+        result.tiles = tiles
+        result.tiles_start = tiles_start
+        result.cell_index = None
+        result.base_tiles = result.base_blockers = result.base_sight = None
         return result
 
+    @property
+    def map_template(self):
+        # returns the list of the rows of the map template
+        return [self.tiles[start:start + self.ncols].decode('latin-1')
+                for start in range(self.tiles_start, self.tiles_end, self.ncols)]
+
+    @property
+    def tiles_end(self):
+        return self.tiles_start + self.nrows * self.ncols
+
+    def save_compact(self, path):
+        # writes @self to @path in the compact format
+        header = {'hero': self.hero_partial_dict, 'enemies': self.enemy_data,
+                  'treasures': self.treasure_data}
+        rows = (memoryview(self.tiles)[start:start + self.ncols]
+                for start in range(self.tiles_start, self.tiles_end, self.ncols))
+        write_compact_file(path, header, self.nrows, self.ncols, rows)
+
+    def index_cells(self):
+        # returns a dict mapping each character of SPECIAL_CHARS to an array of
+        # the indexes of the tiles holding it, in increasing order.
+        # the index of the tile at (<row>, <col>) is <row> * self.ncols + <col>.
+        # the dict is computed once and kept in self.cell_index.
+        if self.cell_index is None:
+            index = {char: array.array('q') for char in self.SPECIAL_CHARS}
+            for match in self.SPECIAL_RE.finditer(self.tiles, self.tiles_start, self.tiles_end):
+                char = match.group().decode('latin-1')
+                if char not in index:
+                    raise ValueError(f'invalid character in map template: "{char}"')
+                index[char].append(match.start() - self.tiles_start)
+            self.cell_index = index
+        return self.cell_index
+
     @property
     def spawn_posns(self):
-        # returns an iterator of @self's spawn positions        
-        nrows = len(self.map_template)
-        ncols = len(self.map_template[0])
-        for rowi in range(nrows):
-            for coli in range(ncols):
-                if self.map_template[rowi][coli] == 'S':
-                    yield (rowi, coli)
-        
+        # returns an iterator of @self's spawn positions
+        return (divmod(index, self.ncols) for index in self.index_cells()['S'])
+
     def games(self):
         return (self.create_game(spawn_pos) for spawn_pos in self.spawn_posns)
 
     @property
-    def enemy_partial_dicts(self):        
+    def enemy_partial_dicts(self):
         if type(self.enemy_data) is list:
             return iter(self.enemy_data)
         return itertools.repeat(self.enemy_data['all'])
-    
-    def create_game(self, spawn_pos):
+
+    def prepare(self):
+        # computes, once, the parts of a game's initial state which are the same
+        # for all games of @self:
+        #  - self.base_tiles: the tiles of the map template with the spawn
+        #                     positions replaced by walkables
+        #  - self.base_blockers: the pair (<row_blockers>, <col_blockers>)
+        #                        of a map with those tiles
+        #  - self.base_sight: the static_sight of a map with those tiles
+        if self.base_tiles is not None:
+            return
+        base_map = Map.from_tiles(self.nrows, self.ncols,
+                                  bytearray(memoryview(self.tiles)[self.tiles_start:self.tiles_end]))
+        for index in self.index_cells()['S']:
+            base_map.tiles[index] = Map.WALKABLE_TILE
+        base_map.build_blockers()
+        self.base_tiles = bytes(base_map.tiles)
+        self.base_blockers = (base_map.row_blockers, base_map.col_blockers)
+        base_map.build_static_sight()
+        self.base_sight = base_map.static_sight
+
+    def create_game(self, spawn_pos, seed=None):
         # @spawn_location must be one of @self's spawn locations.
-        # Returns the Game instance with the hero at @spawn_location.        
+        # Returns the Game instance with the hero at @spawn_location.
+        # @seed is passed to Game.
+        self.prepare()
+        the_map = Map.from_tiles(self.nrows, self.ncols, bytearray(self.base_tiles))
+        row_blockers, col_blockers = self.base_blockers
+        the_map.row_blockers = [list(cols) for cols in row_blockers]
+        the_map.col_blockers = [list(rows) for rows in col_blockers]
+        the_map.static_sight = self.base_sight
+        return self.populate(the_map, spawn_pos, seed)
+
+    def populate(self, the_map, spawn_pos, seed=None):
+        # puts the hero at @spawn_pos and the chests and the enemies of @self
+        # on @the_map, and returns the Game played on it. @the_map must hold
+        # the tiles of the map template, with walkables at the spawn positions.
+        # it is usually a Map, but may be any object with the same interface,
+        # e.g. a chunked.ChunkedMap. @seed is passed to Game.
+        cell_index = self.index_cells()
         enemy_partial_dicts = self.enemy_partial_dicts
         hero = None
         enemies = []
-        the_map = Map([list(row) for row in self.map_template])
-        the_map.gateway_pos = None
-        for pos in the_map.posns_lrtb:
-            char = the_map[pos]
-            if char == 'S':
-                if pos == spawn_pos:
-                    hero_dict = copy.deepcopy(self.hero_partial_dict)
-                    hero_dict['map'] = the_map
-                    hero_dict['pos'] = pos
-                    hero = actors.Hero.from_dict(hero_dict)
-                    the_map[pos] = hero
-                else:
-                    the_map[pos] = Map.WALKABLE
-            elif char == 'T':
-                chest = treasures.TreasureChest(pos, the_map, self.treasures)
-                the_map[pos] = chest
-            elif char == 'E':
-                enemy_dict = next(enemy_partial_dicts)
-                enemy_dict['pos'] = pos
-                enemy_dict['map'] = the_map
-                enemy = actors.Enemy.from_dict(enemy_dict)
-                enemies.append(enemy)
-                the_map[pos] = enemy
-            elif char == 'G':
-                the_map.gateway_pos = pos
-                the_map[pos] = Map.GATEWAY
-            elif char == '#':
-                the_map[pos] = Map.OBSTACLE
-            elif char == '.':
-                the_map[pos] = Map.WALKABLE
-            else:
-                raise ValueError(f'invalid character in map template: "{char}"')
-        return Game(hero, enemies, the_map)
+
+        for index in cell_index['S']:
+            pos = divmod(index, self.ncols)
+            if pos == spawn_pos:
+                hero_dict = dict(self.hero_partial_dict, map=the_map, pos=pos)
+                hero = actors.Hero.from_dict(hero_dict)
+                the_map[pos] = hero
+                break
+        for index in cell_index['T']:
+            pos = divmod(index, self.ncols)
+            the_map[pos] = treasures.TreasureChest(pos, the_map, self.treasures)
+        for index in cell_index['E']:
+            enemy_dict = dict(next(enemy_partial_dicts))
+            enemy_dict['pos'] = divmod(index, self.ncols)
+            enemy_dict['map'] = the_map
+            enemy = actors.Enemy.from_dict(enemy_dict)
+            enemies.append(enemy)
+            the_map[enemy.pos] = enemy
+        if cell_index['G']:
+            the_map.gateway_pos = divmod(cell_index['G'][-1], self.ncols)
+        return Game(hero, enemies, the_map, seed)
+
+# files larger than this many bytes are memory-mapped by read_rest instead of read
+MMAP_THRESHOLD = 1 << 24
+
+def read_rest(f):
+    # returns (<data>, <start>) where <data>[<start>:] holds the rest of the
+    # binary file @f. large files are memory-mapped, so that only the parts
+    # which are used are loaded. a mapping holds a file descriptor for as long
+    # as it is alive, so smaller files are read: a process may then keep any
+    # number of them without running out of file descriptors.
+    start = f.tell()
+    if os.fstat(f.fileno()).st_size <= MMAP_THRESHOLD:
+        return f.read(), 0
+    # the mapping stays valid after the file is closed
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), start
+
+def write_compact_file(path, dct, nrows, ncols, rows):
+    # writes a dungeon file in the compact format to @path.
+    # @dct must have the keys {'hero', 'enemies', 'treasures'} of a JSON dungeon.
+    # @rows must be an iterable of @nrows bytes-like objects of length @ncols;
+    # it is consumed one row at a time, so it may be a generator.
+    header = dict(dct, nrows=nrows, ncols=ncols)
+    header.pop('map_template', None)
+    with open(path, 'wb') as f:
+        f.write(Dungeon.COMPACT_MAGIC)
+        f.write(json.dumps(header).encode() + b'\n')
+        written = 0
+        for row in rows:
+            if len(row) != ncols:
+                raise ValueError(f'row {written} has the wrong length')
+            f.write(row)
+            written += 1
+    if written != nrows:
+        raise ValueError(f'expected {nrows} rows, got {written}')
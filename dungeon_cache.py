@@ -0,0 +1,148 @@
+# this module compiles dungeon files into binary caches which are reused for
+# as long as the dungeon files don't change. the cache of a dungeon file is
+# stored in the CACHE_DIRECTORY of the directory holding it, so that globs
+# like dungeons/* don't match the caches.
+#
+# a cache file consists of:
+#  - the line CACHE_MAGIC
+#  - a line holding the SHA-256 hex digest of the dungeon file
+#  - a line holding the JSON of the header of the compact dungeon format
+#    (see dungeon.Dungeon.COMPACT_MAGIC) with the additional keys "byteorder"
+#    and "cells", which maps each character of Dungeon.SPECIAL_CHARS to the
+#    number of tiles holding it
+#  - the tiles of the map template
+#  - for each character of Dungeon.SPECIAL_CHARS, the array('q') of the indexes
+#    of the tiles holding it, as returned by Dungeon.index_cells
+#
+# usage: python dungeon_cache.py <dungeon file or directory>...
+
+import os
+import sys
+import json
+import array
+import hashlib
+import dungeon
+
+CACHE_MAGIC = b'DUNGEON-CACHE/1\n'
+CACHE_SUFFIX = '.cache'
+CACHE_DIRECTORY = '.dungeon-cache'
+
+def cache_path(path):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, CACHE_DIRECTORY, name + CACHE_SUFFIX)
+
+def file_hash(path):
+    # returns the SHA-256 hex digest of the contents of @path
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def write_cache(path, the_dungeon, source_hash):
+    # writes the cache of @the_dungeon, parsed from a file with hash @source_hash, to @path
+    cell_index = the_dungeon.index_cells()
+    header = {'hero': the_dungeon.hero_partial_dict,
+              'enemies': the_dungeon.enemy_data,
+              'treasures': the_dungeon.treasure_data,
+              'nrows': the_dungeon.nrows,
+              'ncols': the_dungeon.ncols,
+              'byteorder': sys.byteorder,
+              'cells': {char: len(cell_index[char]) for char in dungeon.Dungeon.SPECIAL_CHARS}}
+
+    # the cache is written under another name and then renamed so that
+    # nobody ever reads a partially written cache
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(CACHE_MAGIC)
+            f.write(source_hash.encode() + b'\n')
+            f.write(json.dumps(header).encode() + b'\n')
+            f.write(memoryview(the_dungeon.tiles)[the_dungeon.tiles_start:the_dungeon.tiles_end])
+            for char in dungeon.Dungeon.SPECIAL_CHARS:
+                cell_index[char].tofile(f)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def read_cache(path, source_hash):
+    # returns the Dungeon stored in the cache file @path, or None if that file
+    # does not exist or was not compiled from a file with hash @source_hash
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+
+    with f:
+        if f.readline() != CACHE_MAGIC or f.readline() != source_hash.encode() + b'\n':
+            return None
+        header = json.loads(f.readline())
+        if header['byteorder'] != sys.byteorder:
+            return None
+        tiles, tiles_start = dungeon.read_rest(f)
+
+    result = dungeon.Dungeon.from_header(header, tiles, tiles_start)
+    cell_index = {}
+    start = result.tiles_end
+    for char in dungeon.Dungeon.SPECIAL_CHARS:
+        cell_index[char] = array.array('q')
+        end = start + header['cells'][char] * cell_index[char].itemsize
+        cell_index[char].frombytes(tiles[start:end])
+        start = end
+    if start != len(tiles):
+        return None
+    result.cell_index = cell_index
+    return result
+
+def compile_dungeon(path):
+    # parses the dungeon file @path, writes its cache and returns the Dungeon
+    source_hash = file_hash(path)
+    result = dungeon.Dungeon.from_file(path)
+    write_cache(cache_path(path), result, source_hash)
+    return result
+
+def load(path):
+    # returns the Dungeon in the file @path, reading it from its cache if
+    # the cache is up to date, and compiling the cache otherwise
+    source_hash = file_hash(path)
+    result = read_cache(cache_path(path), source_hash)
+    if result is not None:
+        return result
+
+    result = dungeon.Dungeon.from_file(path)
+    try:
+        write_cache(cache_path(path), result, source_hash)
+    except OSError:
+        # the dungeon is usable even if its cache can't be written
+        pass
+    return result
+
+def is_cache(path):
+    # returns True if @path is a cache, or the cache directory. caches written
+    # before they had their own directory were stored next to the dungeon files.
+    return (os.path.basename(path) == CACHE_DIRECTORY
+            or path.endswith(CACHE_SUFFIX) or path.endswith('.tmp'))
+
+def dungeon_paths(paths):
+    # returns a list of the dungeon files in @paths, without the caches.
+    # directories are replaced by the dungeon files they contain.
+    result = []
+    for path in paths:
+        if os.path.isdir(path):
+            result.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                 if os.path.isfile(os.path.join(path, name))
+                                 and not is_cache(name)))
+        elif not is_cache(path):
+            result.append(path)
+    return result
+
+def main(paths):
+    for path in dungeon_paths(paths):
+        compile_dungeon(path)
+        print(f'compiled {path} to {cache_path(path)}')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
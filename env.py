@@ -0,0 +1,195 @@
+# this module lets agents play games through the interface of reinforcement
+# learning environments: reset() starts a game and step(<action>) plays a
+# round, both returning an observation of the game. the observations are
+# read directly from the tiles of the map and the attributes of the actors,
+# so that no frame is drawn. VectorEnv plays several games in lockstep and
+# stacks their observations.
+#
+# the action of a round is the index of the hero's command in ACTIONS, and
+# an observation is a dict of NumPy arrays:
+#   'tiles'    the tile of each cell of the map, as in dungeon.Map.tiles,
+#              with the shape (<rows>, <columns>)
+#   'hero'     the values of HERO_STATS for the hero
+#   'enemies'  the values of ENEMY_STATS for each enemy, with the shape
+#              (<enemies>, len(ENEMY_STATS)). the enemies keep their order
+#              during a game, and the dead ones have no health.
+# VectorEnv adds a first dimension, the game, to each array.
+# the reward of a round is REWARDS[<status of the game>], 0 if the game goes on.
+#
+# NumPy is optional; Env and VectorEnv raise ImportError without it.
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import random
+import actors
+import swarm
+import simulation
+from dungeon import Game
+
+# the commands played by the actions
+ACTIONS = simulation.COMMANDS + (actors.Hero.WAIT,)
+
+# the stats of the observations, where row and col are those of the position
+HERO_STATS = ('health', 'mana', 'row', 'col',
+              'weapon_damage', 'spell_damage', 'spell_mana_cost', 'spell_cast_range')
+ENEMY_STATS = ('health', 'mana', 'row', 'col')
+
+REWARDS = {Game.WON: 1.0, Game.KILLED: -1.0}
+
+def observation_arrays(the_dungeon, shape=()):
+    # returns a new observation of a game of @the_dungeon, filled with zeros.
+    # @shape is prepended to the shapes of the arrays.
+    enemies = len(the_dungeon.index_cells()['E'])
+    return {'tiles': numpy.zeros(shape + (the_dungeon.nrows, the_dungeon.ncols), dtype=numpy.uint8),
+            'hero': numpy.zeros(shape + (len(HERO_STATS),), dtype=numpy.int64),
+            'enemies': numpy.zeros(shape + (enemies, len(ENEMY_STATS)), dtype=numpy.int64)}
+
+class Env:
+    # plays games of a dungeon one after the other.
+    # attributes:
+    #  - dungeon: the dungeon.Dungeon of the games
+    #  - spawn_pos: the spawn position of the games, or None to pick one at
+    #               random for each game
+    #  - max_turns: games are truncated after this many rounds, or None
+    #  - swarm: True if the enemies' turns are played by a swarm.SwarmEngine
+    #  - rng: draws the seeds and the spawn positions of the games
+    #  - game: the game being played, or None before the first reset
+    #  - enemies: the enemies of the game, in their order in the observations
+    #  - turns: the number of rounds played in the game
+
+    def __init__(self, the_dungeon, spawn_pos=None, max_turns=None, seed=None, swarm=False):
+        if numpy is None:
+            raise ImportError('Env requires NumPy')
+        self.dungeon = the_dungeon
+        self.spawn_pos = spawn_pos
+        self.max_turns = max_turns
+        self.swarm = swarm
+        self.rng = random.Random(seed)
+        self.game = None
+        self.enemies = []
+        self.turns = 0
+
+    def start_game(self, seed=None):
+        # starts a new game. if @seed is given, the seeds and spawn positions
+        # of the games are drawn again from it.
+        if seed is not None:
+            self.rng.seed(seed)
+        spawn_pos = self.spawn_pos
+        if spawn_pos is None:
+            spawn_pos = self.rng.choice(list(self.dungeon.spawn_posns))
+        self.game = self.dungeon.create_game(spawn_pos, self.rng.getrandbits(64))
+        if self.swarm:
+            self.game.enemy_engine = swarm.SwarmEngine(self.game)
+        self.enemies = list(self.game.enemies)
+        self.turns = 0
+
+    def play(self, action):
+        # plays a round of the game with the command of @action.
+        # returns (<reward>, <terminated>, <truncated>, <info>) like step.
+        status = self.game.step(ACTIONS[action])
+        self.turns += 1
+        truncated = status is None and self.turns == self.max_turns
+        if truncated:
+            status = Game.QUIT
+        info = {'turns': self.turns}
+        if status is not None:
+            info['status'] = simulation.STATUS_NAMES[status]
+        return REWARDS.get(status, 0.0), status in REWARDS, truncated, info
+
+    def observe(self, observation):
+        # writes the observation of the game in the arrays of @observation,
+        # which are shaped like those of observation_arrays(self.dungeon)
+        the_map = self.game.map
+        observation['tiles'][...] = numpy.frombuffer(the_map.tiles, dtype=numpy.uint8) \
+                                         .reshape(the_map.nrows, the_map.ncols)
+        hero = self.game.hero
+        weapon, spell = hero.weapon, hero.spell
+        observation['hero'][:] = (hero.health, hero.mana, hero.pos[0], hero.pos[1], weapon.damage,
+                                  spell.damage, spell.mana_cost, spell.cast_range)
+        if self.enemies:
+            observation['enemies'][:] = [(enemy.health, enemy.mana, enemy.pos[0], enemy.pos[1])
+                                         for enemy in self.enemies]
+
+    def observation(self):
+        result = observation_arrays(self.dungeon)
+        self.observe(result)
+        return result
+
+    def reset(self, seed=None):
+        # starts a new game and returns (<observation>, <info>)
+        self.start_game(seed)
+        return self.observation(), {'turns': 0}
+
+    def step(self, action):
+        # plays a round with the command of @action and returns
+        # (<observation>, <reward>, <terminated>, <truncated>, <info>), where
+        # <terminated> is True if the game was won or lost, <truncated> is True
+        # if it was stopped after max_turns rounds, and <info> maps 'turns' to
+        # the number of rounds played and, once the game ended, 'status' to
+        # the name of its status. a new game must be started with reset once
+        # a game ended.
+        reward, terminated, truncated, info = self.play(action)
+        return self.observation(), reward, terminated, truncated, info
+
+class VectorEnv:
+    # plays @count games of a dungeon in lockstep. a game which ends is
+    # replaced by a new one at once, so that the observation returned by
+    # step for it is that of the new game; the info of the game which ended
+    # has its status.
+    # attributes:
+    #  - envs: the Env of each game
+    #  - observation: the arrays the observations are written to
+    #  - views: the observation of each game, as views of the arrays of observation
+    #  - copy: if False, step and reset return the arrays of self.observation,
+    #          which are overwritten by the next step; otherwise they return copies
+
+    def __init__(self, the_dungeon, count, spawn_pos=None, max_turns=None, seed=None,
+                 swarm=False, copy=True):
+        if numpy is None:
+            raise ImportError('VectorEnv requires NumPy')
+        rng = random.Random(seed)
+        self.envs = [Env(the_dungeon, spawn_pos, max_turns, rng.getrandbits(64), swarm)
+                     for i in range(count)]
+        self.observation = observation_arrays(the_dungeon, (count,))
+        self.views = [{name: array[i] for name, array in self.observation.items()}
+                      for i in range(count)]
+        self.copy = copy
+
+    def observations(self):
+        if not self.copy:
+            return self.observation
+        return {name: array.copy() for name, array in self.observation.items()}
+
+    def reset(self, seed=None):
+        # starts new games and returns (<observations>, <infos>)
+        if seed is not None:
+            rng = random.Random(seed)
+            for env in self.envs:
+                env.rng.seed(rng.getrandbits(64))
+        for env, view in zip(self.envs, self.views):
+            env.start_game()
+            env.observe(view)
+        return self.observations(), [{'turns': 0} for env in self.envs]
+
+    def step(self, actions):
+        # plays a round of each game, with the command of the action of
+        # @actions at the same index. returns
+        # (<observations>, <rewards>, <terminated>, <truncated>, <infos>)
+        # where <rewards>, <terminated> and <truncated> are arrays holding the
+        # values returned by Env.step for each game, and <infos> is the list of
+        # the infos of the games.
+        count = len(self.envs)
+        rewards = numpy.zeros(count, dtype=numpy.float64)
+        terminated = numpy.zeros(count, dtype=bool)
+        truncated = numpy.zeros(count, dtype=bool)
+        infos = []
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            rewards[i], terminated[i], truncated[i], info = env.play(action)
+            if terminated[i] or truncated[i]:
+                env.start_game()
+            env.observe(self.views[i])
+            infos.append(info)
+        return self.observations(), rewards, terminated, truncated, infos
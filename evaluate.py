@@ -0,0 +1,116 @@
+# this module plays every spawn position of many dungeons in parallel
+# and aggregates the outcomes.
+#
+# usage: python evaluate.py [options] <dungeon file or directory>...
+
+import sys
+import random
+import argparse
+import concurrent.futures
+import simulation
+import dungeon_cache
+
+# dungeons which were already parsed by the current process, by path
+_dungeons = {}
+
+def load_dungeon(path):
+    if path not in _dungeons:
+        _dungeons[path] = dungeon_cache.load(path)
+    return _dungeons[path]
+
+def jobs(paths, policy='random', seeds=range(1), max_turns=1000):
+    # returns an iterator of the jobs which play every spawn position of
+    # every dungeon in @paths once for each seed in @seeds.
+    # a job has the form (<path>, <spawn_pos>, <policy name>, <seed>, <max_turns>)
+    for path in paths:
+        for spawn_pos in load_dungeon(path).spawn_posns:
+            for seed in seeds:
+                yield path, spawn_pos, policy, seed, max_turns
+
+def split_seed(seed):
+    # returns (<game seed>, <policy seed>) drawn from @seed. the game and the
+    # policy must not be given the same seed: both would draw from the same
+    # sequence of random numbers, so the treasures of the chests would be
+    # decided by the commands of the policy.
+    rng = random.Random(seed)
+    return rng.getrandbits(64), rng.getrandbits(64)
+
+def play_game(the_dungeon, spawn_pos, policy, seed, max_turns):
+    # plays the game of @the_dungeon with the hero at @spawn_pos, with the
+    # policy named @policy in simulation.POLICIES, and returns its Result.
+    # the seeds of the game and of the policy are drawn from @seed.
+    game_seed, policy_seed = split_seed(seed)
+    game = the_dungeon.create_game(spawn_pos, game_seed)
+    return simulation.run(game, simulation.POLICIES[policy](policy_seed), max_turns)
+
+def play_job(job):
+    # plays the game described by @job and returns
+    # (<path>, <spawn_pos>, <status name>, <turns>)
+    path, spawn_pos, policy, seed, max_turns = job
+    result = play_game(load_dungeon(path), spawn_pos, policy, seed, max_turns)
+    return path, spawn_pos, result.name, result.turns
+
+class Stats:
+    # the aggregated outcomes of a group of games
+
+    def __init__(self):
+        self.counts = dict.fromkeys(simulation.STATUS_NAMES.values(), 0)
+        self.turns = []
+
+    def add(self, status_name, turns):
+        self.counts[status_name] += 1
+        self.turns.append(turns)
+
+    @property
+    def games(self):
+        return len(self.turns)
+
+    @property
+    def win_rate(self):
+        return self.counts['won'] / self.games if self.games else 0.0
+
+    @property
+    def mean_turns(self):
+        return sum(self.turns) / self.games if self.games else 0.0
+
+    def as_dict(self):
+        return {'games': self.games, **self.counts, 'win_rate': self.win_rate,
+                'mean_turns': self.mean_turns,
+                'min_turns': min(self.turns, default=0),
+                'max_turns': max(self.turns, default=0)}
+
+def evaluate(jobs, workers=None, chunksize=16):
+    # plays @jobs over a pool of @workers processes.
+    # returns a dict which maps each dungeon path to a pair
+    # (<Stats of the dungeon>, <dict mapping each spawn position to its Stats>)
+    result = {}
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        for path, spawn_pos, status_name, turns in executor.map(play_job, jobs,
+                                                                 chunksize=chunksize):
+            total, per_spawn = result.setdefault(path, (Stats(), {}))
+            total.add(status_name, turns)
+            per_spawn.setdefault(spawn_pos, Stats()).add(status_name, turns)
+    return result
+
+def print_report(result, file=sys.stdout):
+    for path, (total, per_spawn) in result.items():
+        print(f'{path}: {total.games} games, win rate {total.win_rate:.3f}, '
+              f'mean turns {total.mean_turns:.1f}', file=file)
+        for spawn_pos, stats in per_spawn.items():
+            print(f'  spawn {spawn_pos}: win rate {stats.win_rate:.3f}, '
+                  f'mean turns {stats.mean_turns:.1f}', file=file)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='evaluate dungeons in parallel')
+    parser.add_argument('paths', nargs='+', help='dungeon files or directories')
+    parser.add_argument('--policy', default='random', choices=sorted(simulation.POLICIES))
+    parser.add_argument('--seeds', type=int, default=100, help='games per spawn position')
+    parser.add_argument('--max-turns', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    all_jobs = jobs(dungeon_cache.dungeon_paths(args.paths), args.policy, range(args.seeds), args.max_turns)
+    print_report(evaluate(all_jobs, args.workers))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
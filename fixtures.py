@@ -0,0 +1,36 @@
+# this module builds the small dungeons used by the tests
+
+import os
+import shutil
+from dungeon import Dungeon
+
+# the directory of the dungeons shipped with the game
+DUNGEONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dungeons')
+
+HERO_DICT = {
+    "name":"Bron",
+    "title":"dragon slayer",
+    "health":100, "mana":100,
+    "mana_regeneration_rate":2,
+    "fist_damage":10
+}
+
+def make_dungeon(map_template, enemies=[], treasures=[], **hero):
+    # returns the Dungeon of @map_template whose hero is HERO_DICT with the
+    # values of @hero, e.g. make_dungeon(["S.G"], health=10)
+    return Dungeon.from_dict({
+        "hero":dict(HERO_DICT, **hero),
+        "enemies":enemies,
+        "map_template":map_template,
+        "treasures":treasures
+    })
+
+def copy_dungeons(directory, names=('dun1', 'dun2', 'dun3')):
+    # copies the dungeons @names of DUNGEONS to @directory and returns the
+    # paths of the copies. the tests which cache dungeons load the copies,
+    # so that the caches are written in @directory.
+    paths = []
+    for name in names:
+        paths.append(os.path.join(directory, name))
+        shutil.copy(os.path.join(DUNGEONS, name), paths[-1])
+    return paths
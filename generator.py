@@ -0,0 +1,145 @@
+# this module generates random dungeons of any size, e.g. to test the game
+# on large maps. the rows of the map are generated one at a time, so maps
+# with millions of tiles can be written to disk without being held in memory.
+#
+# the gateway can always be reached from every spawn position: for each of
+# them, a random path going only towards the gateway is kept free of obstacles
+# (enemies and chests may stand on it, since they can be removed).
+#
+# usage: python generator.py [options] <output file>
+
+import sys
+import json
+import random
+import argparse
+import dungeon
+
+HERO = {'name': 'Bron', 'title': 'Dragon Slayer', 'health': 100, 'mana': 100,
+        'mana_regeneration_rate': 2, 'fist_damage': 20}
+ENEMY = {'health': 40, 'mana': 100, 'fist_damage': 20}
+TREASURES = [{'type': 'weapon', 'name': 'The Axe of Destiny', 'damage': 20},
+             {'type': 'spell', 'name': 'Fireball', 'damage': 30, 'mana_cost': 50, 'cast_range': 2},
+             {'type': 'health_potion', 'amount': 30},
+             {'type': 'mana_potion', 'amount': 20}]
+
+def random_path(start, end, rng):
+    # returns a dict mapping each row of a random path from @start to @end,
+    # which only goes towards @end, to the pair (<first column>, <last column>)
+    # of the path in that row
+    (start_row, start_col), (end_row, end_col) = start, end
+    row_step = 1 if end_row >= start_row else -1
+    col_step = 1 if end_col >= start_col else -1
+    nrows = abs(end_row - start_row)
+    ncols = abs(end_col - start_col)
+    # the path moves to the next row after bounds[k + 1] horizontal steps
+    bounds = [0, *sorted(rng.randint(0, ncols) for k in range(nrows)), ncols]
+    result = {}
+    for k in range(nrows + 1):
+        first = start_col + col_step * bounds[k]
+        last = start_col + col_step * bounds[k + 1]
+        result[start_row + row_step * k] = (min(first, last), max(first, last))
+    return result
+
+def generate_rows(nrows, ncols, obstacle_density=0.2, enemies=0, chests=0, spawns=1, seed=None):
+    # returns an iterator of the @nrows rows of a random map template, as bytes of
+    # length @ncols. a fraction @obstacle_density of the cells which are not on the
+    # paths to the gateway are obstacles. the map holds @enemies enemies,
+    # @chests chests, @spawns spawn positions and one gateway.
+    ncells = nrows * ncols
+    if spawns < 1:
+        raise ValueError('a dungeon needs at least one spawn position')
+    if not 0 <= obstacle_density <= 1:
+        raise ValueError('the obstacle density must be between 0 and 1')
+    if enemies + chests + spawns + 1 > ncells:
+        raise ValueError(f'{nrows}x{ncols} cells are too few for the requested contents')
+    rng = random.Random(seed)
+
+    *spawn_indexes, gateway_index = rng.sample(range(ncells), spawns + 1)
+    specials = {index: b'S' for index in spawn_indexes}
+    specials[gateway_index] = b'G'
+    # the enemies and chests are placed on the first cells not taken by the
+    # spawn positions and the gateway
+    contents = [index for index in rng.sample(range(ncells), enemies + chests + spawns + 1)
+                if index not in specials]
+    for index in contents[:enemies]:
+        specials[index] = b'E'
+    for index in contents[enemies:enemies + chests]:
+        specials[index] = b'T'
+    special_indexes = sorted(specials)
+
+    gateway_pos = divmod(gateway_index, ncols)
+    paths = [random_path(divmod(index, ncols), gateway_pos, rng) for index in spawn_indexes]
+
+    # each random byte becomes an obstacle with probability obstacle_density
+    threshold = round(obstacle_density * 256)
+    table = bytes(b'#'[0] if byte < threshold else b'.'[0] for byte in range(256))
+
+    next_special = 0
+    for row_index in range(nrows):
+        row = bytearray(rng.randbytes(ncols).translate(table))
+        for path in paths:
+            if row_index in path:
+                first, last = path[row_index]
+                row[first:last + 1] = b'.' * (last + 1 - first)
+        end = (row_index + 1) * ncols
+        while next_special < len(special_indexes) and special_indexes[next_special] < end:
+            index = special_indexes[next_special]
+            row[index - row_index * ncols] = specials[index][0]
+            next_special += 1
+        yield bytes(row)
+
+def header(hero=HERO, enemy=ENEMY, treasures=TREASURES):
+    # returns the keys of a JSON dungeon other than 'map_template'
+    return {'hero': hero, 'enemies': {'all': enemy}, 'treasures': treasures}
+
+def generate_dict(nrows, ncols, seed=None, hero=HERO, enemy=ENEMY, treasures=TREASURES, **options):
+    # returns the dict of a random JSON dungeon, as expected by Dungeon.from_dict.
+    # @options are passed to generate_rows.
+    rows = generate_rows(nrows, ncols, seed=seed, **options)
+    return {**header(hero, enemy, treasures),
+            'map_template': [row.decode('ascii') for row in rows]}
+
+def write_json(path, nrows, ncols, seed=None, hero=HERO, enemy=ENEMY, treasures=TREASURES,
+               **options):
+    # writes a random JSON dungeon to @path, one row at a time.
+    # @options are passed to generate_rows.
+    with open(path, 'w') as f:
+        f.write(json.dumps(header(hero, enemy, treasures))[:-1])
+        f.write(', "map_template": [')
+        for i, row in enumerate(generate_rows(nrows, ncols, seed=seed, **options)):
+            f.write(',\n  "' if i else '\n  "')
+            f.write(row.decode('ascii'))
+            f.write('"')
+        f.write(']}\n')
+
+def write_compact(path, nrows, ncols, seed=None, hero=HERO, enemy=ENEMY, treasures=TREASURES,
+                  **options):
+    # writes a random dungeon in the compact format to @path, one row at a time.
+    # @options are passed to generate_rows.
+    rows = generate_rows(nrows, ncols, seed=seed, **options)
+    dungeon.write_compact_file(path, header(hero, enemy, treasures), nrows, ncols, rows)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='generate a random dungeon')
+    parser.add_argument('path', help='the file to write the dungeon to')
+    parser.add_argument('--rows', type=int, default=20)
+    parser.add_argument('--cols', type=int, default=40)
+    parser.add_argument('--obstacle-density', type=float, default=0.2)
+    parser.add_argument('--enemies', type=int, default=5)
+    parser.add_argument('--chests', type=int, default=3)
+    parser.add_argument('--spawns', type=int, default=1)
+    parser.add_argument('--behavior', choices=['aggresive', 'rabid'],
+                        help='the behavior of the enemies')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--compact', action='store_true',
+                        help='write the compact format instead of JSON')
+    args = parser.parse_args(argv)
+
+    enemy = dict(ENEMY, behavior=args.behavior) if args.behavior else ENEMY
+    write = write_compact if args.compact else write_json
+    write(args.path, args.rows, args.cols, seed=args.seed, enemy=enemy,
+          obstacle_density=args.obstacle_density, enemies=args.enemies,
+          chests=args.chests, spawns=args.spawns)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,27 +1,58 @@
-import sys
-import dungeon
-import utils
+import argparse
+import replay
+import terminal
+import profiling
+import dungeon_cache
 
 class GameOver(Exception):
     pass
 
-def parse_dungeons():
-    # returns a list of Dungeon instances, which are parsed from the
-    # files entered on the command line.
-    return [dungeon.Dungeon.from_file(path) for path in sys.argv[1:]]
+def parse_args():
+    parser = argparse.ArgumentParser(description='play dungeons')
+    parser.add_argument('paths', nargs='+', help='dungeon files or directories')
+    parser.add_argument('--record', metavar='FILE',
+                        help='append the replay of every game to FILE (see replay.py)')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='write the profile of the whole session as JSON to FILE')
+    parser.add_argument('--tick', type=float, metavar='SECONDS',
+                        help='play in real time, a round every SECONDS')
+    args = parser.parse_args()
+    args.paths = dungeon_cache.dungeon_paths(args.paths)
+    return args
 
+def parse_dungeons(paths):
+    # returns a list of Dungeon instances, which are parsed from @paths
+    return [dungeon_cache.load(path) for path in paths]
 
-dungeons = parse_dungeons()
+
+args = parse_args()
+dungeons = parse_dungeons(args.paths)
+profiler = profiling.Profiler() if args.profile else None
+
+def play(game, path):
+    # plays @game, which was created from the dungeon file @path, and returns its status
+    game.profiler = profiler
+    if args.record is None:
+        return run(game)
+    game_replay = replay.Replay.of_game(game, path)
+    try:
+        return run(game)
+    finally:
+        with open(args.record, 'a') as f:
+            f.write(game_replay.dumps() + '\n')
+
+def run(game):
+    return game.play(keyboard=keyboard, tick=args.tick)
 
 def start_game():
-    for current_dungeon in dungeons:
+    for path, current_dungeon in zip(args.paths, dungeons):
         games = list(current_dungeon.games())
         for i, game in enumerate(games):
             # if the player wins a game from games, the loop will terminate.
             # if he loses all games, the program will terminate and no code
             # after the loop will be executed.
 
-            status = game.play()
+            status = play(game, path)
             if status is game.KILLED:
                 if i == len(games) - 1: # if game is the last one
                     raise GameOver('you lose')
@@ -36,15 +67,19 @@ def start_game():
             else:
                 raise ValueError('invalid game status')
     raise GameOver('you won')
-while True:
-    try:
-        start_game()
-    except GameOver as go:
-        if str(go) == 'quit':
-            break
-
-        print(go)
-        print('press "y" to play again')
-        char = utils.get_char()
-        if char != "y":
-            break
+with terminal.Keyboard() as keyboard:
+    while True:
+        try:
+            start_game()
+        except GameOver as go:
+            if str(go) == 'quit':
+                break
+
+            print(go)
+            print('press "y" to play again')
+            char = keyboard.read_key()
+            if char != "y":
+                break
+
+if profiler is not None:
+    profiler.write_json(args.profile)
@@ -0,0 +1,170 @@
+# this module computes distance fields: the number of steps needed to get
+# from each cell of a map to a target cell, going only up, down, left and right.
+# the field is shared by every walker heading to the same target, so finding
+# the next step of a walker takes constant time once the field reaches it.
+
+import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+UNREACHABLE = -1
+
+# the directions in the order in which they are tried and the change
+# of (<row>, <column>) they cause
+STEPS = (('up', -1, 0), ('down', 1, 0), ('left', 0, -1), ('right', 0, 1))
+
+class DistanceField:
+    # the distances are found by a breadth-first search from the target, which
+    # is only carried as far as needed: until the cells that were asked about
+    # are reached. walkers are usually much closer to the hero than the size of
+    # the map, so a hero's move on a large map costs little. the search uses
+    # NumPy if it is installed.
+    # attributes:
+    #  - map: a dungeon.Map
+    #  - target: the position the distances are measured to, or None
+    #  - max_distance: cells further than this from the target are considered
+    #                  unreachable; None means no limit
+    #  - distances: an array('i') holding the distance of each cell of the map
+    #               (indexed like map.tiles) to target, or UNREACHABLE if the
+    #               search hasn't reached it (yet). None if the search has to
+    #               be restarted.
+    #  - reached: the distance of the cells of the frontier of the search. the
+    #             distances of all the cells at most that far from the target are known.
+    #  - frontier: the indexes of the cells at distance @reached, whose neighbours
+    #              haven't been searched yet
+    #  - unreached: 1 for each cell which the search may still reach, 0 otherwise
+    #  without NumPy, frontier is a list and unreached is a bytes-like object,
+    #  and the cells are indexed like map.tiles. with NumPy, they are arrays
+    #  in which the cells are indexed like map.tiles plus ncols, so that the
+    #  steps up from the first row and down from the last one land on the
+    #  cells of an impassable row added on each side.
+    #  - terrain_version: the value of map.terrain_version for which distances
+    #                     were computed
+
+    def __init__(self, map, max_distance=None):
+        self.map = map
+        self.target = None
+        self.max_distance = max_distance
+        self.distances = None
+        self.reached = 0
+        self.frontier = self.unreached = None
+        # with NumPy, whether each cell has a neighbour on its left and on its
+        # right, and an array of one integer per cell used by expand_vectorized
+        self.has_left = self.has_right = self.scratch = None
+        self.terrain_version = None
+
+    def retarget(self, target):
+        # makes @target the position the distances are measured to.
+        # the distances are only recomputed when they are needed.
+        if target != self.target:
+            self.target = target
+            self.distances = None
+
+    def update(self):
+        # restarts the search if the target or the terrain changed
+        if self.distances is not None and self.terrain_version == self.map.terrain_version:
+            return
+        self.terrain_version = self.map.terrain_version
+
+        nrows, ncols = self.map.nrows, self.map.ncols
+        passable = self.map.tiles.translate(self.map.PASSABLE)
+        self.distances = array.array('i', [UNREACHABLE]) * (nrows * ncols)
+        start = self.target[0] * ncols + self.target[1]
+        self.distances[start] = 0
+        self.reached = 0
+        if numpy is None:
+            self.unreached = passable
+            self.unreached[start] = 0
+            self.frontier = [start]
+            return
+
+        size = (nrows + 2) * ncols
+        self.unreached = numpy.zeros(size, dtype=numpy.bool_)
+        self.unreached[ncols:size - ncols] = numpy.frombuffer(passable, dtype=numpy.bool_)
+        self.unreached[start + ncols] = False
+        self.frontier = numpy.array([start + ncols], dtype=numpy.intp)
+        if self.has_left is None or len(self.has_left) != size:
+            cols = numpy.arange(size) % ncols
+            self.has_left, self.has_right = cols > 0, cols < ncols - 1
+            self.scratch = numpy.empty(size, dtype=numpy.intp)
+
+    def expand(self):
+        # extends the search by one step
+        ncols = self.map.ncols
+        unreached, distances = self.unreached, self.distances
+        distance = self.reached = self.reached + 1
+        next_frontier = []
+        for index in self.frontier:
+            col = index % ncols
+            for neighbour in (index - ncols, index + ncols,
+                              index - 1 if col > 0 else -1,
+                              index + 1 if col < ncols - 1 else -1):
+                if 0 <= neighbour < len(unreached) and unreached[neighbour]:
+                    unreached[neighbour] = 0
+                    distances[neighbour] = distance
+                    next_frontier.append(neighbour)
+        self.frontier = next_frontier
+
+    def expand_vectorized(self):
+        # does the same as expand with NumPy
+        ncols, frontier = self.map.ncols, self.frontier
+        neighbours = numpy.concatenate((frontier - ncols, frontier + ncols,
+                                        frontier[self.has_left[frontier]] - 1,
+                                        frontier[self.has_right[frontier]] + 1))
+        neighbours = neighbours[self.unreached[neighbours]]
+        # a cell may be the neighbour of several cells of the frontier, but
+        # it must only be kept once: the last copy of each cell is kept
+        order = numpy.arange(len(neighbours))
+        self.scratch[neighbours] = order
+        frontier = self.frontier = neighbours[self.scratch[neighbours] == order]
+        self.unreached[frontier] = False
+        self.reached += 1
+        numpy.frombuffer(self.distances, dtype=numpy.intc)[frontier - ncols] = self.reached
+
+    def settle(self, indexes):
+        # extends the search until the distances of the cells at @indexes
+        # (indexed like map.tiles) are known, or until it can't go further
+        self.update()
+        if numpy is None:
+            pending = {index for index in indexes if self.unreached[index]}
+            while pending and self.frontier and self.reached != self.max_distance:
+                self.expand()
+                pending.difference_update(self.frontier)
+            return
+
+        pending = numpy.asarray(indexes, dtype=numpy.intp) + self.map.ncols
+        pending = pending[self.unreached[pending]]
+        while len(pending) and len(self.frontier) and self.reached != self.max_distance:
+            self.expand_vectorized()
+            pending = pending[self.unreached[pending]]
+
+    def distance(self, pos):
+        # returns the number of steps from @pos to the target, or UNREACHABLE
+        index = pos[0] * self.map.ncols + pos[1]
+        self.update()
+        if self.distances[index] == UNREACHABLE:
+            self.settle((index,))
+        return self.distances[index]
+
+    def direction_from(self, pos):
+        # returns the direction of the step from @pos which gets closest to the
+        # target among those that can be taken now, or None if no step gets closer
+        if self.target is None:
+            return None
+        # the neighbours closer to the target than @pos are known once @pos is
+        ncols = self.map.ncols
+        best_direction = None
+        best_distance = self.distance(pos)
+        if best_distance == UNREACHABLE:
+            return None
+        for direction, drow, dcol in STEPS:
+            neighbour = (pos[0] + drow, pos[1] + dcol)
+            if not self.map.can_move_to(neighbour):
+                continue
+            distance = self.distances[neighbour[0] * ncols + neighbour[1]]
+            if distance != UNREACHABLE and distance < best_distance:
+                best_direction, best_distance = direction, distance
+        return best_direction
@@ -0,0 +1,96 @@
+# this module measures where the time goes during games.
+# a Profiler is attached to a game with `game.profiler = Profiler()`; the game
+# then times each phase of its rounds and its map, actors and chests update
+# the counters. nothing is measured by games without a profiler.
+#
+# the phases are:
+#  - hero_input: reading the hero's command in terminal.play_turns
+#  - hero_action: the hero's turn
+#  - enemy_filtering: forgetting the dead enemies before the enemies' turn
+#  - enemy_turn: each Enemy.do_turn
+#  - enemy_engine: the enemies' turn played by Game.enemy_engine
+#  - render: drawing the game in Game.play
+# and the counters:
+#  - tiles_scanned: the positions yielded by Map.positions
+#  - sight_lines: the calls of Map.first_blocker
+#  - isinstance_dispatches: the isinstance checks deciding whom an attack hits
+#  - chest_openings
+#
+# usage: python profiling.py [options] <dungeon file>
+# plays a game with a random policy and prints the profile.
+
+import sys
+import json
+import time
+import argparse
+import simulation
+import dungeon_cache
+
+class Profiler:
+    # attributes:
+    #  - clock: returns the current time in seconds
+    #  - times: maps each phase to the total number of seconds spent in it
+    #  - calls: maps each phase to the number of times it was timed
+    #  - counters: maps the name of each counter to its value
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.times = {}
+        self.calls = {}
+        self.counters = {}
+
+    def add_time(self, phase, seconds):
+        self.times[phase] = self.times.get(phase, 0.0) + seconds
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def as_dict(self):
+        return {'phases': {phase: {'calls': self.calls[phase], 'seconds': seconds,
+                                   'mean_seconds': seconds / self.calls[phase]}
+                           for phase, seconds in self.times.items()},
+                'counters': dict(self.counters)}
+
+    @property
+    def table_lines(self):
+        # returns the lines of a table summarizing @self
+        total = sum(self.times.values())
+        result = [f"{'phase':16} {'calls':>9} {'total ms':>10} {'mean us':>10} {'share':>6}"]
+        for phase, seconds in sorted(self.times.items(), key=lambda item: -item[1]):
+            calls = self.calls[phase]
+            share = seconds / total if total else 0.0
+            result.append(f'{phase:16} {calls:9} {seconds * 1e3:10.2f} '
+                          f'{seconds / calls * 1e6:10.2f} {share:6.1%}')
+        if self.counters:
+            result.append('')
+            result.append(f"{'counter':24} {'value':>10}")
+            for name, value in sorted(self.counters.items()):
+                result.append(f'{name:24} {value:10}')
+        return result
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=1)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='profile a game played by a random policy')
+    parser.add_argument('path', help='a dungeon file')
+    parser.add_argument('--max-turns', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', metavar='FILE', help='write the profile as JSON to FILE')
+    args = parser.parse_args(argv)
+
+    the_dungeon = dungeon_cache.load(args.path)
+    profiler = Profiler()
+    for spawn_pos in the_dungeon.spawn_posns:
+        game = the_dungeon.create_game(spawn_pos, args.seed)
+        game.profiler = profiler
+        simulation.run(game, simulation.random_policy(args.seed), args.max_turns)
+
+    print('\n'.join(profiler.table_lines))
+    if args.json is not None:
+        profiler.write_json(args.json)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,77 @@
+# this module draws frames (lists of lines) on a terminal. only the parts
+# of a frame which differ from the previously drawn one are written, using
+# ANSI escape sequences to move the cursor.
+
+import sys
+
+CLEAR_SCREEN = '\x1b[H\x1b[2J'
+CLEAR_LINE_END = '\x1b[K'
+CLEAR_SCREEN_END = '\x1b[J'
+
+def move_cursor(row, col):
+    # returns the escape sequence which moves the cursor to (@row, @col),
+    # counting from 0
+    return f'\x1b[{row + 1};{col + 1}H'
+
+def changed_span(old, new):
+    # returns a pair (start, end) such that replacing old[start:end] with
+    # new[start:end] and clearing the rest of the line turns @old into @new.
+    # if @old and @new are equal, start == end.
+    shortest = min(len(old), len(new))
+    start = 0
+    while start < shortest and old[start] == new[start]:
+        start += 1
+    if len(old) != len(new):
+        return start, len(new)
+    end = len(new)
+    while end > start and old[end - 1] == new[end - 1]:
+        end -= 1
+    return start, end
+
+class Renderer:
+    # attributes:
+    #  - file: where the frames are written
+    #  - frame: the last drawn frame, or None if the screen has to be redrawn
+
+    def __init__(self, file=sys.stdout):
+        self.file = file
+        self.frame = None
+
+    def invalidate(self):
+        # makes the next call to draw redraw the whole screen
+        self.frame = None
+
+    def updates(self, frame):
+        # returns the string which turns the screen from self.frame into @frame
+        if self.frame is None:
+            return CLEAR_SCREEN + '\n'.join(frame) + move_cursor(len(frame), 0)
+
+        parts = []
+        for row, (old, new) in enumerate(zip(self.frame, frame)):
+            if old == new:
+                continue
+            start, end = changed_span(old, new)
+            parts.append(move_cursor(row, start))
+            parts.append(new[start:end])
+            if len(new) < len(old):
+                parts.append(CLEAR_LINE_END)
+
+        if len(frame) > len(self.frame):
+            parts.append(move_cursor(len(self.frame), 0))
+            parts.append('\n'.join(frame[len(self.frame):]))
+        elif len(frame) < len(self.frame):
+            parts.append(move_cursor(len(frame), 0))
+            parts.append(CLEAR_SCREEN_END)
+
+        if parts:
+            # leave the cursor after the frame
+            parts.append(move_cursor(len(frame), 0))
+        return ''.join(parts)
+
+    def draw(self, frame):
+        # @frame must be a list of strings without newlines
+        updates = self.updates(frame)
+        self.frame = frame
+        if updates:
+            self.file.write(updates)
+            self.file.flush()
@@ -0,0 +1,141 @@
+# this module records the sessions played with Game.play and replays them
+# without a terminal, as fast as possible. a replay holds everything which is
+# needed to reproduce a game exactly: the dungeon file and the hash of its
+# contents, the spawn position, the seed of the game and the keys which were
+# pressed. a replay is never played on a dungeon file whose contents changed.
+#
+# a replay is stored as one line of JSON, e.g.
+#   {"dungeon": "dungeons/dun1", "hash": "3f5a...", "spawn": [0, 0], "seed": 42,
+#    "keys": "66w6r2q"}
+# where the keys are those read by actors.Hero.read_command, plus "r" for
+# restarting, "q" for quitting and "." for the rounds in which the hero waited.
+#
+# usage: python replay.py <replay file>
+# plays every replay of the file and prints the outcomes.
+
+import sys
+import json
+import time
+import actors
+import simulation
+import dungeon_cache
+
+# the keys of the commands, as read by actors.Hero.read_command
+DIRECTION_KEYS = {direction: key for key, direction in actors.Hero.DIRECTION_KEYS.items()}
+ATTACK_KEYS = {by: key for key, by in actors.Hero.ATTACK_KEYS.items()}
+RESTART_KEY = 'r'
+QUIT_KEY = 'q'
+WAIT_KEY = '.'
+
+def encode(command):
+    # returns the keys of @command, which is a command returned by
+    # actors.Hero.read_command, actors.Hero.WAIT, simulation.RESTART or simulation.QUIT.
+    # 'r' and 'q', which were recorded by the Ctrl-C prompt of older versions
+    # of Game.play, are accepted too.
+    if command in (simulation.RESTART, RESTART_KEY):
+        return RESTART_KEY
+    elif command in (simulation.QUIT, QUIT_KEY):
+        return QUIT_KEY
+    elif command == actors.Hero.WAIT:
+        return WAIT_KEY
+    elif type(command) is str:
+        return DIRECTION_KEYS[command]
+    else:
+        by, direction = command
+        return ATTACK_KEYS[by] + DIRECTION_KEYS[direction]
+
+def decode(keys):
+    # returns an iterator of the commands whose keys are @keys
+    keys = iter(keys)
+    for key in keys:
+        if key == RESTART_KEY:
+            yield simulation.RESTART
+        elif key == QUIT_KEY:
+            yield simulation.QUIT
+        elif key == WAIT_KEY:
+            yield actors.Hero.WAIT
+        elif key in actors.Hero.DIRECTION_KEYS:
+            yield actors.Hero.DIRECTION_KEYS[key]
+        elif key in actors.Hero.ATTACK_KEYS:
+            yield actors.Hero.ATTACK_KEYS[key], actors.Hero.DIRECTION_KEYS[next(keys)]
+        else:
+            raise ValueError(f'invalid key in replay: {key!r}')
+
+class DungeonChanged(ValueError):
+    # raised when a replay is played on a dungeon file which is not the one it was recorded on
+    pass
+
+class Replay:
+    # attributes:
+    #  - dungeon_path
+    #  - dungeon_hash: the dungeon_cache.file_hash of the dungeon file, or None if unknown
+    #  - spawn_pos
+    #  - seed
+    #  - keys: a list of the keys of each command played so far
+
+    def __init__(self, dungeon_path, spawn_pos, seed, keys=(), dungeon_hash=None):
+        self.dungeon_path = dungeon_path
+        self.dungeon_hash = dungeon_hash
+        self.spawn_pos = tuple(spawn_pos)
+        self.seed = seed
+        self.keys = list(keys)
+
+    @staticmethod
+    def of_game(game, dungeon_path):
+        # returns an empty Replay of @game, which must have just been created
+        # from the dungeon file @dungeon_path, and starts recording @game in it
+        result = Replay(dungeon_path, game.hero.pos, game.seed,
+                        dungeon_hash=dungeon_cache.file_hash(dungeon_path))
+        game.replay = result
+        return result
+
+    def record(self, command):
+        self.keys.append(encode(command))
+
+    @property
+    def commands(self):
+        return decode(''.join(self.keys))
+
+    def dumps(self):
+        return json.dumps({'dungeon': self.dungeon_path, 'hash': self.dungeon_hash,
+                           'spawn': list(self.spawn_pos), 'seed': self.seed,
+                           'keys': ''.join(self.keys)})
+
+    @staticmethod
+    def loads(line):
+        dct = json.loads(line)
+        return Replay(dct['dungeon'], dct['spawn'], dct['seed'], dct['keys'], dct.get('hash'))
+
+    def create_game(self, the_dungeon=None):
+        # returns the game in the state in which it was recorded.
+        # the dungeon is loaded from self.dungeon_path unless @the_dungeon is given;
+        # raises DungeonChanged if the contents of that file are not those
+        # the replay was recorded on.
+        if the_dungeon is None:
+            if (self.dungeon_hash is not None
+                and dungeon_cache.file_hash(self.dungeon_path) != self.dungeon_hash):
+                raise DungeonChanged(f'{self.dungeon_path} changed since the replay was recorded')
+            the_dungeon = dungeon_cache.load(self.dungeon_path)
+        return the_dungeon.create_game(self.spawn_pos, self.seed)
+
+    def run(self, the_dungeon=None):
+        # replays @self and returns (<simulation.Result>, <the Game>)
+        game = self.create_game(the_dungeon)
+        return simulation.run(game, simulation.scripted(self.commands)), game
+
+def load(path):
+    # returns the list of the replays in the file @path
+    with open(path) as f:
+        return [Replay.loads(line) for line in f if line.strip()]
+
+def main(paths):
+    for path in paths:
+        for replay in load(path):
+            start = time.perf_counter()
+            result, game = replay.run()
+            elapsed = time.perf_counter() - start
+            print(f'{replay.dungeon_path} {replay.spawn_pos} seed {replay.seed}: '
+                  f'{result.name} after {result.turns} turns ({elapsed:.3f}s)')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,256 @@
+# this module hosts many games at once in one process. the dungeons are
+# loaded once and shared by all the games, which are played over TCP or Unix
+# sockets with a line protocol. each connection plays one game at a time.
+#
+# the client sends lines of UTF-8 text:
+#   LIST                        lists the dungeons
+#   NEW <dungeon> [<spawn> [<seed>]]
+#                               starts a game in the dungeon named <dungeon>, from its
+#                               <spawn>-th spawn position (0 by default)
+#   SIZE <columns> <lines>      fits the frames to a terminal of that size
+#   KEYS <keys>                 plays the keys, as read by terminal.CommandParser
+#   BYE                         closes the connection
+# and the server answers with lines:
+#   DUNGEONS <name>...
+#   OK <seed> <spawn row> <spawn column>
+#   FRAME <length>              followed by <length> bytes which update the client's
+#                               screen, as written by render.Renderer
+#   STATUS <won, killed or quit>
+#                               when the game ends
+#   ERROR <message>
+#
+# usage: python server.py serve [options] <dungeon file or directory>...
+#        python server.py play [options] <dungeon name> [<spawn>]
+
+import os
+import sys
+import asyncio
+import argparse
+import render
+import terminal
+import simulation
+import dungeon_cache
+
+# the size of the terminal the frames fit in until the client sends SIZE
+DEFAULT_SIZE = (80, 24)
+
+class ProtocolError(Exception):
+    pass
+
+class Session:
+    # a connection to a client. it is the file of its renderer.
+    # attributes:
+    #  - server
+    #  - writer: the asyncio.StreamWriter of the connection
+    #  - game: the game being played, or None
+    #  - renderer
+    #  - parser: the terminal.CommandParser of the keys of the game
+    #  - size: (<columns>, <lines>) of the client's terminal
+
+    def __init__(self, server, writer):
+        self.server = server
+        self.writer = writer
+        self.game = None
+        self.renderer = render.Renderer(self)
+        self.parser = terminal.CommandParser()
+        self.size = DEFAULT_SIZE
+
+    def send_line(self, line):
+        self.writer.write(line.encode() + b'\n')
+
+    def write(self, updates):
+        # called by self.renderer
+        data = updates.encode()
+        self.writer.write(b'FRAME %d\n' % len(data) + data)
+
+    def flush(self):
+        pass
+
+    def draw(self):
+        self.game.timed('render', self.renderer.draw, self.game.frame)
+
+    def new_game(self, name, spawn='0', seed=None):
+        if name not in self.server.dungeons:
+            raise ProtocolError(f'unknown dungeon: {name}')
+        the_dungeon = self.server.dungeons[name]
+        spawn_posns = list(the_dungeon.spawn_posns)
+        if not spawn.isdigit() or int(spawn) >= len(spawn_posns):
+            raise ProtocolError(f'invalid spawn: {spawn}')
+        if seed is not None and not seed.isdigit():
+            raise ProtocolError(f'invalid seed: {seed}')
+        spawn_pos = spawn_posns[int(spawn)]
+
+        self.game = the_dungeon.create_game(spawn_pos, None if seed is None else int(seed))
+        self.game.fit_viewport(*self.size)
+        self.parser = terminal.CommandParser()
+        self.renderer.invalidate()
+        self.send_line(f'OK {self.game.seed} {spawn_pos[0]} {spawn_pos[1]}')
+        self.draw()
+
+    def resize(self, columns, lines):
+        if not (columns.isdigit() and lines.isdigit()):
+            raise ProtocolError('invalid size')
+        self.size = (int(columns), int(lines))
+        if self.game is not None:
+            self.game.fit_viewport(*self.size)
+            self.renderer.invalidate()
+            self.draw()
+
+    def play_keys(self, keys):
+        if self.game is None:
+            raise ProtocolError('no game')
+        for key in keys:
+            command = self.parser.feed(key)
+            if command is None:
+                continue
+            status = self.game.command(command, self.renderer)
+            if status is not self.game.QUIT:
+                self.draw()
+            if status is not None:
+                self.send_line(f'STATUS {simulation.STATUS_NAMES[status]}')
+                self.game = None
+                return
+
+    def handle(self, line):
+        # executes the request @line. returns False if the connection must be closed
+        words = line.split()
+        if not words:
+            return True
+        request, args = words[0].upper(), words[1:]
+        if request == 'LIST' and not args:
+            self.send_line(' '.join(['DUNGEONS', *self.server.dungeons]))
+        elif request == 'NEW' and 1 <= len(args) <= 3:
+            self.new_game(*args)
+        elif request == 'SIZE' and len(args) == 2:
+            self.resize(*args)
+        elif request == 'KEYS' and len(args) == 1:
+            self.play_keys(args[0])
+        elif request == 'BYE' and not args:
+            return False
+        else:
+            raise ProtocolError(f'invalid request: {line.strip()}')
+        return True
+
+class Server:
+    # attributes:
+    #  - dungeons: maps the name of each hosted dungeon to the Dungeon
+    #  - sessions: the set of the open Sessions
+
+    def __init__(self, dungeons):
+        self.dungeons = dungeons
+        self.sessions = set()
+
+    @staticmethod
+    def from_paths(paths):
+        # @paths are dungeon files or directories, as for dungeon_cache.dungeon_paths.
+        # the dungeons are named after their files
+        return Server({os.path.basename(path): dungeon_cache.load(path)
+                       for path in dungeon_cache.dungeon_paths(paths)})
+
+    async def handle_connection(self, reader, writer):
+        session = Session(self, writer)
+        self.sessions.add(session)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    if not session.handle(line.decode('utf-8', 'replace')):
+                        break
+                except ProtocolError as e:
+                    session.send_line(f'ERROR {e}')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+
+    async def start(self, host=None, port=None, unix_path=None):
+        # returns the asyncio.Server listening on @unix_path if it is given,
+        # on @host and @port otherwise
+        if unix_path is not None:
+            return await asyncio.start_unix_server(self.handle_connection, unix_path)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+async def read_message(reader):
+    # returns the next (<first line>, <payload>) sent by a server, where
+    # <payload> is the bytes following a FRAME line and None for other lines.
+    # returns (None, None) at the end of the connection.
+    line = await reader.readline()
+    if not line:
+        return None, None
+    line = line.decode().rstrip('\n')
+    if line.startswith('FRAME '):
+        return line, await reader.readexactly(int(line.split()[1]))
+    return line, None
+
+async def open_connection(host=None, port=None, unix_path=None):
+    if unix_path is not None:
+        return await asyncio.open_unix_connection(unix_path)
+    return await asyncio.open_connection(host, port)
+
+async def serve(args):
+    server = Server.from_paths(args.paths)
+    listener = await server.start(args.host, args.port, args.unix)
+    async with listener:
+        await listener.serve_forever()
+
+async def play(args):
+    # plays a game on the server with the keys of the terminal
+    reader, writer = await open_connection(args.host, args.port, args.unix)
+    columns, lines = os.get_terminal_size() if sys.stdout.isatty() else DEFAULT_SIZE
+    writer.write(f'SIZE {columns} {lines}\nNEW {args.dungeon} {args.spawn}\n'.encode())
+
+    loop = asyncio.get_running_loop()
+    with terminal.Keyboard() as keyboard:
+        keyboard.attach(loop)
+
+        async def send_keys():
+            while True:
+                key = await keyboard.get_key()
+                if key == '':
+                    writer.write(b'BYE\n')
+                    return
+                if not key.isspace():
+                    writer.write(f'KEYS {key}\n'.encode())
+
+        sender = asyncio.ensure_future(send_keys())
+        try:
+            while True:
+                line, payload = await read_message(reader)
+                if line is None:
+                    return
+                if payload is not None:
+                    sys.stdout.write(payload.decode())
+                    sys.stdout.flush()
+                elif line.startswith('STATUS') or line.startswith('ERROR'):
+                    print(line)
+                    return
+        finally:
+            sender.cancel()
+            keyboard.detach(loop)
+            writer.close()
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='host or play games over a socket')
+    subparsers = parser.add_subparsers(dest='action', required=True)
+    serve_parser = subparsers.add_parser('serve', help='host games')
+    serve_parser.add_argument('paths', nargs='+', help='dungeon files or directories')
+    play_parser = subparsers.add_parser('play', help='play a game on a server')
+    play_parser.add_argument('dungeon', help='the name of a dungeon of the server')
+    play_parser.add_argument('spawn', nargs='?', default='0')
+    for subparser in (serve_parser, play_parser):
+        subparser.add_argument('--host', default='127.0.0.1')
+        subparser.add_argument('--port', type=int, default=7878)
+        subparser.add_argument('--unix', metavar='PATH', help='use a Unix socket instead of TCP')
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args) if args.action == 'serve' else play(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,77 @@
+# this module plays games without a terminal.
+# a policy is a callable which takes a Game and returns the hero's next command:
+# one of the values returned by actors.Hero.read_command, RESTART or QUIT.
+
+import random
+import dungeon
+
+QUIT = dungeon.Game.QUIT_COMMAND
+RESTART = dungeon.Game.RESTART_COMMAND
+
+DIRECTIONS = ('up', 'down', 'left', 'right')
+COMMANDS = DIRECTIONS + tuple((by, direction)
+                              for by in ('weapon', 'spell', 'fist')
+                              for direction in DIRECTIONS)
+
+STATUS_NAMES = {dungeon.Game.WON: 'won',
+                dungeon.Game.KILLED: 'killed',
+                dungeon.Game.QUIT: 'quit'}
+
+class Result:
+    # attributes:
+    #  - status: one of Game.WON, Game.KILLED and Game.QUIT
+    #  - turns: the number of rounds played, including those before a restart
+
+    def __init__(self, status, turns):
+        self.status = status
+        self.turns = turns
+
+    @property
+    def name(self):
+        return STATUS_NAMES[self.status]
+
+    def __repr__(self):
+        return f'Result({self.name}, {self.turns})'
+
+def scripted(commands):
+    # returns a policy which plays @commands in order and quits once they run out
+    commands = iter(commands)
+    def policy(game):
+        return next(commands, QUIT)
+    return policy
+
+def random_policy(seed=None, commands=COMMANDS):
+    # returns a policy which picks each command uniformly from @commands
+    rng = random.Random(seed)
+    def policy(game):
+        return rng.choice(commands)
+    return policy
+
+def run(game, policy, max_turns=None):
+    # plays @game with the commands returned by @policy until it ends.
+    # if @max_turns commands, counting the restarts, are played without an
+    # outcome, the game is quit. returns a Result.
+    turns = commands = 0
+    while max_turns is None or commands < max_turns:
+        command = policy(game)
+        commands += 1
+        if command == QUIT:
+            break
+        elif command == RESTART:
+            game.reset_state()
+            continue
+
+        turns += 1
+        status = game.step(command)
+        if status is not None:
+            return Result(status, turns)
+    return Result(game.QUIT, turns)
+
+def run_all(games, policy_factory, max_turns=None):
+    # returns an iterator of the Results of playing each game of @games.
+    # every game is played by a new policy returned by @policy_factory().
+    return (run(game, policy_factory(), max_turns) for game in games)
+
+# policies which can be referred to by name, e.g. from other processes.
+# each value is called with a seed and returns a policy.
+POLICIES = {'random': random_policy}
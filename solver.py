@@ -0,0 +1,436 @@
+# this module finds out whether the hero can win a dungeon: for each spawn
+# position, it searches the rounds the hero may play for a strategy which
+# reaches the gateway, and reports that strategy, or the proof that there is
+# none: the search went through every state the game can reach without
+# finding a win.
+#
+# the treasures found in the chests are drawn at random, so a round in which
+# a chest is opened is a chance node: the search plays it once for every
+# treasure which may be drawn, weighted by its probability. the value of a
+# state is the highest probability of winning from it, where the hero picks
+# his best command in each state and the probabilities of the draws are
+# averaged. the search is a depth-first search with iterative deepening: it is
+# first done for 1 round, then for 2, and so on, until it finds a sure win, it
+# is complete, or a maximum number of rounds is reached. states are identified
+# by the hash of the tiles of the map, kept up to date with each change of a
+# cell, and the stats of the actors, and the values of the states searched are
+# kept in a transposition table, so that a state reached in several ways is
+# only searched once.
+#
+# usage: python solver.py [options] <dungeon file or directory>...
+
+import sys
+import random
+import argparse
+import fractions
+import collections
+import replay
+import simulation
+import pathfinding
+import dungeon_cache
+from dungeon import Game
+
+# the statuses of a Solution
+WON = 'won'
+LOST = 'lost'
+POSSIBLE = 'possible'
+UNKNOWN = 'unknown'
+
+# the ply of the states which don't lead to a state being searched, see Solver.search
+NO_CYCLE = float('inf')
+
+class TooManyStates(Exception):
+    # raised by Solver.search when it searched the maximum number of states
+    pass
+
+class ZobristKeys:
+    # the keys of the Zobrist hashing of the tiles of a map: the hash of the
+    # tiles is the xor of the key of (<index>, <tile>) of each cell, so it is
+    # updated with two xors when a cell changes. the keys of a tile are drawn
+    # the first time a cell holds it.
+    # attributes:
+    #  - ncells: the number of cells of the maps
+    #  - rng
+    #  - tables: maps each tile to the list of its key for each cell
+
+    def __init__(self, ncells, seed=0):
+        self.ncells = ncells
+        self.rng = random.Random(seed)
+        self.tables = {}
+
+    def key(self, index, tile):
+        table = self.tables.get(tile)
+        if table is None:
+            table = self.tables[tile] = [self.rng.getrandbits(64) for index in range(self.ncells)]
+        return table[index]
+
+    def hash(self, tiles):
+        result = 0
+        for index, tile in enumerate(tiles):
+            result ^= self.key(index, tile)
+        return result
+
+class Draws:
+    # stands for the random number generator of a map while the solver plays
+    # a round, so that the solver decides which treasures are drawn.
+    # attributes:
+    #  - forced: the index of the item picked by each draw, in order. the
+    #            draws beyond it pick the first item which may be drawn.
+    #  - draws: the probability of each item of each draw made so far
+    #  - picked: the index of the item picked by each draw made so far
+
+    def __init__(self, forced):
+        self.forced = forced
+        self.draws = []
+        self.picked = []
+
+    def pick(self, seq, probabilities):
+        draw = len(self.draws)
+        self.draws.append(probabilities)
+        if draw < len(self.forced):
+            index = self.forced[draw]
+        else:
+            index = next(index for index, probability in enumerate(probabilities) if probability)
+        self.picked.append(index)
+        return seq[index]
+
+    def choice(self, seq):
+        return self.pick(seq, [fractions.Fraction(1, len(seq))] * len(seq))
+
+    def choices(self, population, cum_weights):
+        # draws one item, as treasures.TreasureTable.draw does for weighted treasures
+        total = fractions.Fraction(cum_weights[-1])
+        probabilities = [(fractions.Fraction(weight) - fractions.Fraction(previous)) / total
+                         for previous, weight in zip([0] + cum_weights, cum_weights)]
+        return [self.pick(population, probabilities)]
+
+    @property
+    def probability(self):
+        # the probability of the draws made so far
+        result = fractions.Fraction(1)
+        for probabilities, index in zip(self.draws, self.picked):
+            result *= probabilities[index]
+        return result
+
+    def next_forced(self):
+        # returns the draws to force in the next round to play, so that every
+        # combination of draws which may happen is played once, or None if they all were
+        for draw in reversed(range(len(self.draws))):
+            probabilities = self.draws[draw]
+            for index in range(self.picked[draw] + 1, len(probabilities)):
+                if probabilities[index]:
+                    return self.picked[:draw] + [index]
+        return None
+
+class Entry:
+    # an entry of the transposition table.
+    # attributes:
+    #  - depth: the number of rounds the state was searched for
+    #  - value: the highest probability of winning within that many rounds
+    #  - exact: True if the value holds for any number of rounds
+    #  - command: the command of the hero which gets that probability, or None
+    __slots__ = ('depth', 'value', 'exact', 'command')
+
+    def __init__(self, depth, value, exact, command):
+        self.depth = depth
+        self.value = value
+        self.exact = exact
+        self.command = command
+
+def state_stats(game):
+    # returns the values of actor.STATE of the actors of @game, like Game.snapshot
+    actors = game.actors or [game.hero, *game.enemies]
+    return tuple(getattr(actor, attr) for actor in actors for attr in actor.STATE)
+
+def state_key(game):
+    # returns a key identifying the state of @game among those of the games
+    # of the same dungeon. unlike the keys of the transposition table, it
+    # doesn't rely on a hash.
+    return bytes(game.map.tiles), state_stats(game)
+
+class Solution:
+    # attributes:
+    #  - spawn_pos
+    #  - status: WON if the hero can surely win, LOST if he surely can't,
+    #            POSSIBLE if he wins with some draws of the chests but not
+    #            all of them, UNKNOWN if the search stopped before finding a
+    #            win or searching all the states
+    #  - probability: the highest probability of winning within depth rounds,
+    #                 as a fractions.Fraction
+    #  - depth: the number of rounds searched
+    #  - exact: True if probability holds for any number of rounds
+    #  - commands: the commands of the hero in a won game, following the draws
+    #              with which the hero is the most likely to win; None if no
+    #              game is won within depth rounds
+    #  - strategy: maps the state_key of each state which the hero may reach
+    #              by playing the commands of the strategy to the command he
+    #              plays in it
+    #  - states: the number of states searched
+
+    def __init__(self, spawn_pos, probability, depth, exact, commands, strategy, states):
+        self.spawn_pos = spawn_pos
+        self.probability = probability
+        self.depth = depth
+        self.exact = exact
+        self.commands = commands
+        self.strategy = strategy
+        self.states = states
+        if probability == 1:
+            self.status = WON
+        elif probability == 0:
+            self.status = LOST if exact else UNKNOWN
+        else:
+            self.status = POSSIBLE
+
+    def policy(self):
+        # returns the simulation policy which plays self.strategy in a game
+        # of the dungeon, and quits in states it doesn't know
+        def policy(game):
+            return self.strategy.get(state_key(game), simulation.QUIT)
+        return policy
+
+    def __repr__(self):
+        return f'Solution({self.status}, {self.probability}, {self.depth})'
+
+class Solver:
+    # attributes:
+    #  - game: the game being searched. its map keeps the Zobrist hash of its
+    #          tiles, with the keys of zobrist, while solve runs.
+    #  - zobrist: the ZobristKeys of the cells of the map
+    #  - commands: the commands the hero may play
+    #  - table: the transposition table: an OrderedDict mapping the keys of
+    #           the states searched to their Entry, the least recently used first
+    #  - table_size: the maximum number of entries of table
+    #  - path: maps the key of each state between the root of the search and
+    #          the state being searched to its ply (its number of rounds after the root)
+    #  - gateway_distances: the distance of each cell to the gateway if only
+    #                       the static blockers stood in the way, as computed by
+    #                       pathfinding.DistanceField, or None if there is no gateway.
+    #                       the hero's moves are tried closest to the gateway first.
+    #  - states: the number of states searched
+    #  - max_states: the search stops once it searched that many states, or None
+
+    def __init__(self, game, table_size=1 << 20, max_states=None, commands=simulation.COMMANDS):
+        self.game = game
+        self.commands = commands
+        self.table = collections.OrderedDict()
+        self.table_size = table_size
+        self.path = {}
+        self.states = 0
+        self.max_states = max_states
+        the_map = game.map
+        self.zobrist = ZobristKeys(the_map.nrows * the_map.ncols)
+        self.gateway_distances = None
+        if the_map.gateway_pos is not None:
+            field = pathfinding.DistanceField(the_map)
+            field.retarget(the_map.gateway_pos)
+            field.settle(range(len(the_map.tiles)))
+            self.gateway_distances = field.distances
+
+    def key(self):
+        # returns the key of the current state of self.game in the transposition table
+        return self.game.map.tiles_hash, state_stats(self.game)
+
+    def ordered_commands(self, entry):
+        # returns the commands in the order they are tried: the best one of
+        # the last search of the state first, then the moves getting the hero
+        # closest to the gateway, then the attacks
+        distances, ncols = self.gateway_distances, self.game.map.ncols
+        row, col = self.game.hero.pos
+        def rank(command):
+            if type(command) is not str:
+                return len(distances)
+            drow, dcol = self.game.map.STEPS[command]
+            if not self.game.map.pos_is_valid((row + drow, col + dcol)):
+                return len(distances)
+            distance = distances[(row + drow) * ncols + col + dcol]
+            return len(distances) if distance == pathfinding.UNREACHABLE else distance
+        commands = sorted(self.commands, key=rank)
+        if entry is not None and entry.command is not None:
+            commands.remove(entry.command)
+            commands.insert(0, entry.command)
+        return commands
+
+    def outcomes(self, snapshot, command):
+        # plays the round in which the hero executes @command from @snapshot
+        # once for each combination of draws of the chests, and yields
+        # (<probability of the draws>, <status returned by Game.step>) after
+        # each of them, with self.game in the state reached.
+        forced = []
+        while forced is not None:
+            self.game.restore(snapshot)
+            draws = self.game.map.rng = Draws(forced)
+            status = self.game.step(command)
+            yield draws.probability, status
+            forced = draws.next_forced()
+
+    def search(self, depth, ply=0):
+        # searches the current state of self.game for @depth rounds and
+        # returns (<value>, <exact>, <cycle>) where
+        #  - value: the highest probability of winning within @depth rounds
+        #  - exact: True if the value holds for any number of rounds
+        #  - cycle: the lowest ply of the states of self.path the search went
+        #           back to, or NO_CYCLE
+        # going back to a state of self.path wins nothing: whatever can be won
+        # from there can be won without the detour. the value of a state which
+        # went back to a state before it depends on the path that led to it,
+        # so it isn't kept in the transposition table.
+        # self.game is left in an arbitrary state.
+        # raises TooManyStates if self.max_states states were searched.
+        if self.states == self.max_states:
+            raise TooManyStates()
+        self.states += 1
+        key = self.key()
+        if key in self.path:
+            return 0, True, self.path[key]
+        entry = self.table.get(key)
+        if entry is not None:
+            self.table.move_to_end(key)
+            if entry.exact or entry.depth == depth:
+                return entry.value, entry.exact, NO_CYCLE
+        row, col = self.game.hero.pos
+        if self.gateway_distances[row * self.game.map.ncols + col] > depth:
+            # the gateway is too far to be reached within @depth rounds
+            return 0, False, NO_CYCLE
+
+        self.path[key] = ply
+        snapshot = self.game.snapshot()
+        best_value, best_command = 0, None
+        exact, cycle = True, NO_CYCLE
+        # the first outcome of each command tried, so that the commands which
+        # do the same, e.g. attacking nobody, are only searched once
+        seen = set()
+        for command in self.ordered_commands(entry):
+            value = 0
+            for draw, (probability, status) in enumerate(self.outcomes(snapshot, command)):
+                if draw == 0:
+                    child_key = self.key()
+                    if child_key in seen:
+                        break
+                    seen.add(child_key)
+                if status is Game.WON:
+                    value += probability
+                elif status is None:
+                    child_value, child_exact, child_cycle = self.search(depth - 1, ply + 1)
+                    value += probability * child_value
+                    exact = exact and child_exact
+                    cycle = min(cycle, child_cycle)
+            if value > best_value:
+                best_value, best_command = value, command
+                if value == 1:
+                    exact = True
+                    break
+        del self.path[key]
+
+        if cycle >= ply:
+            self.table[key] = Entry(depth, best_value, exact, best_command)
+            if len(self.table) > self.table_size:
+                self.table.popitem(last=False)
+            cycle = NO_CYCLE
+        return best_value, exact, cycle
+
+    def strategy(self, depth):
+        # returns (<value>, <commands>, <strategy>) for the current state of
+        # self.game searched for @depth rounds, where <value> is returned by
+        # search and the others are as described in Solution.
+        # self.game is left in an arbitrary state.
+        snapshot = self.game.snapshot()
+        value, exact, cycle = self.search(depth)
+        self.game.restore(snapshot)
+        entry = self.table.get(self.key())
+        if value == 0 or entry is None:
+            return value, None, {}
+
+        strategy = {state_key(self.game): entry.command}
+        best_commands, best_value = None, 0
+        for probability, status in self.outcomes(snapshot, entry.command):
+            if status is Game.WON:
+                child_value, commands = 1, []
+            elif status is None and depth > 1:
+                child_value, commands, child_strategy = self.strategy(depth - 1)
+                strategy.update(child_strategy)
+            else:
+                continue
+            if commands is not None and child_value > best_value:
+                best_commands, best_value = commands, child_value
+        if best_commands is None:
+            return value, None, strategy
+        return value, [entry.command] + best_commands, strategy
+
+    def solve(self, max_depth):
+        # searches with iterative deepening for at most @max_depth rounds, or
+        # until self.max_states states were searched. the Solution returned
+        # is that of the last search which was completed.
+        # self.game is left in its current state.
+        self.game.map.use_zobrist(self.zobrist)
+        snapshot = self.game.snapshot()
+        rng = self.game.map.rng
+        try:
+            # the hero can't win if no path leads to the gateway
+            row, col = self.game.hero.pos
+            exact = (self.gateway_distances is None
+                     or self.gateway_distances[row * self.game.map.ncols + col] == pathfinding.UNREACHABLE)
+            value, depth = 0, 0
+            while not exact and depth < max_depth:
+                try:
+                    value, exact, cycle = self.search(depth + 1)
+                except TooManyStates:
+                    self.path.clear()
+                    break
+                finally:
+                    self.game.restore(snapshot)
+                depth += 1
+            commands, strategy = None, {}
+            if value:
+                # the strategy is found from the entries of the last search, so
+                # it searches few states, which are not counted against the maximum
+                max_states, self.max_states = self.max_states, None
+                try:
+                    value, commands, strategy = self.strategy(depth)
+                finally:
+                    self.max_states = max_states
+        finally:
+            self.game.restore(snapshot)
+            self.game.map.rng = rng
+            self.game.map.use_zobrist(None)
+        return Solution(self.game.hero.pos, value, depth, exact, commands, strategy, self.states)
+
+def solve(the_dungeon, max_depth=30, table_size=1 << 20, max_states=None):
+    # returns the list of the Solutions of every spawn position of the dungeon.Dungeon
+    # @the_dungeon, searched for at most @max_depth rounds and @max_states states
+    return [Solver(the_dungeon.create_game(spawn_pos), table_size, max_states).solve(max_depth)
+            for spawn_pos in the_dungeon.spawn_posns]
+
+def print_report(path, solutions, file=sys.stdout):
+    for solution in solutions:
+        if solution.status == WON:
+            outcome = f'won in {len(solution.commands)} rounds with keys ' + \
+                      ''.join(map(replay.encode, solution.commands))
+        elif solution.status == LOST:
+            outcome = 'lost whatever the hero does'
+        elif solution.status == POSSIBLE:
+            outcome = f'won with probability {float(solution.probability):.3f}'
+            if not solution.exact:
+                outcome += f' within {solution.depth} rounds'
+        else:
+            outcome = f'not won within {solution.depth} rounds'
+        print(f'{path} spawn {solution.spawn_pos}: {outcome} ({solution.states} states searched)',
+              file=file)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='find out whether dungeons can be won')
+    parser.add_argument('paths', nargs='+', help='dungeon files or directories')
+    parser.add_argument('--max-depth', type=int, default=30,
+                        help='the maximum number of rounds searched')
+    parser.add_argument('--table-size', type=int, default=1 << 20,
+                        help='the maximum number of states in the transposition table')
+    parser.add_argument('--max-states', type=int, default=50000,
+                        help='the maximum number of states searched per spawn position')
+    args = parser.parse_args(argv)
+
+    for path in dungeon_cache.dungeon_paths(args.paths):
+        print_report(path, solve(dungeon_cache.load(path), args.max_depth, args.table_size,
+                                 args.max_states))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
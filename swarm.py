@@ -0,0 +1,251 @@
+# this module plays the enemies' turn of a Game for all enemies at once,
+# using NumPy arrays. it gives the same outcomes as calling Enemy.do_turn
+# for each enemy in order, but is much faster when there are many enemies.
+#
+# the turn is played in three steps:
+#  1. the enemies which are sure to do nothing are filtered out: those which
+#     can't see the hero because they are not on his row or column, which
+#     don't remember where he was and which are not rabid.
+#  2. the plan of each remaining enemy (attack, move or forget the hero) is
+#     computed from the state at the beginning of the turn.
+#  3. the plans are carried out in the order of the enemies. a plan is only
+#     valid if no earlier enemy changed a cell in the row or column of the
+#     enemy, since everything a plan depends on (the line of sight to the
+#     hero and the neighbouring cells) lies there; otherwise, and after the
+#     hero has died, the enemy plays its turn with Enemy.do_turn. the enemy
+#     which comes first therefore wins when two of them want the same cell.
+#
+# NumPy is optional; SwarmEngine raises ImportError without it.
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import pathfinding
+
+# the directions, indexed by their codes
+DIRECTIONS = ('up', 'down', 'left', 'right')
+UP, DOWN, LEFT, RIGHT = range(4)
+
+# the codes of the behaviors, see actors.Enemy.is_hunting
+PLAIN, AGGRESIVE, RABID = range(3)
+BEHAVIOR_CODES = {'aggresive': AGGRESIVE, 'rabid': RABID}
+
+# the plans of the enemies
+NOTHING, ATTACK, MOVE, FORGET = range(4)
+
+# stands for None in the arrays of positions and directions
+NONE = -1
+
+class SwarmEngine:
+    # attributes:
+    #  - game
+    #  - enemies: the enemies of the game, in the order in which they play
+    #  - rows, cols: the position of each enemy
+    #  - alive
+    #  - seen_rows, seen_cols: the last_seen of each enemy, or NONE
+    #  - hero_directions: the code of the hero_direction of each enemy, or NONE
+    #  - behaviors: the code of the behavior of each enemy
+    #  - movable: movable[tile] is True iff an enemy can move to a cell with that tile.
+    #             every chest tile is assumed to hold a chest, as in the games
+    #             created by dungeon.Dungeon.
+
+    def __init__(self, game):
+        if numpy is None:
+            raise ImportError('SwarmEngine requires NumPy')
+        self.game = game
+        self.enemies = list(game.enemies)
+        self.behaviors = numpy.array([BEHAVIOR_CODES.get(enemy.behavior, PLAIN)
+                                      for enemy in self.enemies], dtype=numpy.int8)
+        the_map = game.map
+        self.movable = numpy.zeros(256, dtype=bool)
+        for char in (the_map.WALKABLE, the_map.GATEWAY, the_map.TREASURE_CHEST):
+            self.movable[ord(char)] = True
+        self.reload()
+
+    def reload(self):
+        # reads the state of the enemies from the Enemy objects.
+        # must be called whenever they are changed by something else than @self,
+        # apart from the hero killing them.
+        self.rows = numpy.array([enemy.pos[0] for enemy in self.enemies], dtype=numpy.int64)
+        self.cols = numpy.array([enemy.pos[1] for enemy in self.enemies], dtype=numpy.int64)
+        self.alive = numpy.array([enemy.is_alive for enemy in self.enemies], dtype=bool)
+        self.seen_rows = numpy.array([NONE if enemy.last_seen is None else enemy.last_seen[0]
+                                      for enemy in self.enemies], dtype=numpy.int64)
+        self.seen_cols = numpy.array([NONE if enemy.last_seen is None else enemy.last_seen[1]
+                                      for enemy in self.enemies], dtype=numpy.int64)
+        self.hero_directions = numpy.array([NONE if enemy.hero_direction is None
+                                            else DIRECTIONS.index(enemy.hero_direction)
+                                            for enemy in self.enemies], dtype=numpy.int8)
+
+    def store(self, i):
+        # copies the state of the i-th Enemy object into the arrays
+        enemy = self.enemies[i]
+        self.rows[i], self.cols[i] = enemy.pos
+        self.alive[i] = enemy.is_alive
+        if enemy.last_seen is None:
+            self.seen_rows[i] = self.seen_cols[i] = self.hero_directions[i] = NONE
+        else:
+            self.seen_rows[i], self.seen_cols[i] = enemy.last_seen
+            self.hero_directions[i] = DIRECTIONS.index(enemy.hero_direction)
+
+    def active(self):
+        # returns the indexes of the enemies which may do something this turn
+        the_map = self.game.map
+        tiles = numpy.frombuffer(the_map.tiles, dtype=numpy.uint8)
+        # the hero kills enemies only during his turn, and the cell of a
+        # killed enemy is cleaned up before anyone can step on it
+        self.alive &= tiles[self.rows * the_map.ncols + self.cols] == ord(the_map.ENEMY)
+
+        hero_row, hero_col = self.game.hero.pos
+        return numpy.flatnonzero(self.alive & ((self.rows == hero_row) | (self.cols == hero_col)
+                                               | (self.seen_rows != NONE)
+                                               | (self.behaviors == RABID)))
+
+    def sees_hero(self, active, rows, cols):
+        # returns (<seen>, <directions>, <distances>) where, for each of the
+        # @active enemies at @rows and @cols, <seen> tells whether it can see the
+        # hero, <directions> holds the code of the direction in which it sees him
+        # or NONE, and <distances> is the number of steps to him along a line
+        the_map = self.game.map
+        if the_map.row_blockers is None:
+            the_map.build_blockers()
+        if the_map.static_sight is None:
+            the_map.build_static_sight()
+        ncols = the_map.ncols
+        hero_row, hero_col = self.game.hero.pos
+
+        same_row = rows == hero_row
+        same_col = cols == hero_col
+        directions = numpy.full(len(active), NONE, dtype=numpy.int8)
+        directions[same_row & (cols < hero_col)] = RIGHT
+        directions[same_row & (cols > hero_col)] = LEFT
+        directions[same_col & (rows < hero_row)] = DOWN
+        directions[same_col & (rows > hero_row)] = UP
+        distances = numpy.where(same_row, numpy.abs(cols - hero_col), numpy.abs(rows - hero_row))
+
+        # no static blocker may be closer than the hero
+        clear = directions != NONE
+        indexes = rows * ncols + cols
+        for code, direction in enumerate(DIRECTIONS):
+            in_direction = directions == code
+            if in_direction.any():
+                sight = numpy.frombuffer(the_map.static_sight[direction], dtype=numpy.intc)
+                clear[in_direction] &= sight[indexes[in_direction]] >= distances[in_direction]
+
+        # no hero, enemy or chest may lie strictly between the enemy and the hero
+        for in_line, line, coords, hero_coord in ((same_row, the_map.row_blockers[hero_row], cols, hero_col),
+                                                  (same_col, the_map.col_blockers[hero_col], rows, hero_row)):
+            if in_line.any():
+                line = numpy.array(line, dtype=numpy.int64)
+                low = numpy.minimum(coords[in_line], hero_coord)
+                high = numpy.maximum(coords[in_line], hero_coord)
+                between = (numpy.searchsorted(line, high, 'left')
+                           - numpy.searchsorted(line, low, 'right'))
+                clear[in_line] &= between == 0
+
+        return clear, numpy.where(clear, directions, NONE), distances
+
+    def hunting_directions(self, rows, cols):
+        # returns the codes of the directions chosen by
+        # pathfinding.DistanceField.direction_from for the enemies at @rows and @cols,
+        # or NONE where no step gets closer to the hero
+        the_map = self.game.map
+        field = the_map.distance_field
+        result = numpy.full(len(rows), NONE, dtype=numpy.int8)
+        if field.target is None or len(rows) == 0:
+            return result
+        nrows, ncols = the_map.nrows, the_map.ncols
+        field.settle(rows * ncols + cols)
+        distances = numpy.frombuffer(field.distances, dtype=numpy.intc)
+        tiles = numpy.frombuffer(the_map.tiles, dtype=numpy.uint8)
+
+        own = distances[rows * ncols + cols]
+        unreachable = numpy.iinfo(numpy.intc).max
+        candidates = numpy.full((4, len(rows)), unreachable, dtype=numpy.intc)
+        for code, (drow, dcol, valid) in enumerate(((-1, 0, rows > 0), (1, 0, rows < nrows - 1),
+                                                    (0, -1, cols > 0), (0, 1, cols < ncols - 1))):
+            neighbours = (rows + drow) * ncols + (cols + dcol)
+            neighbours = numpy.where(valid, neighbours, 0)
+            distance = distances[neighbours]
+            ok = valid & self.movable[tiles[neighbours]] & (distance != pathfinding.UNREACHABLE)
+            candidates[code][ok] = distance[ok]
+
+        # argmin returns the first of the closest steps, like direction_from
+        best = candidates.argmin(axis=0)
+        best_distance = candidates[best, numpy.arange(len(rows))]
+        closer = (own != pathfinding.UNREACHABLE) & (best_distance < own)
+        result[closer] = best[closer]
+        return result
+
+    def plans(self, active):
+        # returns the arrays (<plans>, <directions>, <seen_rows>, <seen_cols>,
+        # <hero_directions>) of the @active enemies, where <directions> holds
+        # the direction of the attack or the move
+        rows, cols = self.rows[active], self.cols[active]
+        hero_row, hero_col = self.game.hero.pos
+
+        seen, seen_directions, distances = self.sees_hero(active, rows, cols)
+        seen_rows = numpy.where(seen, hero_row, self.seen_rows[active])
+        seen_cols = numpy.where(seen, hero_col, self.seen_cols[active])
+        hero_directions = numpy.where(seen, seen_directions, self.hero_directions[active])
+
+        behaviors = self.behaviors[active]
+        knows = seen_rows != NONE
+        hunting = (behaviors == RABID) | ((behaviors == AGGRESIVE) & knows)
+        attacking = seen & (distances == 1)
+
+        plans = numpy.full(len(active), NOTHING, dtype=numpy.int8)
+        directions = numpy.full(len(active), NONE, dtype=numpy.int8)
+
+        plans[attacking] = ATTACK
+        directions[attacking] = hero_directions[attacking]
+
+        hunters = hunting & ~attacking
+        hunt_directions = self.hunting_directions(rows[hunters], cols[hunters])
+        plans[numpy.flatnonzero(hunters)[hunt_directions != NONE]] = MOVE
+        directions[hunters] = hunt_directions
+
+        walkers = knows & ~hunting & ~attacking
+        arrived = walkers & (rows == seen_rows) & (cols == seen_cols)
+        plans[arrived] = FORGET
+        seen_rows[arrived] = seen_cols[arrived] = hero_directions[arrived] = NONE
+        walking = walkers & ~arrived
+        plans[walking] = MOVE
+        directions[walking] = hero_directions[walking]
+
+        return plans, directions, seen_rows, seen_cols, hero_directions
+
+    def play_turn(self):
+        # plays the turn of every enemy
+        active = self.active()
+        if len(active) == 0:
+            return
+        plans, directions, seen_rows, seen_cols, hero_directions = self.plans(active)
+        hero = self.game.hero
+
+        changed_rows = set()
+        changed_cols = set()
+        for i, plan, direction, seen_row, seen_col, hero_direction in zip(
+                active.tolist(), plans.tolist(), directions.tolist(),
+                seen_rows.tolist(), seen_cols.tolist(), hero_directions.tolist()):
+            enemy = self.enemies[i]
+            old_pos = enemy.pos
+            if (not hero.is_alive or old_pos[0] in changed_rows or old_pos[1] in changed_cols):
+                enemy.do_turn()
+            else:
+                if seen_row == NONE:
+                    enemy.last_seen = enemy.hero_direction = None
+                else:
+                    enemy.last_seen = (seen_row, seen_col)
+                    enemy.hero_direction = DIRECTIONS[hero_direction]
+                if plan == ATTACK:
+                    enemy.attack('fist', DIRECTIONS[direction])
+                elif plan == MOVE:
+                    enemy.move(DIRECTIONS[direction])
+
+            if enemy.pos != old_pos:
+                changed_rows.update((old_pos[0], enemy.pos[0]))
+                changed_cols.update((old_pos[1], enemy.pos[1]))
+            self.store(i)
@@ -0,0 +1,170 @@
+# this module plays games on a terminal with asyncio; Game.play uses it.
+# the terminal stays in cbreak mode for the whole session and the keys are
+# read by the event loop as soon as they arrive, so the game is never blocked
+# by the input.
+#
+# games are played either turn by turn, or in real time: then a round is
+# played every tick, whether a key was pressed or not.
+#
+# besides the keys of actors.Hero.read_command, 'r' restarts the game and
+# 'q' quits it.
+
+import os
+import sys
+import time
+import shutil
+import asyncio
+import collections
+import actors
+import render
+import simulation
+
+# the keys which are not hero commands
+RESTART_KEY = 'r'
+QUIT_KEY = 'q'
+
+class Keyboard:
+    # reads the keys pressed on a terminal.
+    # it is used as a context manager which keeps the terminal in cbreak mode.
+    # attributes:
+    #  - fd: the file descriptor the keys are read from
+    #  - saved_attributes: the terminal attributes to restore, or None
+    #  - keys: the asyncio.Queue of the keys read by the event loop, or None
+    #          if @self is not attached to an event loop. an empty string
+    #          is queued at the end of the input.
+
+    def __init__(self, fd=None):
+        self.fd = sys.stdin.fileno() if fd is None else fd
+        self.saved_attributes = None
+        self.keys = None
+
+    def __enter__(self):
+        if os.isatty(self.fd):
+            import tty, termios
+            self.saved_attributes = termios.tcgetattr(self.fd)
+            tty.setcbreak(self.fd)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.saved_attributes is not None:
+            import termios
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self.saved_attributes)
+            self.saved_attributes = None
+
+    def attach(self, loop):
+        # starts reading the keys with the event loop @loop
+        self.keys = asyncio.Queue()
+        loop.add_reader(self.fd, self.on_readable, loop)
+
+    def detach(self, loop):
+        loop.remove_reader(self.fd)
+        self.keys = None
+
+    def on_readable(self, loop):
+        data = os.read(self.fd, 1024)
+        if not data:
+            loop.remove_reader(self.fd)
+            self.keys.put_nowait('')
+        for key in data.decode('latin-1'):
+            self.keys.put_nowait(key)
+
+    async def get_key(self):
+        return await self.keys.get()
+
+    def read_key(self):
+        # waits for a key without an event loop and returns it
+        return os.read(self.fd, 1).decode('latin-1')
+
+class CommandParser:
+    # turns keys into the commands returned by actors.Hero.read_command,
+    # simulation.RESTART and simulation.QUIT, like read_command does.
+    # attributes:
+    #  - attack: the kind of attack whose direction is expected, or None
+
+    def __init__(self):
+        self.attack = None
+
+    def feed(self, key):
+        # returns the command completed by @key, or None
+        if key == '':
+            return simulation.QUIT
+        attack, self.attack = self.attack, None
+        if attack is not None:
+            # like in read_command, an attack with an invalid direction is dropped
+            if key in actors.Hero.DIRECTION_KEYS:
+                return attack, actors.Hero.DIRECTION_KEYS[key]
+            return None
+        if key in actors.Hero.DIRECTION_KEYS:
+            return actors.Hero.DIRECTION_KEYS[key]
+        elif key in actors.Hero.ATTACK_KEYS:
+            self.attack = actors.Hero.ATTACK_KEYS[key]
+        elif key == RESTART_KEY:
+            return simulation.RESTART
+        elif key == QUIT_KEY:
+            return simulation.QUIT
+        return None
+
+async def play(game, keyboard, renderer=None, tick=None):
+    # plays @game with the keys of @keyboard, which must be entered, and
+    # returns its status like Game.play.
+    # @renderer is the render.Renderer which draws @game; by default, one
+    # drawing on the standard output is used.
+    # if @tick is None, the game is played turn by turn; otherwise a round is
+    # played every @tick seconds, the hero waiting if no command was entered.
+    if renderer is None:
+        renderer = render.Renderer()
+    if game.viewport is None:
+        game.fit_viewport(*shutil.get_terminal_size())
+    loop = asyncio.get_running_loop()
+    keyboard.attach(loop)
+    try:
+        if tick is None:
+            return await play_turns(game, keyboard, renderer)
+        return await play_real_time(game, keyboard, renderer, tick)
+    finally:
+        keyboard.detach(loop)
+
+async def play_turns(game, keyboard, renderer):
+    parser = CommandParser()
+    while True:
+        game.timed('render', renderer.draw, game.frame)
+
+        start = time.perf_counter()
+        command = None
+        while command is None:
+            command = parser.feed(await keyboard.get_key())
+        if game.profiler is not None:
+            game.profiler.add_time('hero_input', time.perf_counter() - start)
+
+        status = game.command(command, renderer)
+        if status is not None:
+            return status
+
+async def play_real_time(game, keyboard, renderer, tick):
+    parser = CommandParser()
+    commands = collections.deque()
+
+    async def read_commands():
+        while True:
+            command = parser.feed(await keyboard.get_key())
+            if command is not None:
+                commands.append(command)
+
+    loop = asyncio.get_running_loop()
+    reader = asyncio.ensure_future(read_commands())
+    try:
+        next_tick = loop.time()
+        while True:
+            game.timed('render', renderer.draw, game.frame)
+            # a round which took longer than a tick delays the next ones,
+            # instead of letting them catch up by playing in a burst
+            next_tick = max(next_tick + tick, loop.time())
+            await asyncio.sleep(next_tick - loop.time())
+
+            # the commands entered faster than the ticks are played in the next rounds
+            command = commands.popleft() if commands else actors.Hero.WAIT
+            status = game.command(command, renderer)
+            if status is not None:
+                return status
+    finally:
+        reader.cancel()
@@ -148,6 +148,12 @@ class TestEnemy(unittest.TestCase):
 		self.enemy.pos = (0,1)
 		self.assertEqual(self.enemy.do_turn(),None)
 
+	def test_enemies_share_the_default_equipment(self):
+		other = Enemy.from_dict(self.dct)
+		self.assertIs(self.enemy.weapon, other.weapon)
+		self.assertIs(self.enemy.spell, treasures.DEFAULT_SPELL)
+		self.assertFalse(hasattr(self.enemy, '__dict__'))
+
 
 
 if __name__ == '__main__':
@@ -0,0 +1,28 @@
+import unittest
+from benchmarks import *
+
+class TestBenchmarks(unittest.TestCase):
+	def test_generated_dungeons_are_valid(self):
+		dct = generate_dungeon_dict(10, 0.1, seed=1)
+		the_dungeon = dungeon.Dungeon.from_dict(dct)
+		self.assertEqual((the_dungeon.nrows, the_dungeon.ncols), (10, 10))
+		self.assertEqual(len(list(the_dungeon.spawn_posns)), 1)
+		self.assertEqual(dct, generate_dungeon_dict(10, 0.1, seed=1))
+
+	def test_timing_benchmarks(self):
+		results = run_timing_benchmarks([8], [0.05])
+		self.assertEqual([result['benchmark'] for result in results], list(TIMING_BENCHMARKS))
+		for result in results:
+			self.assertEqual(result['size'], 8)
+			self.assertTrue(result['seconds'] is None or result['seconds'] >= 0)
+
+	def test_memory_benchmarks(self):
+		result = run_memory_benchmarks(100)
+		self.assertEqual(set(result), set(MEMORY_BENCHMARKS))
+		self.assertTrue(all(size > 0 for size in result.values()))
+		unslotted = run_memory_benchmarks(100, UNSLOTTED_MEMORY_BENCHMARKS)
+		self.assertEqual(set(unslotted), set(MEMORY_BENCHMARKS))
+		self.assertTrue(all(unslotted[name] > result[name] for name in result))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,108 @@
+import os
+import random
+import tempfile
+import unittest
+import actors
+import dungeon
+import simulation
+from chunked import *
+from fixtures import DUNGEONS, make_dungeon
+
+ROWS = ["#....T..",
+        "..E.....",
+        "........",
+        "......#.",
+        "........",
+        ".T......",
+        "........",
+        "...E...G"]
+
+class TestChunkedMap(unittest.TestCase):
+	def test_cells_match_map(self):
+		chunked_map = ChunkedMap.from_rows(ROWS, chunk_size=3)
+		the_map = dungeon.Map.from_rows(ROWS)
+		self.assertEqual(list(chunked_map.lines), list(the_map.lines))
+		self.assertEqual(chunked_map.window_lines(2, 1, 4, 5), the_map.window_lines(2, 1, 4, 5))
+		for pos in the_map.posns_lrtb:
+			self.assertEqual(chunked_map[pos], the_map[pos])
+			for direction in ['up', 'down', 'left', 'right']:
+				self.assertEqual(chunked_map.first_blocker(pos, direction),
+				                 the_map.first_blocker(pos, direction), (pos, direction))
+
+	def test_walkable_chunks_are_not_stored(self):
+		chunked_map = ChunkedMap.from_rows(ROWS, chunk_size=4)
+		self.assertEqual(sorted(chunked_map.chunks), [(0,0), (0,1), (1,0), (1,1)])
+		chunked_map = ChunkedMap(10000, 10000)
+		chunked_map[(5000, 5000)] = '#'
+		self.assertEqual(list(chunked_map.chunks), [(78, 78)])
+		self.assertEqual(chunked_map.first_blocker((5000, 0), 'right'), (5000, 5000))
+		chunked_map[(5000, 5000)] = '.'
+		self.assertEqual((chunked_map.chunks, chunked_map.row_blocked), ({}, {}))
+		self.assertIsNone(chunked_map.first_blocker((5000, 0), 'right'))
+
+	def test_snapshots_share_chunks(self):
+		chunked_map = ChunkedMap.from_rows(ROWS, chunk_size=4)
+		snapshot = chunked_map.snapshot()
+		chunked_map[(0,1)] = '#'
+		self.assertIsInstance(chunked_map.chunks[(0,0)], bytearray)
+		self.assertIs(chunked_map.chunks[(0,1)], snapshot[0][(0,1)])
+		chunked_map.restore(snapshot)
+		self.assertEqual(chunked_map[(0,1)], '.')
+		self.assertIsNone(chunked_map.first_blocker((0,0), 'right', 4))
+
+class TestChunkedGames(unittest.TestCase):
+	def play(self, game, commands):
+		frames = [game.frame]
+		for command in commands:
+			status = game.command(command)
+			frames.append(game.frame)
+			if status is not None:
+				return frames, simulation.STATUS_NAMES[status]
+		return frames, None
+
+	def test_games_match_map_games(self):
+		for name in ['dun1', 'dun2', 'dun3']:
+			the_dungeon = dungeon.Dungeon.from_file(os.path.join(DUNGEONS, name))
+			for spawn_pos in the_dungeon.spawn_posns:
+				rng = random.Random(0)
+				commands = [rng.choice(simulation.COMMANDS + ('restart',)) for i in range(100)]
+				game = create_game(the_dungeon, spawn_pos, 1, chunk_size=4, eviction_radius=0,
+				                   max_distance=1000)
+				try:
+					self.assertEqual(self.play(game, commands),
+					                 self.play(the_dungeon.create_game(spawn_pos, 1), commands))
+				finally:
+					game.map.close()
+
+	def test_hunt_is_bounded(self):
+		the_dungeon = make_dungeon(["S#......E",
+		                            "........."], [{"health":10, "mana":0, "fist_damage":1, "behavior":"rabid"}])
+		game = create_game(the_dungeon, (0,0), chunk_size=4)
+		game.step(actors.Hero.WAIT)
+		self.assertNotEqual(game.enemies[0].pos, (0,8))
+		game = create_game(the_dungeon, (0,0), chunk_size=4, max_distance=9)
+		game.step(actors.Hero.WAIT)
+		self.assertEqual(game.enemies[0].pos, (0,8))
+
+	def test_far_chunks_are_evicted(self):
+		the_dungeon = make_dungeon(["S..#....",
+		                            "........",
+		                            "........",
+		                            "......#G"])
+		with tempfile.TemporaryDirectory() as directory:
+			game = create_game(the_dungeon, (0,0), chunk_size=2, eviction_radius=0, directory=directory)
+			self.assertEqual(sorted(os.listdir(game.map.files)), ['0.chunk', '1.chunk'])
+			self.assertIsNone(game.map.chunks[(1,3)].tiles)
+			self.assertEqual(game.map[(3,6)], '#')
+			self.assertIsNotNone(game.map.chunks[(1,3)].tiles)
+			for command in ['down', 'down'] + ['right'] * 7 + ['down']:
+				status = game.step(command)
+			self.assertIs(status, game.WON)
+			game.reset_state()
+			self.assertEqual(game.map[(0,3)], '#')
+			self.assertEqual(game.hero.pos, (0,0))
+			game.map.close()
+			self.assertEqual(os.listdir(directory), [])
+
+if __name__ == '__main__':
+	unittest.main()
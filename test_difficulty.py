@@ -0,0 +1,96 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from difficulty import *
+from fixtures import make_dungeon
+
+class DrawnTreasures(list):
+	# records the indexes of the treasures drawn by random.choice
+	def __init__(self, treasures):
+		super().__init__(treasures)
+		self.drawn = []
+
+	def __getitem__(self, index):
+		self.drawn.append(index)
+		return super().__getitem__(index)
+
+class TestWilsonInterval(unittest.TestCase):
+	def test_interval(self):
+		self.assertEqual(wilson_interval(0, 0, 0.95), (0.0, 1.0))
+		low, high = wilson_interval(50, 100, 0.95)
+		self.assertAlmostEqual(low, 0.4038, places=4)
+		self.assertAlmostEqual(high, 0.5962, places=4)
+		low, high = wilson_interval(0, 100, 0.95)
+		self.assertEqual(low, 0.0)
+		self.assertAlmostEqual(high, 0.0370, places=4)
+		self.assertLess(wilson_interval(50, 100, 0.99)[0], wilson_interval(50, 100, 0.95)[0])
+
+class TestPlayBatch(unittest.TestCase):
+	def setUp(self):
+		self.dungeon = make_dungeon(["TTT",
+		                             "TST",
+		                             "TTT"], treasures=[{"type":"health_potion", "amount":amount}
+		                                                for amount in range(1, 5)])
+		simulation.POLICIES['shifted'] = lambda seed: simulation.random_policy(seed + 1)
+
+	def tearDown(self):
+		del simulation.POLICIES['shifted']
+
+	def draws(self, policy, seed):
+		self.dungeon.treasures = DrawnTreasures(self.dungeon.treasures)
+		evaluate.play_game(self.dungeon, (1,1), policy, seed, 10)
+		return self.dungeon.treasures.drawn
+
+	def test_treasure_draws_do_not_follow_the_policy(self):
+		matches = games = 0
+		for seed in range(100):
+			drawn, shifted_drawn = self.draws('random', seed), self.draws('shifted', seed)
+			# the policy's seed doesn't change the treasures drawn by the game
+			count = min(len(drawn), len(shifted_drawn))
+			self.assertEqual(drawn[:count], shifted_drawn[:count])
+			if drawn:
+				# with a seed shared by the game and the policy, the first
+				# treasure would be decided by the first command
+				policy_seed = evaluate.split_seed(seed)[1]
+				first_command = random.Random(policy_seed).choice(simulation.COMMANDS)
+				matches += drawn[0] == simulation.COMMANDS.index(first_command) // 4
+				games += 1
+		self.assertGreater(games, 50)
+		self.assertLess(matches, games / 2)
+
+class TestEstimate(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.path = os.path.join(self.directory, 'gateway')
+		make_dungeon(["SGS"]).save_compact(self.path)
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_estimation_stops_once_it_converged(self):
+		estimates = estimate([self.path], max_turns=300, workers=2)
+		self.assertEqual([result.spawn_pos for result in estimates], [(0,0), (0,2)])
+		for result in estimates:
+			self.assertTrue(result.converged)
+			self.assertEqual(result.games, 100)
+			self.assertEqual(result.counts['won'], 100)
+			self.assertLessEqual(result.margin, 0.02)
+
+	def test_estimation_stops_after_max_games(self):
+		[first, second] = estimate([self.path], margin=0, max_games=60, max_turns=5, workers=2)
+		self.assertFalse(first.converged)
+		self.assertEqual(first.games, 60)
+		self.assertTrue(0 < first.win_rate < 1)
+		low, high = first.interval
+		self.assertTrue(low < first.win_rate < high)
+
+	def test_estimates_are_reproducible(self):
+		runs = [[result.as_dict() for result in estimate([self.path], margin=0.1, min_games=10,
+		                                                    batch_size=5, max_turns=5, workers=workers)]
+		        for workers in [1, 3]]
+		self.assertEqual(runs[0], runs[1])
+
+if __name__ == '__main__':
+	unittest.main()
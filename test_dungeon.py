@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 from dungeon import *
 from actors import *
@@ -39,7 +41,8 @@ class TestDungeon(unittest.TestCase):
          "name":"Bron",
          "title":"dragon slayer",
          "health":100, "mana":100,
-         "mana_regeneration_rate":2
+         "mana_regeneration_rate":2,
+         "fist_damage":2
       },
       "enemies":[
          {
@@ -153,6 +156,45 @@ class TestDungeon(unittest.TestCase):
 			result.append(el)
 		self.assertEqual(result,[(0, 1),(1, 0),(1, 1)])
 
+	def test_first_blocker(self):
+		self.assertEqual(self.hero.map.first_blocker((0,1), 'right'), (0,2))
+		self.assertEqual(self.hero.map.first_blocker((0,1), 'left'), (0,0))
+		self.assertEqual(self.hero.map.first_blocker((0,4), 'right'), (0,6))
+		self.assertEqual(self.hero.map.first_blocker((0,4), 'right', 1), None)
+		self.assertEqual(self.hero.map.first_blocker((0,1), 'down'), (1,1))
+		self.assertEqual(self.hero.map.first_blocker((1,1), 'up'), None)
+		self.assertEqual(self.hero.map.first_blocker((3,9), 'down'), (4,9))
+		self.hero.map.cleanup_at((0,6))
+		self.assertEqual(self.hero.map.first_blocker((0,4), 'right'), (0,9))
+		self.hero.map[0,5] = 'E'
+		self.assertEqual(self.hero.map.first_blocker((0,4), 'right'), (0,5))
+		self.assertEqual(self.hero.map.first_blocker((3,5), 'up'), (2,5))
+		self.assertEqual(self.hero.map.first_blocker((1,5), 'up'), (0,5))
+
+	def test_view_lines(self):
+		self.assertEqual(self.hero.map.view_lines((0,0), 2, 3),
+			[' ###', '#H.#:', '##T#:', ' :::', ''])
+		self.assertEqual(self.hero.map.view_lines((2,5), 3, 4),
+			[' ::::', ':#S.#:', ':##E#:', ':...#:', ' ::::', ''])
+		self.assertEqual(self.hero.map.view_lines((4,9), 1, 20), self.hero.map.window_lines(4, 0, 1, 10))
+		self.assertEqual(self.hero.map.view_lines((4,9), 10, 20), self.hero.map.lines)
+
+	def test_static_sight(self):
+		the_map = Map.from_rows(["..#.",
+		                         ".E..",
+		                         "#..G"])
+		the_map.build_static_sight()
+		self.assertEqual(list(the_map.static_sight['right'][:4]), [2, 1, 2, 1])
+		self.assertEqual(list(the_map.static_sight['left'][8:]), [1, 1, 2, 3])
+		self.assertEqual(list(the_map.static_sight['down'][0:12:4]), [2, 1, 1])
+		self.assertEqual(list(the_map.static_sight['up'][3:12:4]), [1, 2, 3])
+		self.assertEqual(the_map.first_blocker((1,0), 'right'), (1,1))
+		self.assertEqual(the_map.first_blocker((1,2), 'right'), None)
+		self.assertEqual(the_map.first_blocker((1,3), 'down'), (2,3))
+		the_map[1,3] = Map.OBSTACLE
+		self.assertIsNone(the_map.static_sight)
+		self.assertEqual(the_map.first_blocker((1,2), 'right'), (1,3))
+
 	def test_if_game_initialization_is_correct(self):
 		self.assertIsInstance(self.hero, Hero)
 		self.assertIsInstance(self.enemy, Enemy)
@@ -183,9 +225,142 @@ class TestDungeon(unittest.TestCase):
 								{'health': 100, 'mana': 100, 'fist_damage': 30},
 								{'health': 100, 'mana': 100, 'fist_damage': 25}])
 
+	def test_compact_file(self):
+		with tempfile.TemporaryDirectory() as directory:
+			path = os.path.join(directory, 'dungeon')
+			self.d.save_compact(path)
+			d = Dungeon.from_file(path)
+			self.assertEqual(d.map_template, self.dict_data['map_template'])
+			self.assertEqual(list(d.spawn_posns), self.spawn_positions)
+			self.assertEqual(d.hero_partial_dict, self.dict_data['hero'])
+			game = d.create_game((0, 6))
+			self.assertEqual(game.hero.pos, (0, 6))
+			self.assertEqual(len(game.enemies), 3)
+			self.assertEqual(game.map.tiles, self.d.create_game((0, 6)).map.tiles)
+			del d, game
+
+	def test_rows_of_different_lengths_are_rejected(self):
+		self.dict_data['map_template'] = ["S..", "..G."]
+		with self.assertRaises(ValueError):
+			Dungeon.from_dict(self.dict_data)
+
+	def test_games_are_created_from_the_prepared_state(self):
+		first, second = self.d.create_game((0, 0)), self.d.create_game((0, 6))
+		self.assertNotIn(b'S', self.d.base_tiles)
+		self.assertEqual(first.map.tiles[:10], bytearray(b'H.##..S..T'.replace(b'S', b'.')))
+		self.assertEqual(second.map.tiles[:10], bytearray(b'..##..H..T'))
+		first.step('right')
+		self.assertEqual(second.map[0, 0], '.')
+		blockers = (second.map.row_blockers, second.map.col_blockers)
+		second.map.build_blockers()
+		self.assertEqual(blockers, (second.map.row_blockers, second.map.col_blockers))
+		self.assertIs(first.map.static_sight, second.map.static_sight)
+
 	def test_if_creates_game(self):
 		self.d.create_game(self.spawn_positions)
 		self.assertEqual(type(self.d.create_game(self.spawn_positions)),Game)
 
+class TestGame(unittest.TestCase):
+	def setUp(self):
+		self.d = Dungeon.from_dict({
+			"hero":{
+				"name":"Bron",
+				"title":"dragon slayer",
+				"health":100, "mana":100,
+				"mana_regeneration_rate":2,
+				"fist_damage":40
+			},
+			"enemies":{"all":{"health":40, "mana":100, "fist_damage":20}},
+			"map_template":["S.E.G"],
+			"treasures":[]
+		})
+		self.game = self.d.create_game((0,0))
+		self.enemy = self.game.enemies[0]
+
+	def test_map_holds_tiles_and_entities(self):
+		self.assertEqual(self.game.map.tiles, bytearray(b'H.E.G'))
+		self.assertEqual(list(self.game.map.rows), ['H.E.G'])
+		self.assertIs(self.game.map[0,0], self.game.hero)
+		self.assertEqual(self.game.map[0,4], 'G')
+		self.assertTrue(self.game.map.can_move_to((0,4)))
+		self.assertFalse(self.game.map.can_move_to((0,2)))
+
+	def test_frame(self):
+		self.assertEqual(self.game.frame, ['health: 100', 'mana: 100', 'weapon: ', 'spell: ', '',
+			' #####', '#H.E.G#', ' #####', ''])
+
+	def test_viewport(self):
+		self.game.fit_viewport(80, 24)
+		self.assertIsNone(self.game.viewport)
+		self.game.fit_viewport(5, 24)
+		self.assertEqual(self.game.viewport, (16, 3))
+		self.assertEqual(self.game.frame[5:], [' ###', '#H.E:', ' ###', ''])
+
+	def test_reset_state_restores_the_initial_state(self):
+		self.game.step('right')
+		self.game.step(('fist', 'right'))
+		self.assertEqual(self.game.hero.pos, (0,1))
+		self.assertEqual(self.game.hero.health, 80)
+		self.assertEqual(self.enemy.health, 0)
+		self.game.reset_state()
+		self.assertEqual(self.game.hero.pos, (0,0))
+		self.assertEqual(self.game.hero.health, 100)
+		self.assertEqual(self.enemy.health, 40)
+		self.assertIs(self.game.map[0,0], self.game.hero)
+		self.assertIs(self.game.map[0,2], self.enemy)
+		self.assertEqual(self.game.map[0,1], '.')
+
+	def test_named_checkpoints(self):
+		self.game.step('right')
+		self.game.save('before fight')
+		self.game.step(('fist', 'right'))
+		self.game.step('right')
+		self.assertEqual(self.game.hero.pos, (0,2))
+		for i in range(2):
+			self.game.rewind('before fight')
+			self.assertEqual(self.game.hero.pos, (0,1))
+			self.assertEqual(self.game.map[0,2], self.enemy)
+			self.assertEqual(self.enemy.health, 40)
+			self.game.step(('fist', 'right'))
+			self.assertEqual(self.enemy.health, 0)
+		self.game.reset_state()
+		self.assertEqual(self.game.hero.pos, (0,0))
+
+	def test_snapshot_does_not_change_with_the_game(self):
+		snapshot = self.game.snapshot()
+		self.game.step('right')
+		self.game.restore(snapshot)
+		self.assertEqual(self.game.hero.pos, (0,0))
+		self.assertIs(self.game.map[0,0], self.game.hero)
+
+	def test_restore_forgets_the_dead_enemies(self):
+		self.game.step('right')
+		self.game.hero_turn(('fist', 'right'))
+		self.assertEqual(self.enemy.health, 0)
+		# the dead enemy is only dropped from the enemies by the enemies' turn
+		snapshot = self.game.snapshot()
+		self.game.enemies_turn()
+		self.assertEqual(self.game.enemies, [])
+		self.game.restore(snapshot)
+		self.assertEqual(self.game.enemies, [self.enemy])
+		self.game.enemies_turn()
+		self.assertEqual(self.game.enemies, [])
+		self.assertEqual(self.game.hero.health, 80)
+
+	def test_command(self):
+		class Recorder:
+			def __init__(self):
+				self.commands = []
+			def record(self, command):
+				self.commands.append(command)
+		self.game.replay = Recorder()
+		self.assertIsNone(self.game.command('right'))
+		self.assertEqual(self.game.hero.pos, (0,1))
+		self.assertIsNone(self.game.command(Game.RESTART_COMMAND))
+		self.assertEqual(self.game.hero.pos, (0,0))
+		self.assertIs(self.game.command(Game.QUIT_COMMAND), Game.QUIT)
+		self.assertEqual(self.game.replay.commands,
+		                 ['right', Game.RESTART_COMMAND, Game.QUIT_COMMAND])
+
 if __name__ == '__main__':
 	unittest.main()
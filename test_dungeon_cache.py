@@ -0,0 +1,66 @@
+import os
+import mmap
+import shutil
+import tempfile
+import unittest
+import dungeon
+from dungeon_cache import *
+from fixtures import copy_dungeons
+
+class TestDungeonCache(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		[self.path] = copy_dungeons(self.directory, ['dun1'])
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_cache_is_written_and_reused(self):
+		parsed = load(self.path)
+		self.assertTrue(os.path.exists(cache_path(self.path)))
+		cached = load(self.path)
+		self.assertIsInstance(cached.tiles, bytes)
+		self.assertEqual(cached.map_template, parsed.map_template)
+		self.assertEqual(cached.cell_index, parsed.index_cells())
+		self.assertEqual(list(cached.spawn_posns), [(0, 0), (4, 3)])
+		self.assertEqual(cached.treasure_data, parsed.treasure_data)
+		game = cached.create_game((4, 3))
+		self.assertEqual(game.hero.pos, (4, 3))
+		self.assertEqual(len(game.enemies), 2)
+		self.assertEqual(game.map.gateway_pos, (4, 9))
+
+	def test_cache_is_not_used_when_the_dungeon_changes(self):
+		load(self.path)
+		with open(self.path) as f:
+			text = f.read()
+		with open(self.path, 'w') as f:
+			f.write(text.replace('"S.##.....T"', '"..##.....T"'))
+		self.assertIsNone(read_cache(cache_path(self.path), file_hash(self.path)))
+		self.assertEqual(list(load(self.path).spawn_posns), [(4, 3)])
+		self.assertEqual(list(load(self.path).spawn_posns), [(4, 3)])
+
+	def test_large_caches_are_memory_mapped(self):
+		load(self.path)
+		threshold, dungeon.MMAP_THRESHOLD = dungeon.MMAP_THRESHOLD, 0
+		try:
+			cached = load(self.path)
+		finally:
+			dungeon.MMAP_THRESHOLD = threshold
+		self.assertIsInstance(cached.tiles, mmap.mmap)
+		self.assertEqual(cached.map_template, load(self.path).map_template)
+
+	@unittest.skipUnless(os.path.isdir('/proc/self/fd'), 'the open files can\'t be listed')
+	def test_caches_dont_keep_files_open(self):
+		load(self.path)
+		fds = len(os.listdir('/proc/self/fd'))
+		dungeons = [load(self.path) for i in range(20)]
+		self.assertEqual(len(os.listdir('/proc/self/fd')), fds)
+
+	def test_main_compiles_directories(self):
+		main([self.directory])
+		self.assertEqual(sorted(os.listdir(self.directory)), [CACHE_DIRECTORY, 'dun1'])
+		self.assertEqual(os.listdir(os.path.join(self.directory, CACHE_DIRECTORY)), ['dun1.cache'])
+		self.assertEqual(dungeon_paths([self.directory]), [self.path])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,117 @@
+import random
+import unittest
+import env
+from env import *
+from fixtures import make_dungeon
+
+RIGHT = ACTIONS.index('right')
+LEFT = ACTIONS.index('left')
+WAIT = ACTIONS.index(actors.Hero.WAIT)
+
+@unittest.skipIf(env.numpy is None, 'NumPy is not installed')
+class TestEnv(unittest.TestCase):
+	def setUp(self):
+		self.corridor = make_dungeon(["S..G"])
+		self.ambush = make_dungeon(["SE.G",
+		                            "...E"],
+			[{"health":100, "mana":100, "fist_damage":20},
+			 {"health":30, "mana":50, "fist_damage":0}], health=10, fist_damage=10)
+
+	def test_observation(self):
+		observation, info = Env(self.ambush).reset(seed=1)
+		self.assertEqual(info, {'turns': 0})
+		self.assertEqual(bytes(observation['tiles'].ravel()), b'HE.G...E')
+		self.assertEqual(observation['tiles'].shape, (2, 4))
+		self.assertEqual(list(observation['hero']), [10, 100, 0, 0, 0, 0, 0, 1])
+		self.assertEqual(observation['enemies'].tolist(), [[100, 100, 0, 1], [30, 50, 1, 3]])
+
+	def test_won_game(self):
+		corridor_env = Env(self.corridor)
+		corridor_env.reset()
+		for turns in [1, 2]:
+			observation, reward, terminated, truncated, info = corridor_env.step(RIGHT)
+			self.assertEqual((reward, terminated, truncated, info), (0.0, False, False, {'turns': turns}))
+		self.assertEqual(list(observation['hero'][2:4]), [0, 2])
+		observation, reward, terminated, truncated, info = corridor_env.step(RIGHT)
+		self.assertEqual((reward, terminated, truncated), (1.0, True, False))
+		self.assertEqual(info, {'turns': 3, 'status': 'won'})
+
+	def test_killed_hero(self):
+		ambush_env = Env(self.ambush)
+		ambush_env.reset()
+		observation, reward, terminated, truncated, info = ambush_env.step(ACTIONS.index(('fist', 'right')))
+		self.assertEqual((reward, terminated, truncated), (-1.0, True, False))
+		self.assertEqual(info['status'], 'killed')
+		self.assertEqual(observation['hero'][0], 0)
+		self.assertEqual(observation['enemies'][0][0], 90)
+
+	def test_truncated_game(self):
+		corridor_env = Env(self.corridor, max_turns=2)
+		corridor_env.reset()
+		corridor_env.step(LEFT)
+		observation, reward, terminated, truncated, info = corridor_env.step(WAIT)
+		self.assertEqual((reward, terminated, truncated), (0.0, False, True))
+		self.assertEqual(info, {'turns': 2, 'status': 'quit'})
+
+	def test_spawn_positions_are_drawn_from_the_seed(self):
+		the_dungeon = make_dungeon(["S.S.S", "....G"])
+		def spawns(seed):
+			the_env = Env(the_dungeon, seed=seed)
+			return [tuple(the_env.reset()[0]['hero'][2:4]) for i in range(20)]
+		self.assertEqual(spawns(3), spawns(3))
+		self.assertEqual(set(spawns(3)), {(0,0), (0,2), (0,4)})
+		self.assertEqual(tuple(Env(the_dungeon, (0,2)).reset()[0]['hero'][2:4]), (0,2))
+
+@unittest.skipIf(env.numpy is None, 'NumPy is not installed')
+class TestVectorEnv(unittest.TestCase):
+	def setUp(self):
+		self.corridor = make_dungeon(["S..G",
+		                              "...T"], treasures=[{"type":"health_potion", "amount":10}])
+
+	def test_observations_are_stacked(self):
+		vector_env = VectorEnv(self.corridor, 3, seed=0)
+		observations, infos = vector_env.reset()
+		self.assertEqual(observations['tiles'].shape, (3, 2, 4))
+		self.assertEqual(observations['hero'].shape, (3, len(HERO_STATS)))
+		self.assertEqual(observations['enemies'].shape, (3, 0, len(ENEMY_STATS)))
+		self.assertEqual(infos, [{'turns': 0}] * 3)
+		observations, rewards, terminated, truncated, infos = vector_env.step([RIGHT, LEFT, RIGHT])
+		self.assertEqual(observations['hero'][:, 3].tolist(), [1, 0, 1])
+		self.assertEqual(rewards.tolist(), [0.0] * 3)
+
+	def test_ended_games_are_replaced(self):
+		vector_env = VectorEnv(self.corridor, 2, max_turns=3, seed=0)
+		vector_env.reset()
+		for turn in range(2):
+			vector_env.step([RIGHT, WAIT])
+		observations, rewards, terminated, truncated, infos = vector_env.step([RIGHT, WAIT])
+		self.assertEqual(rewards.tolist(), [1.0, 0.0])
+		self.assertEqual(terminated.tolist(), [True, False])
+		self.assertEqual(truncated.tolist(), [False, True])
+		self.assertEqual(infos, [{'turns': 3, 'status': 'won'}, {'turns': 3, 'status': 'quit'}])
+		self.assertEqual(observations['hero'][:, 2:4].tolist(), [[0, 0], [0, 0]])
+		observations, rewards, terminated, truncated, infos = vector_env.step([RIGHT, RIGHT])
+		self.assertEqual(observations['hero'][:, 3].tolist(), [1, 1])
+		self.assertEqual(infos, [{'turns': 1}] * 2)
+
+	def test_games_are_reproducible(self):
+		def play(copy):
+			vector_env = VectorEnv(self.corridor, 4, max_turns=5, seed=2, copy=copy)
+			rng = random.Random(0)
+			observations = [vector_env.reset()[0]]
+			for i in range(20):
+				actions = [rng.randrange(len(ACTIONS)) for game in range(4)]
+				observations.append(vector_env.step(actions)[0])
+			return observations
+		copies = play(True)
+		self.assertIsNot(copies[0]['tiles'], copies[1]['tiles'])
+		self.assertEqual([observations['tiles'].tolist() for observations in copies],
+		                 [observations['tiles'].tolist() for observations in play(True)])
+
+	def test_observations_are_shared_without_copies(self):
+		vector_env = VectorEnv(self.corridor, 2, copy=False)
+		observations = vector_env.reset()[0]
+		self.assertIs(vector_env.step([RIGHT, RIGHT])[0], observations)
+
+if __name__ == '__main__':
+	unittest.main()
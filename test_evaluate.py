@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+import unittest
+from evaluate import *
+from dungeon_cache import dungeon_paths
+from fixtures import copy_dungeons
+
+class TestEvaluate(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		copy_dungeons(self.directory)
+		self.paths = dungeon_paths([self.directory])
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_directories_are_expanded(self):
+		self.assertEqual([os.path.basename(path) for path in self.paths], ['dun1', 'dun2', 'dun3'])
+		load_dungeon(self.paths[0])
+		# the caches are skipped, whether they are in their directory or not
+		shutil.copy(os.path.join(self.directory, '.dungeon-cache', 'dun1.cache'), self.directory)
+		self.assertEqual(dungeon_paths([self.directory]), self.paths)
+		self.assertEqual(dungeon_paths(self.paths + [self.paths[0] + '.cache']), self.paths)
+
+	def test_jobs_cover_every_spawn_and_seed(self):
+		result = list(jobs(self.paths[:1], seeds=range(3)))
+		self.assertEqual(len(result), 6)
+		self.assertEqual(result[0], (self.paths[0], (0, 0), 'random', 0, 1000))
+
+	def test_play_job_is_reproducible(self):
+		job = (self.paths[0], (0, 0), 'random', 7, 200)
+		self.assertEqual(play_job(job), play_job(job))
+		self.assertEqual(play_job(job), (self.paths[0], (0, 0), 'killed', 13))
+
+	def test_game_and_policy_have_their_own_seeds(self):
+		game_seed, policy_seed = split_seed(7)
+		self.assertNotEqual(game_seed, policy_seed)
+		self.assertEqual(split_seed(7), (game_seed, policy_seed))
+		game = load_dungeon(self.paths[0]).create_game((0, 0), game_seed)
+		result = simulation.run(game, simulation.random_policy(policy_seed), 200)
+		self.assertEqual(play_job((self.paths[0], (0, 0), 'random', 7, 200))[2:], (result.name, result.turns))
+
+	def test_evaluate(self):
+		result = evaluate(jobs(self.paths, seeds=range(2), max_turns=50), workers=1)
+		self.assertEqual(set(result), set(self.paths))
+		total, per_spawn = result[self.paths[0]]
+		self.assertEqual(total.games, 4)
+		self.assertEqual(set(per_spawn), {(0, 0), (4, 3)})
+		self.assertEqual(sum(stats.games for stats in per_spawn.values()), 4)
+		self.assertEqual(total.as_dict()['games'], 4)
+
+if __name__ == '__main__':
+	unittest.main()
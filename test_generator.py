@@ -0,0 +1,44 @@
+import os
+import tempfile
+import unittest
+import pathfinding
+from generator import *
+from dungeon import Dungeon
+
+class TestGenerator(unittest.TestCase):
+	def test_contents(self):
+		dct = generate_dict(30, 40, seed=1, obstacle_density=0.3, enemies=20, chests=7, spawns=3)
+		rows = dct['map_template']
+		self.assertEqual(len(rows), 30)
+		self.assertTrue(all(len(row) == 40 for row in rows))
+		counts = {char: sum(row.count(char) for row in rows) for char in 'SEGT'}
+		self.assertEqual(counts, {'S': 3, 'E': 20, 'G': 1, 'T': 7})
+		self.assertEqual(dct, generate_dict(30, 40, seed=1, obstacle_density=0.3,
+		                                    enemies=20, chests=7, spawns=3))
+
+	def test_gateway_is_reachable_from_every_spawn(self):
+		for seed in range(10):
+			the_dungeon = Dungeon.from_dict(generate_dict(25, 25, seed=seed,
+			                                              obstacle_density=0.6, spawns=4))
+			for spawn_pos in the_dungeon.spawn_posns:
+				game = the_dungeon.create_game(spawn_pos)
+				field = pathfinding.DistanceField(game.map)
+				field.retarget(game.map.gateway_pos)
+				self.assertNotEqual(field.distance(spawn_pos), pathfinding.UNREACHABLE)
+
+	def test_too_many_contents_are_rejected(self):
+		with self.assertRaises(ValueError):
+			generate_dict(2, 2, enemies=3, spawns=1)
+
+	def test_files(self):
+		expected = generate_dict(12, 9, seed=4, enemies=5, chests=2)['map_template']
+		with tempfile.TemporaryDirectory() as directory:
+			for write in (write_json, write_compact):
+				path = os.path.join(directory, write.__name__)
+				write(path, 12, 9, seed=4, enemies=5, chests=2)
+				the_dungeon = Dungeon.from_file(path)
+				self.assertEqual(the_dungeon.map_template, expected)
+				self.assertEqual(len(list(the_dungeon.spawn_posns)), 1)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,111 @@
+import random
+import unittest
+import pathfinding
+from pathfinding import *
+from dungeon import Map
+from fixtures import make_dungeon
+
+def hunters(behavior):
+	return {"all":{"health":100, "mana":100, "fist_damage":10, "behavior":behavior}}
+
+class TestDistanceField(unittest.TestCase):
+	def setUp(self):
+		self.map = Map.from_rows(["....",
+		                          ".##.",
+		                          "..#.",
+		                          "#..."])
+		self.field = DistanceField(self.map)
+		self.field.retarget((2,0))
+
+	def test_distances(self):
+		self.assertEqual(self.field.distance((2,0)), 0)
+		self.assertEqual(self.field.distance((0,0)), 2)
+		self.assertEqual(self.field.distance((0,3)), 5)
+		self.assertEqual(self.field.distance((3,3)), 4)
+		self.assertEqual(self.field.distance((1,1)), UNREACHABLE)
+
+	def test_direction_from(self):
+		self.assertEqual(self.field.direction_from((0,3)), 'left')
+		self.assertEqual(self.field.direction_from((2,3)), 'down')
+		self.assertEqual(self.field.direction_from((2,0)), None)
+
+	def test_field_follows_the_terrain(self):
+		self.assertEqual(self.field.distance((3,3)), 4)
+		self.map[1,0] = Map.OBSTACLE
+		self.assertEqual(self.field.distance((3,3)), 4)
+		self.assertEqual(self.field.distance((0,3)), 7)
+		self.map[3,1] = Map.OBSTACLE
+		self.assertEqual(self.field.distance((3,3)), UNREACHABLE)
+
+	def test_max_distance(self):
+		field = DistanceField(self.map, max_distance=2)
+		field.retarget((2,0))
+		self.assertEqual(field.distance((0,0)), 2)
+		self.assertEqual(field.distance((0,1)), UNREACHABLE)
+
+	def test_search_stops_once_the_cells_are_reached(self):
+		field = DistanceField(Map.from_rows(["." * 100] * 100))
+		field.retarget((50,50))
+		self.assertEqual(field.distance((50,53)), 3)
+		self.assertEqual(field.reached, 3)
+		self.assertEqual(field.distance((0,0)), 100)
+		self.assertEqual(field.reached, 100)
+
+	def test_same_distances_with_and_without_numpy(self):
+		rng = random.Random(0)
+		the_map = Map.from_rows([''.join(rng.choice('...#') for col in range(30))
+		                         for row in range(20)])
+		results = []
+		for use_numpy in [False, True]:
+			if use_numpy and pathfinding.numpy is None:
+				continue
+			saved_numpy = pathfinding.numpy
+			if not use_numpy:
+				pathfinding.numpy = None
+			try:
+				field = DistanceField(the_map)
+				field.retarget((10,15))
+				field.settle(range(20 * 30))
+				results.append(list(field.distances))
+			finally:
+				pathfinding.numpy = saved_numpy
+		self.assertTrue(all(result == results[0] for result in results))
+
+class TestHunting(unittest.TestCase):
+	def test_rabid_enemy_walks_around_walls(self):
+		game = make_dungeon(["S.#E",
+		                     "..#.",
+		                     "....",
+		                     "...G"], hunters("rabid")).create_game((0,0))
+		enemy = game.enemies[0]
+		positions = []
+		for i in range(4):
+			game.step('left')
+			positions.append(enemy.pos)
+		self.assertEqual(positions, [(1,3), (2,3), (2,2), (2,1)])
+
+	def play(self, behavior):
+		game = make_dungeon(["E....",
+		                     "####.",
+		                     "S...."], hunters(behavior)).create_game((2,0))
+		enemy = game.enemies[0]
+		for command in ['right'] * 4 + ['up'] * 2:
+			self.assertIsNone(enemy.last_seen)
+			game.step(command)
+		self.assertEqual(enemy.pos, (0,1))
+		for command in ['down', 'down', 'left', 'left', 'left']:
+			game.step(command)
+		return enemy
+
+	def test_aggresive_enemy_hunts_after_seeing_the_hero(self):
+		enemy = self.play('aggresive')
+		self.assertTrue(enemy.is_hunting)
+		self.assertEqual(enemy.pos, (2,4))
+
+	def test_other_enemies_walk_to_where_they_saw_the_hero(self):
+		enemy = self.play('friendly')
+		self.assertFalse(enemy.is_hunting)
+		self.assertEqual(enemy.pos, (0,4))
+
+if __name__ == '__main__':
+	unittest.main()
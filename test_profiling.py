@@ -0,0 +1,50 @@
+import os
+import unittest
+import simulation
+from profiling import *
+from dungeon import Dungeon
+from fixtures import DUNGEONS
+
+class FakeClock:
+	def __init__(self):
+		self.now = 0.0
+
+	def __call__(self):
+		self.now += 0.5
+		return self.now
+
+class TestProfiler(unittest.TestCase):
+	def setUp(self):
+		self.profiler = Profiler(FakeClock())
+
+	def test_times_and_counters(self):
+		self.profiler.add_time('render', 1.0)
+		self.profiler.add_time('render', 2.0)
+		self.profiler.count('chest_openings')
+		self.profiler.count('chest_openings', 2)
+		self.assertEqual(self.profiler.as_dict(), {
+			'phases': {'render': {'calls': 2, 'seconds': 3.0, 'mean_seconds': 1.5}},
+			'counters': {'chest_openings': 3}})
+		lines = self.profiler.table_lines
+		self.assertTrue(lines[1].startswith('render'))
+		self.assertTrue(lines[-1].startswith('chest_openings'))
+
+	def test_game_phases(self):
+		game = Dungeon.from_file(os.path.join(DUNGEONS, 'dun1')).create_game((0,0), 0)
+		game.profiler = self.profiler
+		self.assertIs(game.map.profiler, self.profiler)
+		result = simulation.run(game, simulation.scripted(['right', ('fist', 'down')]))
+		phases = self.profiler.as_dict()['phases']
+		self.assertEqual(phases['hero_action'], {'calls': 2, 'seconds': 1.0, 'mean_seconds': 0.5})
+		self.assertEqual(phases['enemy_turn']['calls'], 2 * len(game.enemies))
+		self.assertEqual(self.profiler.counters['isinstance_dispatches'], 1)
+		self.assertEqual(self.profiler.counters['tiles_scanned'], 1)
+		self.assertGreater(self.profiler.counters['sight_lines'], 0)
+
+	def test_games_without_profiler_are_not_measured(self):
+		game = Dungeon.from_file(os.path.join(DUNGEONS, 'dun1')).create_game((0,0), 0)
+		simulation.run(game, simulation.scripted(['right']))
+		self.assertIsNone(game.profiler)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,42 @@
+import io
+import unittest
+from render import *
+
+class TestRenderer(unittest.TestCase):
+	def setUp(self):
+		self.file = io.StringIO()
+		self.renderer = Renderer(self.file)
+		self.renderer.draw(['health: 100', '#H..#', ''])
+		self.file.seek(0)
+		self.file.truncate()
+
+	def test_changed_span(self):
+		self.assertEqual(changed_span('#H..#', '#.H.#'), (1, 3))
+		self.assertEqual(changed_span('#H..#', '#H..#'), (5, 5))
+		self.assertEqual(changed_span('health: 100', 'health: 98'), (8, 10))
+
+	def test_first_frame_is_drawn_whole(self):
+		file = io.StringIO()
+		Renderer(file).draw(['a', 'b'])
+		self.assertEqual(file.getvalue(), CLEAR_SCREEN + 'a\nb' + move_cursor(2, 0))
+
+	def test_same_frame_writes_nothing(self):
+		self.renderer.draw(['health: 100', '#H..#', ''])
+		self.assertEqual(self.file.getvalue(), '')
+
+	def test_only_changed_cells_are_written(self):
+		self.renderer.draw(['health: 100', '#.H.#', ''])
+		self.assertEqual(self.file.getvalue(), move_cursor(1, 1) + '.H' + move_cursor(3, 0))
+
+	def test_shorter_line_is_cleared(self):
+		self.renderer.draw(['health: 98', '#H..#', ''])
+		self.assertEqual(self.file.getvalue(),
+			move_cursor(0, 8) + '98' + CLEAR_LINE_END + move_cursor(3, 0))
+
+	def test_invalidate(self):
+		self.renderer.invalidate()
+		self.renderer.draw(['health: 100', '#H..#', ''])
+		self.assertTrue(self.file.getvalue().startswith(CLEAR_SCREEN))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+import actors
+import simulation
+from replay import *
+from dungeon import Dungeon
+from fixtures import DUNGEONS
+
+def state(game):
+	return (bytes(game.map.tiles), game.hero.health, game.hero.mana,
+	        game.hero.weapon.name, game.hero.spell.name,
+	        [(enemy.pos, enemy.health) for enemy in game.actors[1:]])
+
+class TestReplay(unittest.TestCase):
+	def setUp(self):
+		self.path = os.path.join(DUNGEONS, 'dun1')
+		self.dungeon = Dungeon.from_file(self.path)
+
+	def test_keys(self):
+		commands = ['up', ('weapon', 'left'), simulation.RESTART, ('spell', 'down'), 'right',
+		            actors.Hero.WAIT, simulation.QUIT]
+		keys = ''.join(map(encode, commands))
+		self.assertEqual(keys, '8w4rs26.q')
+		self.assertEqual(list(decode(keys)), commands)
+		with self.assertRaises(ValueError):
+			list(decode('8x'))
+
+	def test_games_with_the_same_seed_are_identical(self):
+		results = []
+		for attempt in range(2):
+			game = self.dungeon.create_game((0,0), 5)
+			simulation.run(game, simulation.random_policy(5), 200)
+			results.append(state(game))
+		self.assertEqual(results[0], results[1])
+
+	def test_rewinding_restores_the_random_number_generator(self):
+		game = self.dungeon.create_game((0,0), 3)
+		game.save('start')
+		draws = [game.rng.random() for i in range(3)]
+		game.rewind('start')
+		self.assertEqual([game.rng.random() for i in range(3)], draws)
+
+	def test_replay_reproduces_a_session(self):
+		game = self.dungeon.create_game((0,0), 11)
+		recording = Replay.of_game(game, self.path)
+		self.assertIs(game.replay, recording)
+		policy = simulation.random_policy(11, simulation.COMMANDS + (simulation.RESTART,))
+		def recorded_policy(game):
+			command = policy(game)
+			recording.record(command)
+			return command
+		result = simulation.run(game, recorded_policy, 150)
+		expected = (result.name, result.turns, state(game))
+
+		replayed = Replay.loads(recording.dumps())
+		self.assertEqual(replayed.seed, 11)
+		self.assertEqual(replayed.spawn_pos, (0,0))
+		result, game = replayed.run(self.dungeon)
+		self.assertEqual((result.name, result.turns, state(game)), expected)
+
+	def test_replay_refuses_a_changed_dungeon(self):
+		directory = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, directory)
+		path = os.path.join(directory, 'dun1')
+		shutil.copy(self.path, path)
+		game = Dungeon.from_file(path).create_game((0,0), 2)
+		recording = Replay.of_game(game, path)
+		recording.record('right')
+		replayed = Replay.loads(recording.dumps())
+		self.assertEqual(replayed.dungeon_hash, recording.dungeon_hash)
+		self.assertEqual(replayed.run()[1].hero.pos, (0,1))
+
+		with open(path) as f:
+			text = f.read()
+		with open(path, 'w') as f:
+			f.write(text.replace('"health": 100', '"health": 99', 1))
+		with self.assertRaises(DungeonChanged):
+			replayed.run()
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,78 @@
+import os
+import glob
+import shutil
+import asyncio
+import tempfile
+import unittest
+from server import *
+from fixtures import copy_dungeons
+
+class TestServer(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.dungeons = os.path.join(self.directory.name, 'dungeons')
+		os.mkdir(self.dungeons)
+		self.server = Server.from_paths(copy_dungeons(self.dungeons, ['dun1', 'dun2']))
+		self.path = os.path.join(self.directory.name, 'socket')
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def run_clients(self, *scripts):
+		# runs a client for each of @scripts, which are lists of lines to send,
+		# and returns the list of the messages each client received
+		async def client(script):
+			reader, writer = await open_connection(unix_path=self.path)
+			writer.write(''.join(line + '\n' for line in script).encode())
+			messages = []
+			while True:
+				message = await read_message(reader)
+				if message[0] is None:
+					break
+				messages.append(message)
+			writer.close()
+			return messages
+
+		async def main():
+			listener = await self.server.start(unix_path=self.path)
+			async with listener:
+				return await asyncio.gather(*map(client, scripts))
+		return asyncio.run(main())
+
+	def test_caches_are_not_hosted(self):
+		# the caches written by setUp, and one left next to the dungeons by an older version
+		shutil.copy(os.path.join(self.dungeons, '.dungeon-cache', 'dun1.cache'), self.dungeons)
+		server = Server.from_paths([self.dungeons])
+		self.assertEqual(list(server.dungeons), ['dun1', 'dun2'])
+		server = Server.from_paths(sorted(glob.glob(os.path.join(self.dungeons, '*'))))
+		self.assertEqual(list(server.dungeons), ['dun1', 'dun2'])
+
+	def test_list(self):
+		[messages] = self.run_clients(['LIST', 'BYE'])
+		self.assertEqual(messages, [('DUNGEONS dun1 dun2', None)])
+
+	def test_game(self):
+		[messages] = self.run_clients(['SIZE 80 24', 'NEW dun1 0 7', 'KEYS 6', 'KEYS q', 'BYE'])
+		lines = [line for line, payload in messages]
+		self.assertEqual(lines[0], 'OK 7 0 0')
+		self.assertTrue(lines[1].startswith('FRAME '))
+		self.assertIn(b'#H.##', messages[1][1])
+		# only the changes are sent after the first frame
+		self.assertNotIn(b'health', messages[2][1])
+		self.assertEqual(lines[-1], 'STATUS quit')
+
+	def test_concurrent_games_share_the_dungeons(self):
+		script = ['NEW dun1 1 3', 'KEYS 8888', 'KEYS q', 'BYE']
+		first, second = self.run_clients(script, script)
+		self.assertEqual(first, second)
+		self.assertEqual(first[0][0], 'OK 3 4 3')
+		self.assertEqual(self.server.sessions, set())
+
+	def test_errors(self):
+		[messages] = self.run_clients(['NEW nowhere', 'NEW dun1 9', 'KEYS 6', 'DANCE', 'BYE'])
+		self.assertEqual([line for line, payload in messages],
+		                 ['ERROR unknown dungeon: nowhere', 'ERROR invalid spawn: 9',
+		                  'ERROR no game', 'ERROR invalid request: DANCE'])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from simulation import *
+from dungeon import Game
+from fixtures import make_dungeon
+
+class TestSimulation(unittest.TestCase):
+	def setUp(self):
+		self.corridor = make_dungeon(["S..G"])
+		self.ambush = make_dungeon(["SE.G"],
+			[{"health":100, "mana":100, "fist_damage":20}], health=10)
+
+	def test_scripted_game_is_won(self):
+		game = self.corridor.create_game((0,0))
+		result = run(game, scripted(['right', 'right', 'right']))
+		self.assertIs(result.status, Game.WON)
+		self.assertEqual(result.turns, 3)
+		self.assertEqual(result.name, 'won')
+
+	def test_hero_is_killed(self):
+		game = self.ambush.create_game((0,0))
+		result = run(game, scripted(['left']))
+		self.assertIs(result.status, Game.KILLED)
+		self.assertEqual(result.turns, 1)
+
+	def test_game_is_quit_when_the_script_ends(self):
+		game = self.corridor.create_game((0,0))
+		result = run(game, scripted(['right']))
+		self.assertIs(result.status, Game.QUIT)
+		self.assertEqual(result.turns, 1)
+
+	def test_game_is_quit_after_max_turns(self):
+		game = self.corridor.create_game((0,0))
+		result = run(game, scripted(['left'] * 10), max_turns=5)
+		self.assertIs(result.status, Game.QUIT)
+		self.assertEqual(result.turns, 5)
+
+	def test_restart(self):
+		game = self.corridor.create_game((0,0))
+		result = run(game, scripted(['right', 'right', RESTART, 'right', 'right', 'right']))
+		self.assertIs(result.status, Game.WON)
+		self.assertEqual(result.turns, 5)
+
+	def test_restarts_count_toward_max_turns(self):
+		game = self.corridor.create_game((0,0))
+		result = run(game, lambda game: RESTART, max_turns=5)
+		self.assertIs(result.status, Game.QUIT)
+		self.assertEqual(result.turns, 0)
+		result = run(game, scripted(['right', RESTART] * 10), max_turns=5)
+		self.assertIs(result.status, Game.QUIT)
+		self.assertEqual(result.turns, 3)
+
+	def test_run_all(self):
+		results = list(run_all(self.corridor.games(), lambda: random_policy(0), max_turns=200))
+		self.assertEqual(len(results), 1)
+		self.assertIn(results[0].status, [Game.WON, Game.QUIT])
+
+if __name__ == '__main__':
+	unittest.main()
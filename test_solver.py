@@ -0,0 +1,113 @@
+import unittest
+from solver import *
+from fixtures import make_dungeon
+
+SWORD = {"type":"weapon", "name":"sword", "damage":100}
+POTION = {"type":"health_potion", "amount":10}
+GUARD = {"health":10, "mana":0, "fist_damage":0}
+
+class TestZobristKeys(unittest.TestCase):
+	def test_hash_follows_the_changes_of_the_map(self):
+		game = make_dungeon(["S.T.G"], treasures=[SWORD]).create_game((0,0))
+		keys = ZobristKeys(5)
+		game.map.use_zobrist(keys)
+		snapshot = game.snapshot()
+		first_hash = game.map.tiles_hash
+		for command in ['right', 'right']:
+			game.step(command)
+			self.assertEqual(game.map.tiles_hash, keys.hash(game.map.tiles))
+		self.assertNotEqual(game.map.tiles_hash, first_hash)
+		game.restore(snapshot)
+		self.assertEqual(game.map.tiles_hash, first_hash)
+
+class TestDraws(unittest.TestCase):
+	def test_every_combination_is_drawn_once(self):
+		combinations = []
+		forced = []
+		while forced is not None:
+			draws = Draws(forced)
+			combinations.append((draws.choice('ab'), draws.choice('xyz')))
+			self.assertEqual(draws.probability, fractions.Fraction(1, 6))
+			forced = draws.next_forced()
+		self.assertEqual(combinations, [(a, x) for a in 'ab' for x in 'xyz'])
+
+class TestSolver(unittest.TestCase):
+	def solve(self, *args, **kwargs):
+		[solution] = solve(make_dungeon(*args, **kwargs))
+		return solution
+
+	def test_corridor_is_won(self):
+		solution = self.solve(["S..G"])
+		self.assertEqual(solution.status, WON)
+		self.assertEqual(solution.commands, ['right', 'right', 'right'])
+		self.assertEqual(solution.depth, 3)
+
+	def test_walled_gateway_is_lost(self):
+		solution = self.solve(["S#G"])
+		self.assertEqual(solution.status, LOST)
+		self.assertEqual(solution.states, 0)
+
+	def test_unbeatable_enemy_is_lost(self):
+		solution = self.solve(["S.EG"], [dict(GUARD, health=100)], fist_damage=0)
+		self.assertEqual(solution.status, LOST)
+		self.assertTrue(solution.exact)
+		self.assertIsNone(solution.commands)
+
+	def test_search_stops_at_max_depth(self):
+		[solution] = solve(make_dungeon(["S....G"]), max_depth=3)
+		self.assertEqual(solution.status, UNKNOWN)
+		self.assertFalse(solution.exact)
+
+	def test_search_stops_at_max_states(self):
+		[solution] = solve(make_dungeon(["S....",
+		                                 ".....",
+		                                 "....G"]), max_states=3)
+		self.assertEqual(solution.status, UNKNOWN)
+		self.assertEqual(solution.states, 3)
+		self.assertLess(solution.depth, 6)
+
+	def test_chests_are_chance_nodes(self):
+		solution = self.solve(["STEG"], [GUARD], [SWORD, POTION], fist_damage=0)
+		self.assertEqual(solution.status, POSSIBLE)
+		self.assertEqual(solution.probability, fractions.Fraction(1, 2))
+		self.assertTrue(solution.exact)
+		self.assertEqual(solution.commands, ['right', ('weapon', 'right'), 'right', 'right'])
+
+	def test_chance_nodes_follow_the_weights(self):
+		solution = self.solve(["STEG"], [GUARD], [dict(SWORD, weight=3), POTION], fist_damage=0)
+		self.assertEqual(solution.probability, fractions.Fraction(3, 4))
+		solution = self.solve(["STEG"], [GUARD], [dict(SWORD, weight=0), POTION], fist_damage=0)
+		self.assertEqual(solution.status, LOST)
+
+	def test_strategy_wins_whatever_the_draws(self):
+		the_dungeon = make_dungeon(["S.T.",
+		                            "##E#",
+		                            "...G"], [GUARD], [SWORD, POTION])
+		[solution] = solve(the_dungeon)
+		self.assertEqual(solution.status, WON)
+		for seed in range(10):
+			result = simulation.run(the_dungeon.create_game((0,0), seed), solution.policy())
+			self.assertEqual(result.name, 'won')
+
+	def test_game_is_left_unchanged(self):
+		game = make_dungeon(["S.T.G"], treasures=[SWORD, POTION]).create_game((0,0), 1)
+		tiles = bytes(game.map.tiles)
+		solution = Solver(game).solve(10)
+		self.assertEqual(solution.status, WON)
+		self.assertEqual(bytes(game.map.tiles), tiles)
+		self.assertEqual(game.hero.pos, (0,0))
+		self.assertIs(game.map.rng, game.rng)
+		self.assertIsNone(game.map.zobrist)
+
+	def test_small_table_gives_the_same_solution(self):
+		the_dungeon = make_dungeon(["S.T..",
+		                            ".#E#.",
+		                            "....G"], [GUARD], [SWORD, POTION])
+		solutions = [Solver(the_dungeon.create_game((0,0)), table_size).solve(20)
+		             for table_size in [1 << 20, 4]]
+		self.assertEqual(solutions[0].status, WON)
+		self.assertEqual([(solution.status, solution.depth) for solution in solutions],
+		                 [(WON, solutions[0].depth)] * 2)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,103 @@
+import os
+import random
+import unittest
+import swarm
+import simulation
+from dungeon import Dungeon
+from fixtures import DUNGEONS, make_dungeon
+
+TREASURES = [{"type":"weapon", "name":"Axe", "damage":20},
+             {"type":"health_potion", "amount":10}]
+
+def swarm_dungeon(map_template, behaviors, **hero):
+	enemies = [{"health":40, "mana":0, "fist_damage":5, "behavior":behavior}
+	           for behavior in behaviors]
+	return make_dungeon(map_template, enemies, TREASURES, fist_damage=30, **hero)
+
+def crowded_dungeon(seed, nrows=12, ncols=16):
+	rng = random.Random(seed)
+	rows = [[rng.choices('.#ET', weights=[60, 10, 25, 5])[0] for col in range(ncols)]
+	        for row in range(nrows)]
+	rows[0][0] = rows[nrows // 2][ncols // 2] = 'S'
+	rows[-1][-1] = 'G'
+	behaviors = [rng.choice(['rabid', 'aggresive', None])
+	             for row in rows for char in row if char == 'E']
+	return swarm_dungeon([''.join(row) for row in rows], behaviors, health=300)
+
+def play(the_dungeon, spawn_pos, seed, use_swarm):
+	# returns the states of a game played with a random policy after each round
+	game = the_dungeon.create_game(spawn_pos, seed)
+	if use_swarm:
+		game.enemy_engine = swarm.SwarmEngine(game)
+	policy = simulation.random_policy(seed, simulation.COMMANDS + (simulation.RESTART,))
+	result = []
+	for turn in range(200):
+		command = policy(game)
+		if command == simulation.RESTART:
+			game.reset_state()
+			continue
+		status = game.step(command)
+		result.append((status, bytes(game.map.tiles), game.hero.health,
+		               [(enemy.pos, enemy.health, enemy.last_seen, enemy.hero_direction)
+		                for enemy in game.actors[1:]]))
+		if status is not None:
+			break
+	return result
+
+@unittest.skipIf(swarm.numpy is None, 'NumPy is not installed')
+class TestSwarmEngine(unittest.TestCase):
+	def test_same_outcomes_as_enemy_do_turn(self):
+		for name in ['dun1', 'dun2', 'dun3']:
+			the_dungeon = Dungeon.from_file(os.path.join(DUNGEONS, name))
+			for spawn_pos in the_dungeon.spawn_posns:
+				for seed in range(3):
+					self.assertEqual(play(the_dungeon, spawn_pos, seed, True),
+					                 play(the_dungeon, spawn_pos, seed, False))
+
+	def test_same_outcomes_in_crowded_dungeons(self):
+		for dungeon_seed in range(2):
+			the_dungeon = crowded_dungeon(dungeon_seed)
+			for spawn_pos in the_dungeon.spawn_posns:
+				for seed in range(3):
+					self.assertEqual(play(the_dungeon, spawn_pos, seed, True),
+					                 play(the_dungeon, spawn_pos, seed, False))
+
+	def test_first_enemy_wins_a_contested_cell(self):
+		game = swarm_dungeon(["E.E",
+		                     "#.#",
+		                     "#S#",
+		                     "#G#"], ["rabid", "rabid"]).create_game((2,1))
+		game.enemy_engine = swarm.SwarmEngine(game)
+		first, second = game.enemies
+		game.enemies_turn()
+		self.assertEqual(first.pos, (0,1))
+		self.assertEqual(second.pos, (0,2))
+		game.enemies_turn()
+		self.assertEqual(first.pos, (1,1))
+		self.assertEqual(second.pos, (0,1))
+
+	def test_idle_enemies_do_nothing(self):
+		game = swarm_dungeon(["E..",
+		                     "...",
+		                     ".S.",
+		                     "..G"], [None]).create_game((2,1))
+		engine = game.enemy_engine = swarm.SwarmEngine(game)
+		self.assertEqual(len(engine.active()), 0)
+		game.enemies_turn()
+		self.assertEqual(game.enemies[0].pos, (0,0))
+
+	def test_restore_reloads_the_enemies(self):
+		game = swarm_dungeon(["E..",
+		                     "...",
+		                     ".S.",
+		                     "..G"], ["rabid"]).create_game((2,1))
+		game.enemy_engine = swarm.SwarmEngine(game)
+		game.save('start')
+		game.enemies_turn()
+		self.assertEqual(game.enemies[0].pos, (1,0))
+		game.rewind('start')
+		game.enemies_turn()
+		self.assertEqual(game.enemies[0].pos, (1,0))
+
+if __name__ == '__main__':
+	unittest.main()
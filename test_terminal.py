@@ -0,0 +1,65 @@
+import io
+import os
+import asyncio
+import unittest
+import render
+import replay
+import simulation
+from terminal import *
+from dungeon import Dungeon
+from fixtures import DUNGEONS
+
+class TestCommandParser(unittest.TestCase):
+	def test_commands(self):
+		parser = CommandParser()
+		commands = [parser.feed(key) for key in '6x' 'w8' 's' 'x4' 'f2' 'rq']
+		self.assertEqual([command for command in commands if command is not None],
+		                 ['right', ('weapon', 'up'), 'left', ('fist', 'down'),
+		                  simulation.RESTART, simulation.QUIT])
+		self.assertEqual(parser.feed(''), simulation.QUIT)
+
+class TestPlay(unittest.TestCase):
+	def setUp(self):
+		path = os.path.join(DUNGEONS, 'dun1')
+		self.game = Dungeon.from_file(path).create_game((0,0), 0)
+		self.recording = replay.Replay.of_game(self.game, path)
+		self.renderer = render.Renderer(io.StringIO())
+		self.read_fd, self.write_fd = os.pipe()
+		self.keyboard = Keyboard(self.read_fd)
+
+	def tearDown(self):
+		os.close(self.read_fd)
+		if self.write_fd is not None:
+			os.close(self.write_fd)
+
+	def close_input(self):
+		os.close(self.write_fd)
+		self.write_fd = None
+
+	def test_turns(self):
+		os.write(self.write_fd, b'6x2')
+		self.close_input()
+		with self.keyboard:
+			status = asyncio.run(play(self.game, self.keyboard, self.renderer))
+		self.assertIs(status, self.game.QUIT)
+		self.assertEqual(self.game.hero.pos, (1,1))
+		self.assertEqual(''.join(self.recording.keys), '62q')
+		self.assertIn('H', self.renderer.file.getvalue())
+
+	def test_real_time(self):
+		async def main():
+			loop = asyncio.get_running_loop()
+			loop.call_later(0.05, os.write, self.write_fd, b'6q')
+			return await play(self.game, self.keyboard, self.renderer, tick=0.005)
+		with self.keyboard:
+			status = asyncio.run(main())
+		self.assertIs(status, self.game.QUIT)
+		keys = ''.join(self.recording.keys)
+		self.assertRegex(keys, r'^\.+6q$')
+		# the hero waited in the rounds without commands
+		result, game = self.recording.run(Dungeon.from_file(os.path.join(DUNGEONS, 'dun1')))
+		self.assertEqual(result.turns, len(keys) - 1)
+		self.assertEqual(game.hero.pos, self.game.hero.pos)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -1,4 +1,8 @@
+import copy
+import random
+import pickle
 import unittest
+import collections
 from treasures import *
 from dungeon import *
 from actors import *
@@ -82,6 +86,68 @@ class TestTreasures(unittest.TestCase):
 				self.assertEqual(treasure.mana_cost, 50)
 				self.assertEqual(treasure.cast_range,2)
 
-	
+	def test_treasures_are_immutable(self):
+		with self.assertRaises(AttributeError):
+			DEFAULT_WEAPON.damage = 5
+		with self.assertRaises(AttributeError):
+			del DEFAULT_SPELL.mana_cost
+		with self.assertRaises(AttributeError):
+			HealthPotion(10).strength = 1
+		self.assertEqual(DEFAULT_WEAPON.damage, 0)
+
+	def test_treasures_can_be_copied_and_pickled(self):
+		spell = Spell('Fireball', 30, 50, 2)
+		for copied in [copy.deepcopy(spell), pickle.loads(pickle.dumps(spell))]:
+			self.assertIs(type(copied), Spell)
+			self.assertEqual((copied.name, copied.damage, copied.mana_cost, copied.cast_range),
+			                 ('Fireball', 30, 50, 2))
+
+	def test_treasures_are_interned(self):
+		self.assertIs(parse_dict(self.dict_treasures[1]), self.treasures[1])
+		self.assertIs(parse_dict(dict(self.dict_treasures[0], weight=5)), self.treasures[0])
+		self.assertIs(intern(Weapon, "", 0), DEFAULT_WEAPON)
+		self.assertIsNot(intern(HealthPotion, 10), intern(ManaPotion, 10))
+		for treasure in self.treasures:
+			self.assertIs(copy.deepcopy(treasure), treasure)
+			self.assertIs(pickle.loads(pickle.dumps(treasure)), treasure)
+
+class TestTreasureTable(unittest.TestCase):
+	def setUp(self):
+		self.dcts = [{"type":"weapon", "name":"Axe", "damage":20, "weight":3},
+		             {"type":"health_potion", "amount":10},
+		             {"type":"mana_potion", "amount":10, "weight":0}]
+
+	def test_weights(self):
+		table = TreasureTable.from_dicts(self.dcts)
+		self.assertEqual([type(treasure) for treasure in table], [Weapon, HealthPotion, ManaPotion])
+		self.assertEqual(table.weights, [3, 1, 0])
+		self.assertEqual(table.cumulative_weights, [3, 4, 4])
+		rng = random.Random(0)
+		counts = collections.Counter(type(table.draw(rng)) for i in range(4000))
+		self.assertEqual(counts[ManaPotion], 0)
+		self.assertAlmostEqual(counts[Weapon] / 4000, 0.75, delta=0.03)
+
+	def test_equal_weights_draw_like_choice(self):
+		table = TreasureTable.from_dicts([dict(dct, weight=2) for dct in self.dcts])
+		self.assertIsNone(table.cumulative_weights)
+		rng, other_rng = random.Random(1), random.Random(1)
+		self.assertEqual([table.draw(rng) for i in range(20)],
+		                 [other_rng.choice(table.treasures) for i in range(20)])
+
+	def test_invalid_weights(self):
+		for weights in [[1, -1, 1], [0, 0, 0], [1, 1]]:
+			with self.assertRaises(ValueError):
+				TreasureTable(TreasureTable.from_dicts(self.dcts).treasures, weights)
+
+	def test_games_share_the_table(self):
+		the_dungeon = Dungeon.from_dict({
+			"hero":{"name":"Bron", "title":"dragon slayer", "health":100, "mana":100,
+			        "mana_regeneration_rate":2, "fist_damage":10},
+			"enemies":[], "map_template":["STTG"], "treasures":self.dcts})
+		chests = [game.map[pos] for game in [the_dungeon.create_game((0,0), seed) for seed in range(2)]
+		          for pos in [(0,1), (0,2)]]
+		for chest in chests:
+			self.assertIs(chest.treasures, the_dungeon.treasures)
+
 if __name__ == '__main__':
 	unittest.main()
@@ -1,65 +1,175 @@
-import random
+import itertools
 
 class TreasureChest:
+    __slots__ = ('pos', 'map', 'treasures')
+
+    # the character displayed for a chest on the map
+    TILE = 'T'
+
     def __init__(self, pos, map, treasures):
+        # @treasures is a TreasureTable, or a sequence of treasures which are
+        # equally likely to be drawn
         self.pos = pos
         self.map = map
         self.treasures = treasures
     
     def open(self):
-        # returns a random treasure from self.treasures and
-        # removes itself from the map
-        treasure = random.choice(self.treasures)
+        # returns a random treasure from self.treasures, drawn with the
+        # map's random number generator, and removes itself from the map
+        if self.map.profiler is not None:
+            self.map.profiler.count('chest_openings')
+        if type(self.treasures) is TreasureTable:
+            treasure = self.treasures.draw(self.map.rng)
+        else:
+            treasure = self.map.rng.choice(self.treasures)
         self.map.cleanup_at(self.pos)
         return treasure
 
+class TreasureTable:
+    # the treasures which the chests of a dungeon may give, with their weights:
+    # the probability of drawing a treasure is its weight divided by the total
+    # weight. a table is made once per dungeon and shared by all the chests of
+    # all its games.
+    # attributes:
+    #  - treasures: the list of the treasures
+    #  - weights: the list of their weights
+    #  - cumulative_weights: cumulative_weights[i] is the sum of weights[:i + 1],
+    #                        or None if all the weights are equal. it lets a
+    #                        treasure be drawn with a binary search.
+    __slots__ = ('treasures', 'weights', 'cumulative_weights')
+
+    def __init__(self, treasures, weights=None):
+        # @weights is the list of the weights of @treasures; all are equal by default
+        if weights is None:
+            weights = [1] * len(treasures)
+        if len(weights) != len(treasures):
+            raise ValueError('there must be one weight per treasure')
+        if any(weight < 0 for weight in weights) or (weights and sum(weights) <= 0):
+            raise ValueError(f'invalid treasure weights: {weights}')
+        self.treasures = list(treasures)
+        self.weights = list(weights)
+        self.cumulative_weights = None
+        if len(set(weights)) > 1:
+            self.cumulative_weights = list(itertools.accumulate(weights))
+
+    @staticmethod
+    def from_dicts(dcts):
+        # returns the table of the treasures of a JSON dungeon: @dcts is the
+        # list of their dicts, where the weight of a treasure is its 'weight' (1 by default)
+        return TreasureTable([parse_dict(dct) for dct in dcts],
+                             [dct.get('weight', 1) for dct in dcts])
+
+    def draw(self, rng):
+        # returns a random treasure drawn with the random.Random @rng.
+        # when all the weights are equal, it is drawn with rng.choice, as
+        # chests did before treasures had weights, so that seeds give the same games.
+        if self.cumulative_weights is None:
+            return rng.choice(self.treasures)
+        return rng.choices(self.treasures, cum_weights=self.cumulative_weights)[0]
+
+    def __len__(self):
+        return len(self.treasures)
+
+    def __getitem__(self, index):
+        return self.treasures[index]
+
 class Treasure:
-    # base class for all treasures
+    # base class for all treasures.
+    # treasures are immutable, so the same instance may be given to any
+    # number of actors: assigning their attributes raises AttributeError.
+    # the attributes of a treasure are those named in its class' __slots__.
+    __slots__ = ()
+
+    def __init__(self, *values):
+        # @values are the values of the attributes, in the order of __slots__
+        for attr, value in zip(self.__slots__, values):
+            object.__setattr__(self, attr, value)
+
+    def __setattr__(self, attr, value):
+        raise AttributeError(f'{type(self).__name__} objects are immutable')
+
+    def __delattr__(self, attr):
+        raise AttributeError(f'{type(self).__name__} objects are immutable')
+
+    @property
+    def fields(self):
+        # the values of the attributes, in the order of __slots__
+        return tuple(getattr(self, attr) for attr in self.__slots__)
+
+    def __reduce__(self):
+        # unpickling gives the interned treasure
+        return intern, (type(self), *self.fields)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
     def give_to_actor(self, actor):
         raise NotImplementedError
     
-class HealthPotion:
+class HealthPotion(Treasure):
+    __slots__ = ('amount',)
+
     def __init__(self, amount):
-        self.amount = amount
+        Treasure.__init__(self, amount)
 
     def give_to_actor(self, actor):
         actor.heal(self.amount)
 
-class ManaPotion:
+class ManaPotion(Treasure):
+    __slots__ = ('amount',)
+
     def __init__(self, amount):
-        self.amount = amount
+        Treasure.__init__(self, amount)
 
     def give_to_actor(self, actor):
         actor.give_mana(self.amount)
 
-class Weapon:
+class Weapon(Treasure):
+    __slots__ = ('name', 'damage')
+
     def __init__(self, name = "", damage = 0):
-        self.name = name
-        self.damage = damage
+        Treasure.__init__(self, name, damage)
 
     def give_to_actor(self, actor):
         actor.equip(self)
 
-class Spell:
+class Spell(Treasure):
+    __slots__ = ('name', 'damage', 'mana_cost', 'cast_range')
+
     def __init__(self, name = "", damage = 0, mana_cost = 0, cast_range = 1):
-        self.name = name
-        self.damage = damage
-        self.mana_cost = mana_cost
-        self.cast_range = cast_range
+        Treasure.__init__(self, name, damage, mana_cost, cast_range)
 
     def give_to_actor(self, actor):
         actor.learn(self)
         
+# maps (<class>, <fields>) to the treasure returned by intern for them
+_interned = {}
+
+def intern(cls, *values):
+    # returns the treasure cls(*@values). treasures are immutable, so the
+    # treasures of the same class with the same fields are one and the same
+    # object, shared by all the dungeons and games.
+    treasure = cls(*values)
+    return _interned.setdefault((cls, treasure.fields), treasure)
+
+# the equipment of the actors who haven't found any
+DEFAULT_WEAPON = intern(Weapon)
+DEFAULT_SPELL = intern(Spell)
+
 def parse_dict(dct):
-    # returns the treasure corresponding to @dct
+    # returns the treasure corresponding to @dct. the 'weight' of @dct is
+    # not a part of the treasure, see TreasureTable.from_dicts
     treasure_type = dct['type']
     if treasure_type == 'weapon':
-        return Weapon(dct['name'], dct['damage'])
+        return intern(Weapon, dct['name'], dct['damage'])
     elif treasure_type == 'spell':
-        return Spell(*(dct[attr] for attr in ('name', 'damage', 'mana_cost', 'cast_range')))
+        return intern(Spell, *(dct[attr] for attr in ('name', 'damage', 'mana_cost', 'cast_range')))
     elif treasure_type == 'health_potion':
-        return HealthPotion(dct['amount'])
+        return intern(HealthPotion, dct['amount'])
     elif treasure_type == 'mana_potion':
-        return ManaPotion(dct['amount'])
+        return intern(ManaPotion, dct['amount'])
     else:
         raise ValueError(f'invalid treasure type: {treasure_type}')